@@ -0,0 +1,23 @@
+# gunicorn.conf.py — gunicorn lo lee automáticamente desde el directorio de trabajo (/app)
+import os
+
+bind = '0.0.0.0:8000'
+
+
+def on_starting(server):
+    """Antes de crear workers: los checks de base de datos (p. ej. partidas fuera de su shard) impiden arrancar."""
+    import django
+    from django.core.management import call_command
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project_memory.settings')
+    django.setup()
+    call_command('check', databases=['default'])
+
+
+def post_worker_init(worker):
+    """Cada worker se calienta tras cargar la aplicación y antes de aceptar peticiones."""
+    if os.environ.get('CALENTAR_WORKERS', '1') != '1':
+        return
+    from memory_game.calentamiento import calentar
+
+    calentar()
@@ -1,23 +1,41 @@
 from django.contrib import admin
-from .models import Nivel, Partida, Carta, Intento, Estadistica
+from .models import (
+    Nivel, Partida, Carta, Intento, Estadistica, ResumenIntentos, ResumenNivelDiario, BosquejoNivel,
+    Sala, JugadorSala, RondaTorneo,
+)
+from .db_routers import leer_de_replica
+
+
+class ReplicaChangeListAdmin(admin.ModelAdmin):
+    """Los listados (GET) del admin leen de la réplica; formularios y acciones, de la primaria."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with leer_de_replica():
+            response = super().changelist_view(request, extra_context)
+            # Renderizar aquí para que las consultas de la plantilla también usen la réplica
+            if hasattr(response, 'render'):
+                response.render()
+        return response
 
 
 @admin.register(Nivel)
-class NivelAdmin(admin.ModelAdmin):
+class NivelAdmin(ReplicaChangeListAdmin):
     list_display = ('nombre', 'dificultad')
     search_fields = ('nombre',)
     ordering = ('dificultad',)
 
 
 @admin.register(Carta)
-class CartaAdmin(admin.ModelAdmin):
+class CartaAdmin(ReplicaChangeListAdmin):
     list_display = ('identificador', 'nivel')
     list_filter = ('nivel',)
     search_fields = ('identificador',)
 
 
 @admin.register(Partida)
-class PartidaAdmin(admin.ModelAdmin):
+class PartidaAdmin(ReplicaChangeListAdmin):
     list_display = ('usuario', 'nivel', 'fecha_inicio', 'fecha_fin', 'activa', 'ganada', 'movimientos', 'aciertos')
     list_filter = ('activa', 'ganada', 'nivel')
     search_fields = ('usuario__username',)
@@ -26,15 +44,56 @@ class PartidaAdmin(admin.ModelAdmin):
 
 
 @admin.register(Intento)
-class IntentoAdmin(admin.ModelAdmin):
+class IntentoAdmin(ReplicaChangeListAdmin):
     list_display = ('partida', 'carta1', 'carta2', 'es_correcto', 'fecha')
     list_filter = ('es_correcto',)
     search_fields = ('partida__usuario__username',)
 
 
 @admin.register(Estadistica)
-class EstadisticaAdmin(admin.ModelAdmin):
-    list_display = ('usuario', 'total_partidas', 'victorias', 'derrotas', 'promedio_intentos')
+class EstadisticaAdmin(ReplicaChangeListAdmin):
+    list_display = ('usuario', 'nivel', 'total_partidas', 'victorias', 'derrotas', 'promedio_intentos', 'duracion_ms')
     search_fields = ('usuario__username',)
 
 
+@admin.register(ResumenIntentos)
+class ResumenIntentosAdmin(ReplicaChangeListAdmin):
+    list_display = ('usuario', 'nivel', 'dia', 'intentos', 'correctos')
+    list_filter = ('nivel',)
+    search_fields = ('usuario__username',)
+    ordering = ('-dia',)
+
+
+@admin.register(ResumenNivelDiario)
+class ResumenNivelDiarioAdmin(ReplicaChangeListAdmin):
+    list_display = ('nivel', 'dia', 'iniciadas', 'ganadas', 'perdidas', 'abandonadas', 'movimientos_total')
+    list_filter = ('nivel',)
+    ordering = ('-dia',)
+
+
+@admin.register(BosquejoNivel)
+class BosquejoNivelAdmin(ReplicaChangeListAdmin):
+    list_display = ('nivel', 'metrica', 'franja', 'total', 'actualizado')
+    list_filter = ('nivel', 'metrica')
+    readonly_fields = ('datos', 'total', 'actualizado')
+
+
+class JugadorSalaInline(admin.TabularInline):
+    model = JugadorSala
+    extra = 0
+
+
+@admin.register(Sala)
+class SalaAdmin(ReplicaChangeListAdmin):
+    list_display = ('codigo', 'creador', 'nivel', 'estado', 'max_jugadores', 'creada')
+    list_filter = ('estado', 'nivel')
+    search_fields = ('codigo', 'creador__username')
+    inlines = [JugadorSalaInline]
+
+
+@admin.register(RondaTorneo)
+class RondaTorneoAdmin(ReplicaChangeListAdmin):
+    list_display = ('nombre', 'nivel', 'jugadores', 'creada')
+    list_filter = ('nivel',)
+    search_fields = ('nombre',)
+    readonly_fields = ('disposicion', 'jugadores', 'creada')
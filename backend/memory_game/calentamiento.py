@@ -0,0 +1,201 @@
+# memory_game/calentamiento.py
+"""
+Calentamiento de workers: lo que la primera petición de un worker recién
+arrancado pagaría (imports de vistas y servicios, resolución de URLs,
+compilación de plantillas, catálogo de niveles y conexión a la base de datos)
+se hace al arrancar, antes de aceptar tráfico. gunicorn lo llama desde
+post_worker_init (gunicorn.conf.py); ``manage.py calentar --comparar`` mide el
+efecto en procesos nuevos.
+
+Los imports pesados van dentro de cada paso: este módulo se importa en el
+proceso "frío" de la comparación y no debe calentar nada por sí mismo.
+"""
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+
+logger = logging.getLogger('memory_game.calentamiento')
+
+PLANTILLAS = ('game_board.html', 'Juegos.html', 'estadisticas.html')
+
+
+# -------------------------------
+# PASOS
+# -------------------------------
+
+def _rutas():
+    """Importa el URLconf (y con él vistas y servicios) y construye el índice de reverse()."""
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    resolver.reverse_dict  # noqa: B018 (propiedad: puebla los índices)
+    return len(resolver.url_patterns)
+
+
+def _plantillas():
+    """Compila las plantillas principales; con el cargador cacheado quedan en memoria del worker."""
+    from django.template.loader import get_template
+
+    nombres = getattr(settings, 'CALENTAMIENTO_PLANTILLAS', PLANTILLAS)
+    for nombre in nombres:
+        get_template(nombre)
+    return len(nombres)
+
+
+def _niveles():
+    """
+    Carga el catálogo de niveles y renderiza el tablero una vez por nivel: así quedan
+    en caché los fragmentos 'menu_niveles' y 'tablero_chrome' (con LocMem, solo en este worker).
+    """
+    from django.contrib.auth.models import AnonymousUser
+    from django.template.loader import render_to_string
+    from django.test import RequestFactory
+
+    from .models import Nivel
+
+    niveles = list(Nivel.objects.order_by('dificultad'))
+    request = RequestFactory().get('/game_board/')
+    request.user = AnonymousUser()
+    for nivel in niveles:
+        render_to_string('game_board.html', {
+            'nivel': nivel, 'niveles': niveles, 'cartas': [], 'partida': None,
+        }, request)
+    return len(niveles)
+
+
+def _conexiones():
+    """
+    Abre una conexión por alias en el hilo actual. Solo se reutiliza si
+    CONN_MAX_AGE > 0 y las peticiones corren en este mismo hilo: el worker sync de
+    gunicorn (post_worker_init corre en su hilo principal), no un worker con hilos
+    ni ASGI, donde cada hilo abre la suya.
+    """
+    from django.db import connections
+
+    for alias in connections:
+        connections[alias].ensure_connection()
+    return len(connections.all())
+
+
+PASOS = {
+    'rutas': _rutas,
+    'plantillas': _plantillas,
+    'niveles': _niveles,
+    'conexiones': _conexiones,
+}
+
+
+def calentar(pasos=None):
+    """
+    Ejecuta los pasos (todos por defecto) y registra un informe en JSON con lo que
+    tardó cada uno. Un paso que falla no impide arrancar: queda en 'errores'.
+    """
+    informe = {'evento': 'calentamiento', 'pid': os.getpid(), 'pasos': {}, 'errores': {}}
+    inicio = time.perf_counter()
+    for nombre in pasos or PASOS:
+        t = time.perf_counter()
+        try:
+            cantidad = PASOS[nombre]()
+        except Exception as e:
+            informe['errores'][nombre] = repr(e)
+            cantidad = None
+        informe['pasos'][nombre] = {'ms': round(1000 * (time.perf_counter() - t), 2), 'n': cantidad}
+    informe['ms_total'] = round(1000 * (time.perf_counter() - inicio), 2)
+
+    if informe['errores']:
+        logger.warning(json.dumps(informe, ensure_ascii=False))
+    else:
+        logger.info(json.dumps(informe, ensure_ascii=False))
+    return informe
+
+
+# -------------------------------
+# MEDICIÓN: PRIMERA PETICIÓN EN FRÍO Y EN CALIENTE
+# -------------------------------
+
+def sondear(rutas, cookie, calentado, repeticiones=20):
+    """
+    En un proceso recién arrancado: carga la aplicación WSGI como gunicorn,
+    calienta (o no) y mide la primera petición de cada ruta frente a la mediana
+    de las siguientes ``repeticiones``.
+    """
+    import io
+
+    from django.core.wsgi import get_wsgi_application
+
+    app = get_wsgi_application()
+    informe = calentar() if calentado else None
+
+    def peticion(ruta):
+        camino, _, consulta = ruta.partition('?')
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': camino, 'QUERY_STRING': consulta,
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost', 'HTTP_COOKIE': cookie,
+            'wsgi.input': io.BytesIO(b''), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0), 'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+        }
+        estado = []
+        inicio = time.perf_counter()
+        respuesta = app(environ, lambda status, headers: estado.append(status))
+        try:
+            b''.join(respuesta)
+        finally:
+            respuesta.close()
+        return 1000 * (time.perf_counter() - inicio), estado[0]
+
+    resultados = {}
+    for ruta in rutas:
+        primera, estado = peticion(ruta)
+        estables = [peticion(ruta)[0] for _ in range(repeticiones)]
+        resultados[ruta] = {
+            'estado': estado.split()[0],
+            'ms_primera': round(primera, 2),
+            'ms_mediana': round(statistics.median(estables), 2),
+        }
+    return {'calentamiento': informe, 'rutas': resultados}
+
+
+def medir_arranque(repeticiones=20):
+    """
+    Lanza dos procesos nuevos (sin calentar y calentado) contra las mismas rutas
+    con la sesión de un usuario de prueba. Devuelve {'frio': ..., 'caliente': ...}.
+    """
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    from .models import Nivel
+    from .services.game_engine import create_game
+
+    nivel = Nivel.objects.order_by('dificultad').first()
+    if nivel is None:
+        raise ValueError("No hay niveles: crea al menos uno antes de medir.")
+    usuario, _ = User.objects.get_or_create(username='calentamiento_sonda')
+    try:
+        partida = create_game(usuario, nivel)
+        cliente = Client()
+        cliente.force_login(usuario)
+        cookie = f"sessionid={cliente.cookies['sessionid'].value}"
+        rutas = [f"/game_board/?{urlencode({'nivel': nivel.nombre})}", '/estadisticas/', f'/state/{partida.pk}/']
+
+        resultados = {}
+        for modo in ('frio', 'caliente'):
+            salida = subprocess.run(
+                [
+                    sys.executable, str(settings.BASE_DIR / 'manage.py'), 'calentar',
+                    '--sonda', json.dumps({'rutas': rutas, 'cookie': cookie, 'calentado': modo == 'caliente',
+                                           'repeticiones': repeticiones}),
+                ],
+                capture_output=True, text=True, check=True, env=os.environ.copy(),
+            ).stdout
+            resultados[modo] = json.loads(salida.strip().splitlines()[-1])
+        return resultados
+    finally:
+        usuario.delete()
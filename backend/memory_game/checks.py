@@ -0,0 +1,49 @@
+# memory_game/checks.py
+from django.core.checks import Error, Tags, register
+
+from .db_routers import hay_shards, shard_de_usuario
+
+# Usuarios de ejemplo en el mensaje de error
+MAX_EJEMPLOS = 5
+
+
+# -------------------------------
+# PARTIDAS FUERA DE SU SHARD
+# -------------------------------
+
+@register(Tags.database)
+def partidas_fuera_de_shard(app_configs=None, databases=None, **kwargs):
+    """
+    Con DB_SHARDS > 1, 'default' solo debe tener partidas e intentos de los usuarios
+    que el hash asigna al shard 0. Los que se crearon antes de repartir (o con otro
+    número de shards) quedarían invisibles para el router: no se arranca así.
+
+    Es un check de base de datos: corre en ``migrate``, en ``check --database default``
+    y al arrancar gunicorn (gunicorn.conf.py).
+    """
+    if not hay_shards() or 'default' not in (databases or ()):
+        return []
+    from .models import Intento, Partida
+
+    errores = []
+    for model in (Partida, Intento):
+        usuarios = (
+            model.objects.using('default')
+            .exclude(usuario_id__isnull=True)
+            .values_list('usuario_id', flat=True)
+            .distinct()
+            .order_by('usuario_id')
+        )
+        fuera = [u for u in usuarios.iterator(chunk_size=5000) if shard_de_usuario(u) != 'default']
+        if fuera:
+            errores.append(Error(
+                f"'default' tiene filas de {model._meta.model_name} de {len(fuera)} usuarios "
+                f"asignados a otro shard (p. ej. {fuera[:MAX_EJEMPLOS]}).",
+                hint=(
+                    "Mueve esas filas al shard de cada usuario antes de arrancar con DB_SHARDS > 1 "
+                    "(SILENCED_SYSTEM_CHECKS = ['memory_game.E001'] solo mientras se migran)."
+                ),
+                obj=model,
+                id='memory_game.E001',
+            ))
+    return errores
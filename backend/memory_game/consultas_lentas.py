@@ -0,0 +1,232 @@
+# memory_game/consultas_lentas.py
+import json
+import logging
+import re
+import sys
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('memory_game.consultas')
+
+# Registro de la petición en curso. Una ContextVar (y no un atributo de la conexión)
+# porque bajo ASGI el ORM corre en hilos con sus propias conexiones: sync_to_async
+# copia el contexto, así que esos hilos ven el mismo registro.
+_registro_actual = ContextVar('registro_consultas', default=None)
+
+
+# -------------------------------
+# NORMALIZACIÓN DE SQL
+# -------------------------------
+
+_ESPACIOS = re.compile(r'\s+')
+_LISTA_PARAMETROS = re.compile(r'%s(?:\s*,\s*%s)+')
+_NUMEROS = re.compile(r'\b\d+\b')
+_CADENAS = re.compile(r"'(?:[^']|'')*'")
+
+
+def normalizar_sql(sql):
+    """
+    SQL comparable entre ejecuciones: sin literales y con las listas IN de largo
+    variable colapsadas. Dos consultas con la misma forma y distintos parámetros
+    normalizan igual (así se detectan los N+1).
+    """
+    sql = _CADENAS.sub('?', sql)
+    sql = _NUMEROS.sub('?', sql)
+    sql = _LISTA_PARAMETROS.sub('%s, ...', sql)
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+# -------------------------------
+# REGISTRO POR PETICIÓN
+# -------------------------------
+
+class RegistroConsultas:
+    """
+    execute_wrapper instalado durante una petición: mide cada consulta, registra
+    las que superan ``umbral_ms`` con su plan (EXPLAIN) y cuenta las repetidas.
+    """
+
+    def __init__(self, request, umbral_ms, repetidas, explain=True):
+        self.request = request
+        self.umbral_ms = umbral_ms
+        self.repetidas = repetidas
+        self.explain = explain
+        self.conteo = {}        # sql normalizado -> [veces, ms, origen]
+        self.consultas = 0
+        self.ms_total = 0.0
+        self._dentro = False    # las consultas propias (EXPLAIN, savepoints) no se registran
+
+    def __call__(self, execute, sql, params, many, context):
+        if self._dentro:
+            return execute(sql, params, many, context)
+
+        inicio = time.perf_counter()
+        resultado = execute(sql, params, many, context)
+        # Solo las que terminan bien: repetir con EXPLAIN una consulta fallida
+        # volvería a fallar (y en Postgres, dentro de una transacción ya abortada)
+        self._anotar(sql, params, many, context, 1000 * (time.perf_counter() - inicio))
+        return resultado
+
+    def _anotar(self, sql, params, many, context, ms):
+        self.consultas += 1
+        self.ms_total += ms
+        normal = normalizar_sql(sql)
+        entrada = self.conteo.get(normal)
+        if entrada is None:
+            # El origen solo se busca la primera vez que aparece cada forma de consulta
+            entrada = self.conteo[normal] = [0, 0.0, _origen()]
+        entrada[0] += 1
+        entrada[1] += ms
+
+        if ms >= self.umbral_ms:
+            conexion = context['connection']
+            _emitir({
+                'tipo': 'lenta',
+                'vista': _vista(self.request),
+                'ruta': self.request.path,
+                'base': conexion.alias,
+                'ms': round(ms, 2),
+                'sql': normal,
+                'origen': entrada[2],
+                'plan': self._plan(conexion, sql, params) if self.explain and not many else None,
+            })
+
+    def _plan(self, conexion, sql, params):
+        if not sql.lstrip()[:6].upper() == 'SELECT':
+            return None
+        if conexion.vendor == 'postgresql':
+            prefijo = 'EXPLAIN (FORMAT JSON) '
+        elif conexion.vendor == 'sqlite':
+            prefijo = 'EXPLAIN QUERY PLAN '
+        else:
+            prefijo = 'EXPLAIN '
+
+        self._dentro = True
+        try:
+            # Savepoint: un EXPLAIN fallido no debe abortar la transacción de la vista
+            with transaction.atomic(using=conexion.alias), conexion.cursor() as cursor:
+                cursor.execute(prefijo + sql, params)
+                filas = cursor.fetchall()
+        except DatabaseError as e:
+            return {'error': str(e)}
+        finally:
+            self._dentro = False
+        if conexion.vendor == 'postgresql':
+            plan = filas[0][0]
+            return json.loads(plan) if isinstance(plan, str) else plan
+        return [' '.join(str(c) for c in fila) for fila in filas]
+
+    def cerrar(self):
+        """Al terminar la petición: un registro por cada forma de consulta repetida (sospecha de N+1)."""
+        for normal, (veces, ms, origen) in self.conteo.items():
+            if veces >= self.repetidas:
+                _emitir({
+                    'tipo': 'n_mas_1',
+                    'vista': _vista(self.request),
+                    'ruta': self.request.path,
+                    'veces': veces,
+                    'ms': round(ms, 2),
+                    'sql': normal,
+                    'origen': origen,
+                    'consultas_peticion': self.consultas,
+                })
+
+
+def _emitir(registro):
+    logger.warning(json.dumps(registro, ensure_ascii=False, default=str))
+
+
+def _vista(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return f"{match.func.__module__}.{match.func.__name__}"
+
+
+def _origen():
+    """Primer marco del código del proyecto (no de librerías ni de este módulo) que lanzó la consulta."""
+    raiz = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        archivo = frame.f_code.co_filename
+        if archivo.startswith(raiz) and archivo != __file__ and 'site-packages' not in archivo:
+            return f"{archivo[len(raiz) + 1:]}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def _envolver(execute, sql, params, many, context):
+    """execute_wrapper permanente de cada conexión: sin petición instrumentada, pasa de largo."""
+    registro = _registro_actual.get()
+    if registro is None:
+        return execute(sql, params, many, context)
+    return registro(execute, sql, params, many, context)
+
+
+def _instalar_wrapper(sender, connection, **kwargs):
+    # execute_wrappers sobrevive a las reconexiones del mismo DatabaseWrapper
+    if _envolver not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_envolver)
+
+
+# -------------------------------
+# MIDDLEWARE
+# -------------------------------
+
+class ConsultasLentasMiddleware:
+    """
+    Instrumentación opcional de la base de datos. Con CONSULTAS_LENTAS_MS = None
+    (por defecto) no instala nada. Emite líneas JSON en el logger
+    ``memory_game.consultas``:
+    - ``lenta``: consulta por encima del umbral, con vista, SQL normalizado, origen y plan;
+    - ``n_mas_1``: misma forma de consulta repetida CONSULTAS_REPETIDAS veces o más en la petición.
+    Con el registro desactivado no se instala nada y el middleware solo pasa la petición.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.umbral_ms = getattr(settings, 'CONSULTAS_LENTAS_MS', None)
+        self.repetidas = getattr(settings, 'CONSULTAS_REPETIDAS', 10)
+        self.explain = getattr(settings, 'CONSULTAS_EXPLAIN', True)
+        self._asincrono = iscoroutinefunction(get_response)
+        if self._asincrono:
+            markcoroutinefunction(self)
+        if self.umbral_ms is not None:
+            connection_created.connect(_instalar_wrapper, dispatch_uid='consultas_lentas')
+            for conexion in connections.all(initialized_only=True):
+                _instalar_wrapper(None, conexion)
+
+    def __call__(self, request):
+        if self._asincrono:
+            return self.__acall__(request)
+        if self.umbral_ms is None:
+            return self.get_response(request)
+
+        registro = RegistroConsultas(request, self.umbral_ms, self.repetidas, self.explain)
+        token = _registro_actual.set(registro)
+        try:
+            response = self.get_response(request)
+        finally:
+            _registro_actual.reset(token)
+        registro.cerrar()
+        return response
+
+    async def __acall__(self, request):
+        if self.umbral_ms is None:
+            return await self.get_response(request)
+
+        registro = RegistroConsultas(request, self.umbral_ms, self.repetidas, self.explain)
+        token = _registro_actual.set(registro)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _registro_actual.reset(token)
+        registro.cerrar()
+        return response
@@ -0,0 +1,7 @@
+# memory_game/context_processors.py
+from django.conf import settings
+
+
+def cache_fragmentos(request):
+    """Segundos de vida de los fragmentos {% cache %} de las plantillas (CACHE_FRAGMENTOS_S)."""
+    return {'cache_fragmentos_s': getattr(settings, 'CACHE_FRAGMENTOS_S', 3600)}
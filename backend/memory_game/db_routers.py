@@ -0,0 +1,380 @@
+# memory_game/db_routers.py
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Count, Max, Min, Sum
+
+# -------------------------------
+# ESTADO POR PETICIÓN
+# -------------------------------
+
+# True mientras se ejecuta una vista de solo lectura que puede ir a la réplica
+_usar_replica = ContextVar('usar_replica', default=False)
+# True si la petición actual ya escribió en tablas del juego (read-your-writes)
+_hubo_escritura = ContextVar('hubo_escritura', default=False)
+
+SESSION_KEY_PRIMARIA = 'db_primaria_hasta'
+
+
+def replica_alias():
+    """Alias de la réplica configurada, o None si solo existe 'default'."""
+    alias = getattr(settings, 'REPLICA_DB_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def leer_de_replica():
+    """Dentro del bloque, las lecturas se envían a la réplica (si existe)."""
+    token = _usar_replica.set(True)
+    try:
+        yield
+    finally:
+        _usar_replica.reset(token)
+
+
+def sesion_fijada_a_primaria(request):
+    """True si la sesión escribió hace poco y debe seguir leyendo de la primaria."""
+    session = getattr(request, 'session', None)
+    if session is None:
+        return False
+    return session.get(SESSION_KEY_PRIMARIA, 0) > time.time()
+
+
+async def asesion_fijada_a_primaria(request):
+    session = getattr(request, 'session', None)
+    if session is None:
+        return False
+    return await session.aget(SESSION_KEY_PRIMARIA, 0) > time.time()
+
+
+def read_replica(view):
+    """Decorador para vistas de solo lectura (estadísticas, historial, espectadores)."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def awrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or await asesion_fijada_a_primaria(request):
+                return await view(request, *args, **kwargs)
+            # El ContextVar se copia a los hilos del ORM asíncrono: el router lo ve
+            with leer_de_replica():
+                return await view(request, *args, **kwargs)
+        return awrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or sesion_fijada_a_primaria(request):
+            return view(request, *args, **kwargs)
+        with leer_de_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+# -------------------------------
+# ROUTER
+# -------------------------------
+
+class ReplicaRouter:
+    """
+    Escrituras siempre a 'default'. Las lecturas van a la réplica solo dentro de
+    vistas marcadas con ``read_replica`` y mientras la petición no haya escrito.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _usar_replica.get() or _hubo_escritura.get():
+            return None
+        # Relaciones de un objeto ya cargado se leen de la misma base que el objeto
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == 'memory_game':
+            _hubo_escritura.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica y primaria contienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != replica_alias()
+
+
+# -------------------------------
+# SHARDS DE PARTIDAS
+# -------------------------------
+
+# Modelos repartidos por usuario: las partidas, sus cartas y sus intentos. Las cartas
+# sin partida (catálogo por nivel) y el resto de tablas viven solo en 'default'.
+MODELOS_SHARD = {'partida', 'carta', 'intento'}
+
+# Cada shard numera Partida, Carta e Intento en su propio rango [i·2^40, (i+1)·2^40):
+# el shard de una partida se deduce de su id (state/<id>/ no necesita saber el usuario).
+# 'default' es el shard 0, así que los ids existentes siguen siendo válidos.
+BITS_SHARD = 40
+
+
+def shards():
+    """Alias de los shards en orden; el primero es siempre 'default'."""
+    return getattr(settings, 'SHARDS', ['default'])
+
+
+def hay_shards():
+    return len(shards()) > 1
+
+
+def es_modelo_shard(model):
+    """``model`` es un modelo o una instancia (también request.user, un SimpleLazyObject)."""
+    return model._meta.app_label == 'memory_game' and model._meta.model_name in MODELOS_SHARD
+
+
+def _jump_hash(clave, cubetas):
+    """
+    Jump consistent hash (Lamping y Veach): al pasar de N a N+1 shards solo cambia
+    de shard 1/(N+1) de los usuarios, en lugar de casi todos como con un módulo.
+    """
+    b, j = -1, 0
+    while j < cubetas:
+        b = j
+        clave = (clave * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((clave >> 33) + 1)))
+    return b
+
+
+def shard_de_usuario(usuario_id):
+    """Alias donde viven las partidas e intentos del usuario."""
+    lista = shards()
+    return lista[_jump_hash(int(usuario_id), len(lista))]
+
+
+def shard_de_partida(partida_id):
+    """Alias de la partida según el rango de su id (None si no corresponde a ningún shard)."""
+    lista = shards()
+    indice = int(partida_id) >> BITS_SHARD
+    return lista[indice] if indice < len(lista) else None
+
+
+def shard_de_objeto(obj):
+    """Shard que corresponde a una instancia (hint 'instance' del router), o None."""
+    if isinstance(obj, get_user_model()):
+        return shard_de_usuario(obj.pk) if obj.pk else None
+    if not es_modelo_shard(obj):
+        return None
+    nombre = obj._meta.model_name
+    if nombre == 'partida':
+        if obj.pk:
+            return shard_de_partida(obj.pk)
+        return shard_de_usuario(obj.usuario_id) if obj.usuario_id else None
+    if obj.partida_id:
+        return shard_de_partida(obj.partida_id)
+    if nombre == 'intento' and obj.usuario_id:
+        return shard_de_usuario(obj.usuario_id)
+    return 'default'  # cartas de catálogo
+
+
+def para_partida(model, partida_id):
+    """Manager de ``model`` enrutado al shard de la partida ``partida_id``."""
+    return model._default_manager.db_manager(hints={'partida_id': partida_id})
+
+
+def para_usuario(model, usuario_id):
+    """Manager de ``model`` enrutado al shard del usuario ``usuario_id``."""
+    return model._default_manager.db_manager(hints={'usuario_id': usuario_id})
+
+
+def agrupar_por_shard(usuario_ids):
+    """{alias: [ids]} conservando el orden de ``usuario_ids`` dentro de cada shard."""
+    grupos = {}
+    for usuario_id in usuario_ids:
+        grupos.setdefault(shard_de_usuario(usuario_id), []).append(usuario_id)
+    return grupos
+
+
+def reservar_rango_ids(alias):
+    """
+    Lleva las secuencias de Partida, Carta e Intento del shard al inicio de su
+    rango de ids. Se llama tras cada migrate (signals.py); es idempotente.
+    """
+    indice = shards().index(alias)
+    if indice == 0:
+        return
+    base = indice << BITS_SHARD
+    conexion = connections[alias]
+    from .models import Carta, Intento, Partida
+
+    with conexion.cursor() as cursor:
+        for model in (Partida, Carta, Intento):
+            tabla = model._meta.db_table
+            if conexion.vendor == 'postgresql':
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f"GREATEST(%s, (SELECT coalesce(max(id), 0) FROM {conexion.ops.quote_name(tabla)})))",
+                    [tabla, base],
+                )
+            elif conexion.vendor == 'sqlite':
+                # AUTOINCREMENT: el siguiente id es sqlite_sequence.seq + 1
+                cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s", [base, tabla])
+                if not cursor.rowcount:
+                    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [tabla, base])
+            else:
+                raise NotImplementedError(f"Rangos de ids por shard no soportados en {conexion.vendor}")
+
+
+# -------------------------------
+# AGREGACIÓN ENTRE SHARDS
+# -------------------------------
+
+def en_cada_shard(queryset):
+    """El mismo queryset en cada shard. Sin shards, tal cual (el router decide, réplica incluida)."""
+    if not hay_shards():
+        return [queryset]
+    return [queryset.using(alias) for alias in shards()]
+
+
+def _combinar(agregado, a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if isinstance(agregado, (Count, Sum)):
+        return a + b
+    return min(a, b) if isinstance(agregado, Min) else max(a, b)
+
+
+def agregar_en_shards(queryset, agrupar=(), **agregados):
+    """
+    ``queryset.values(*agrupar).annotate(**agregados)`` (sin ``agrupar``, un
+    ``aggregate``) en cada shard, combinando los parciales: Count y Sum se suman,
+    Min y Max se comparan. Avg no se puede combinar: pedir Sum y Count y dividir.
+    Con ``agrupar`` devuelve una lista de dicts; sin él, un dict.
+    """
+    for nombre, agregado in agregados.items():
+        if not isinstance(agregado, (Count, Sum, Min, Max)):
+            raise ValueError(f"{nombre}: solo Count, Sum, Min y Max se combinan entre shards")
+
+    total = {}
+    for qs in en_cada_shard(queryset):
+        if agrupar:
+            filas = qs.order_by().values(*agrupar).annotate(**agregados)
+        else:
+            filas = [qs.aggregate(**agregados)]
+        for fila in filas:
+            clave = tuple(fila[c] for c in agrupar)
+            previa = total.get(clave)
+            if previa is None:
+                total[clave] = dict(fila)
+                continue
+            for nombre, agregado in agregados.items():
+                previa[nombre] = _combinar(agregado, previa[nombre], fila[nombre])
+
+    if agrupar:
+        return list(total.values())
+    return total.get((), dict.fromkeys(agregados))
+
+
+class ShardRouter:
+    """
+    Va antes de ReplicaRouter. Con un solo shard no decide nada. Con varios, las
+    partidas, cartas e intentos se leen y escriben en el shard de su usuario,
+    deducido de los hints: la instancia relacionada (``usuario.partida_set``,
+    ``partida.carta_set``...) o ``partida_id``/``usuario_id`` (para_partida,
+    para_usuario). Sin hints, 'default'. Los shards no tienen réplica.
+    """
+
+    def _shard(self, model, hints):
+        if 'partida_id' in hints:
+            return shard_de_partida(hints['partida_id'])
+        if 'usuario_id' in hints:
+            return shard_de_usuario(hints['usuario_id'])
+        instance = hints.get('instance')
+        return shard_de_objeto(instance) if instance is not None else None
+
+    def db_for_read(self, model, **hints):
+        if not hay_shards():
+            return None
+        if es_modelo_shard(model):
+            return self._shard(model, hints)
+        instance = hints.get('instance')
+        if instance is not None and es_modelo_shard(instance):
+            # usuario, nivel o ronda de una partida: fuera del shard, sin heredar su base
+            return ReplicaRouter().db_for_read(model) or 'default'
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not hay_shards():
+            return None
+        if es_modelo_shard(model):
+            alias = self._shard(model, hints)
+            if alias is not None:
+                _hubo_escritura.set(True)
+            return alias
+        instance = hints.get('instance')
+        if instance is not None and es_modelo_shard(instance):
+            return ReplicaRouter().db_for_write(model)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if hay_shards() and es_modelo_shard(obj1) and es_modelo_shard(obj2):
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Todos los shards tienen el esquema completo; las tablas ajenas quedan vacías
+        return None
+
+
+# -------------------------------
+# MIDDLEWARE: STICKINESS DE SESIÓN
+# -------------------------------
+
+class ReplicaStickinessMiddleware:
+    """
+    Si la petición escribió en tablas del juego (p. ej. terminó una partida), la
+    sesión lee de la primaria durante REPLICA_STICKY_SECONDS para ver sus propios cambios.
+    Bajo ASGI funciona en modo asíncrono para no forzar un salto a hilo por petición.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._asincrono = iscoroutinefunction(get_response)
+        if self._asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self._asincrono:
+            return self.__acall__(request)
+        token = _hubo_escritura.set(False)
+        try:
+            response = self.get_response(request)
+            if _hubo_escritura.get() and replica_alias() and hasattr(request, 'session'):
+                segundos = getattr(settings, 'REPLICA_STICKY_SECONDS', 30)
+                ahora = time.time()
+                # Renovar solo a mitad de ventana para no guardar la sesión en cada jugada
+                if request.session.get(SESSION_KEY_PRIMARIA, 0) < ahora + segundos / 2:
+                    request.session[SESSION_KEY_PRIMARIA] = ahora + segundos
+
+        finally:
+            _hubo_escritura.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        token = _hubo_escritura.set(False)
+        try:
+            # sync_to_async devuelve al contexto los ContextVar que el router marcó en su hilo
+            response = await self.get_response(request)
+            if _hubo_escritura.get() and replica_alias() and hasattr(request, 'session'):
+                segundos = getattr(settings, 'REPLICA_STICKY_SECONDS', 30)
+                ahora = time.time()
+                if await request.session.aget(SESSION_KEY_PRIMARIA, 0) < ahora + segundos / 2:
+                    await request.session.aset(SESSION_KEY_PRIMARIA, ahora + segundos)
+        finally:
+            _hubo_escritura.reset(token)
+        return response
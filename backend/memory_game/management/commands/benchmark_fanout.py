@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from memory_game.services.broker import medir_fanout
+
+
+class Command(BaseCommand):
+    help = "Mide la latencia de fan-out del broker de salas con N espectadores por sala."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--espectadores', type=int, nargs='+', default=[1, 100, 1000])
+        parser.add_argument('--eventos', type=int, default=200)
+        parser.add_argument('--intervalo-ms', type=float, default=20, help="Pausa entre eventos publicados.")
+
+    def handle(self, *args, **options):
+        for n in options['espectadores']:
+            resultado = medir_fanout(n, options['eventos'], options['intervalo_ms'] / 1000)
+            self.stdout.write(f"Sala con {n} espectadores")
+            for clave, valor in resultado.items():
+                if clave != 'espectadores':
+                    self.stdout.write(f"  {clave:<20} {valor}")
+
+        self.stdout.write(self.style.SUCCESS("Benchmark completado."))
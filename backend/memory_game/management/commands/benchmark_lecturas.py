@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from memory_game.services.simulador import medir_lecturas
+
+
+class Command(BaseCommand):
+    help = (
+        "Sondeo concurrente de estado y estadísticas: vistas síncronas con un worker "
+        "WSGI frente a las vistas async servidas por ASGI en un solo bucle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, nargs='+', default=[1, 10, 50])
+        parser.add_argument('--peticiones', type=int, default=600)
+        parser.add_argument(
+            '--latencia-bd-ms', type=float, default=0,
+            help="Retardo añadido a cada consulta (simula una base de datos remota).",
+        )
+
+    def handle(self, *args, **options):
+        for n in options['clientes']:
+            resultados = medir_lecturas(n, options['peticiones'], options['latencia_bd_ms'])
+            self.stdout.write(f"{n} clientes concurrentes")
+            for servidor, datos in resultados.items():
+                valores = '  '.join(f"{clave}={valor}" for clave, valor in datos.items())
+                self.stdout.write(f"  {servidor}  {valores}")
+        self.stdout.write(self.style.SUCCESS("Benchmark completado."))
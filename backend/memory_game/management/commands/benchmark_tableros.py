@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from memory_game.services.simulador import ESTRATEGIAS, medir_tablero
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el coste por jugada y de serialización en tableros de distintos tamaños "
+        "(crea y borra niveles temporales). Usar una base de desarrollo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cartas', type=int, nargs='+', default=[12, 1000, 10000])
+        parser.add_argument('--jugadas', type=int, default=300, help="Turnos jugados por tablero.")
+        parser.add_argument('--estrategia', choices=sorted(ESTRATEGIAS), default='memoria_perfecta')
+        parser.add_argument('--semilla', type=int)
+
+    def handle(self, *args, **options):
+        for cartas in options['cartas']:
+            resultado = medir_tablero(cartas, options['jugadas'], options['estrategia'], options['semilla'])
+            self.stdout.write(f"Tablero de {cartas} cartas")
+            for clave, valor in resultado.items():
+                if clave != 'cartas':
+                    self.stdout.write(f"  {clave:<24} {valor}")
+
+        self.stdout.write(self.style.SUCCESS("Benchmark completado."))
@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from memory_game.calentamiento import PASOS, calentar, medir_arranque, sondear
+
+
+class Command(BaseCommand):
+    help = (
+        "Calienta el proceso (rutas, plantillas, niveles, conexiones) e informa lo que "
+        "tarda cada paso. Con --comparar mide la primera petición de un worker nuevo "
+        "sin calentar y calentado frente a su régimen estable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pasos', nargs='+', choices=list(PASOS), help="Solo estos pasos.")
+        parser.add_argument('--comparar', action='store_true')
+        parser.add_argument('--repeticiones', type=int, default=20)
+        # Uso interno: proceso hijo de --comparar
+        parser.add_argument('--sonda', help="==SUPPRESS==")
+
+    def handle(self, *args, **options):
+        if options['sonda']:
+            datos = json.loads(options['sonda'])
+            self.stdout.write(json.dumps(sondear(**datos)))
+            return
+
+        if not options['comparar']:
+            informe = calentar(options['pasos'])
+            for nombre, paso in informe['pasos'].items():
+                error = informe['errores'].get(nombre, '')
+                self.stdout.write(f"  {nombre:<12} {paso['ms']:>9.2f} ms  n={paso['n']}  {error}")
+            self.stdout.write(f"  {'total':<12} {informe['ms_total']:>9.2f} ms")
+            return
+
+        try:
+            resultados = medir_arranque(options['repeticiones'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for modo, datos in resultados.items():
+            calentamiento = datos['calentamiento']
+            extra = f" (calentamiento {calentamiento['ms_total']} ms)" if calentamiento else ''
+            self.stdout.write(f"{modo}{extra}")
+            for ruta, r in datos['rutas'].items():
+                self.stdout.write(
+                    f"  {ruta:<40} {r['estado']}  primera {r['ms_primera']:>8.2f} ms  "
+                    f"mediana {r['ms_mediana']:>7.2f} ms  ({r['ms_primera'] / r['ms_mediana']:.1f}x)"
+                )
+        self.stdout.write(self.style.SUCCESS("Medición completada."))
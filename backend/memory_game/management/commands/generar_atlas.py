@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from memory_game.models import Nivel
+from memory_game.services.atlas import generar_todos
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera los atlas de sprites que falten (uno por nivel y tamaño de casilla) a "
+        "partir de las imágenes de las cartas de catálogo y reescribe el manifiesto que "
+        "lee el tablero. Los que ya existen no se tocan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nivel', action='append', help="Solo estos niveles (nombre; se puede repetir).")
+        parser.add_argument(
+            '--limpiar', action='store_true',
+            help="Borra los atlas que ya no corresponden a las cartas actuales.",
+        )
+
+    def handle(self, *args, **options):
+        niveles = Nivel.objects.order_by('dificultad')
+        if options['nivel']:
+            niveles = niveles.filter(nombre__in=options['nivel'])
+        resultado = generar_todos(list(niveles), limpiar=options['limpiar'])
+        self.stdout.write(f"Atlas generados: {resultado['generados']}")
+        if options['limpiar']:
+            self.stdout.write(f"Atlas obsoletos borrados: {resultado['borrados']}")
+        self.stdout.write(self.style.SUCCESS("Atlas al día."))
@@ -0,0 +1,56 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from memory_game.perfilado import directorio_perfiles, leer_perfiles, plegar_perfiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Agrega los perfiles guardados por PerfiladoMiddleware en formato plegado "
+        "(una pila por línea + muestras), listo para flamegraph.pl o speedscope."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vista', help="Solo perfiles cuya vista contenga este texto.")
+        parser.add_argument('--salida', help="Archivo de salida (por defecto, stdout).")
+        parser.add_argument(
+            '--sin-vista', action='store_true',
+            help="No separar por vista: una sola raíz para todas las peticiones.",
+        )
+        parser.add_argument('--top', type=int, default=15, help="Funciones más costosas en el resumen.")
+        parser.add_argument('--limpiar', action='store_true', help="Borra los perfiles tras agregarlos.")
+
+    def handle(self, *args, **options):
+        perfiles = list(leer_perfiles(options['vista']))
+        if not perfiles:
+            raise CommandError(f"No hay perfiles en {directorio_perfiles()}.")
+
+        pilas = plegar_perfiles(perfiles, por_vista=not options['sin_vista'])
+        lineas = [f"{pila} {n}" for pila, n in sorted(pilas.items())]
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lineas) + '\n')
+        else:
+            self.stdout.write('\n'.join(lineas))
+
+        # Resumen por stderr para no mezclarlo con la salida plegada
+        muestras = sum(pilas.values())
+        por_vista = Counter()
+        for p in perfiles:
+            por_vista[p['vista']] += 1
+        propias = Counter()
+        for pila, n in pilas.items():
+            propias[pila.rsplit(';', 1)[-1]] += n
+
+        self.stderr.write(f"{len(perfiles)} perfiles, {muestras} muestras")
+        for vista, n in por_vista.most_common():
+            ms = sorted(p['ms'] for p in perfiles if p['vista'] == vista)
+            self.stderr.write(f"  {vista:<55} {n:>5} peticiones  p50 {ms[len(ms) // 2]} ms")
+        self.stderr.write(f"Tiempo propio (top {options['top']}):")
+        for funcion, n in propias.most_common(options['top']):
+            self.stderr.write(f"  {100 * n / muestras:5.1f}%  {funcion}")
+
+        if options['limpiar']:
+            for archivo in directorio_perfiles().glob('*.json'):
+                archivo.unlink(missing_ok=True)
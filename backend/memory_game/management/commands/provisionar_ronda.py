@@ -0,0 +1,74 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from memory_game.models import Nivel
+from memory_game.services.torneos import TAMANO_LOTE, provisionar_ronda
+
+PREFIJO_PRUEBA = 'torneo_'
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea en bloque una partida por jugador para una ronda de torneo, con la "
+        "misma disposición barajada para todos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nivel', required=True, help="Nombre del nivel.")
+        parser.add_argument('--nombre', default='')
+        parser.add_argument('--usuarios', nargs='*', help="Nombres de usuario (por defecto, todos los activos).")
+        parser.add_argument(
+            '--jugadores-prueba', type=int,
+            help=f"Crea N usuarios '{PREFIJO_PRUEBA}N' y provisiona solo esos (medición).",
+        )
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Jugadores por transacción.")
+        parser.add_argument('--semilla', type=int)
+        parser.add_argument(
+            '--limpiar', action='store_true',
+            help="Al terminar, borra los usuarios de prueba (y en cascada sus partidas).",
+        )
+
+    def handle(self, *args, **options):
+        nivel = Nivel.objects.filter(nombre=options['nivel']).first()
+        if nivel is None:
+            raise CommandError(f"No existe el nivel {options['nivel']!r}.")
+
+        if options['jugadores_prueba']:
+            nombres = [f'{PREFIJO_PRUEBA}{i}' for i in range(options['jugadores_prueba'])]
+            User.objects.bulk_create([User(username=n) for n in nombres], ignore_conflicts=True)
+            usuarios = User.objects.filter(username__in=nombres)
+        elif options['usuarios']:
+            usuarios = User.objects.filter(username__in=options['usuarios'])
+        else:
+            usuarios = User.objects.filter(is_active=True)
+        usuario_ids = list(usuarios.order_by('pk').values_list('pk', flat=True))
+        if not usuario_ids:
+            raise CommandError("No hay jugadores para la ronda.")
+
+        def progreso(hechos, total):
+            self.stdout.write(f"  {hechos}/{total} partidas")
+
+        inicio = time.perf_counter()
+        ronda = provisionar_ronda(
+            usuario_ids, nivel,
+            nombre=options['nombre'],
+            semilla=options['semilla'],
+            tamano_lote=options['lote'],
+            progreso=progreso,
+        )
+        segundos = time.perf_counter() - inicio
+
+        self.stdout.write(
+            f"Ronda {ronda.pk} ({ronda.nombre}): {ronda.jugadores} partidas de "
+            f"{len(ronda.disposicion)} cartas en {segundos:.2f} s "
+            f"({ronda.jugadores / segundos:.0f} partidas/s)"
+        )
+
+        if options['limpiar'] and options['jugadores_prueba']:
+            User.objects.filter(username__regex=rf'^{PREFIJO_PRUEBA}\d+$').delete()
+            ronda.delete()
+            self.stdout.write("Usuarios de prueba borrados.")
+
+        self.stdout.write(self.style.SUCCESS("Ronda provisionada."))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from memory_game.services.estadisticas import TAMANO_BLOQUE, reconstruir_estadisticas
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula Estadistica (una fila por usuario y nivel) a partir del historial de "
+        "partidas, por bloques de usuarios en paralelo. Si se interrumpe, la siguiente "
+        "ejecución continúa desde el último bloque confirmado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=1)
+        parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE, help="Ids de usuario por bloque.")
+        parser.add_argument('--desde-cero', action='store_true', help="Ignora el punto de control.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+
+        def progreso(hasta, partidas, filas):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  usuarios < {hasta}: {partidas} partidas, {filas} estadísticas")
+
+        total = reconstruir_estadisticas(
+            procesos=options['procesos'],
+            tamano_bloque=options['bloque'],
+            desde_cero=options['desde_cero'],
+            progreso=progreso,
+        )
+        segundos = time.perf_counter() - inicio
+        if total.get('reanudada_desde'):
+            self.stdout.write(f"Reanudada desde el usuario {total['reanudada_desde']}.")
+        self.stdout.write(self.style.SUCCESS(
+            f"{total['filas']} estadísticas de {total['partidas']} partidas en {total['bloques']} bloques "
+            f"({segundos:.1f} s, {total['partidas'] / segundos if segundos else 0:.0f} partidas/s)."
+        ))
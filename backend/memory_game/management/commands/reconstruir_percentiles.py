@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from memory_game.models import Nivel
+from memory_game.services.percentiles import reconstruir_bosquejos
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los bosquejos de percentiles por nivel a partir de las partidas ganadas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nivel', help="Nombre del nivel a reconstruir (por defecto, todos).")
+
+    def handle(self, *args, **options):
+        nivel = None
+        if options['nivel']:
+            nivel = Nivel.objects.filter(nombre__iexact=options['nivel']).first()
+            if nivel is None:
+                raise CommandError(f"Nivel no encontrado: {options['nivel']}")
+
+        procesadas = reconstruir_bosquejos(nivel)
+        self.stdout.write(self.style.SUCCESS(f"Bosquejos reconstruidos con {procesadas} partidas ganadas."))
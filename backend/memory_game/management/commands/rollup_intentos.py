@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from memory_game.services.retention import purgar_intentos, rollup_intentos
+
+
+class Command(BaseCommand):
+    help = "Agrega los Intento por usuario/nivel/día y purga los que salen de la ventana de retención."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retencion-dias', type=int,
+            default=getattr(settings, 'INTENTO_RETENCION_DIAS', 30),
+            help="Días de Intento crudos que se conservan (por defecto INTENTO_RETENCION_DIAS).",
+        )
+        parser.add_argument(
+            '--sin-purga', action='store_true',
+            help="Solo agrega, sin borrar Intento antiguos.",
+        )
+
+    def handle(self, *args, **options):
+        dias = rollup_intentos()
+        self.stdout.write(f"Días agregados: {dias}")
+
+        if not options['sin_purga']:
+            borrados = purgar_intentos(options['retencion_dias'])
+            self.stdout.write(f"Intentos purgados: {borrados}")
+
+        self.stdout.write(self.style.SUCCESS("Rollup de intentos completado."))
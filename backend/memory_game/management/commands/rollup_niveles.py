@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from memory_game.services.analytics import rollup_niveles
+
+
+class Command(BaseCommand):
+    help = "Actualiza de forma incremental la analítica diaria por nivel (ResumenNivelDiario)."
+
+    def handle(self, *args, **options):
+        escritos = rollup_niveles()
+        self.stdout.write(self.style.SUCCESS(f"Resúmenes por nivel actualizados: {escritos}"))
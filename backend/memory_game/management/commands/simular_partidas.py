@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from memory_game.models import Nivel
+from memory_game.services.percentiles import reconstruir_bosquejos
+from memory_game.services.simulador import (
+    ESTRATEGIAS,
+    limpiar_simulacion,
+    simular_en_memoria,
+    simular_en_paralelo,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula partidas completas contra el motor (sin HTTP) y reporta partidas/s, "
+        "jugadas/s, consultas por jugada y tiempo en base de datos. Escribe en la base "
+        "configurada: usar una base de desarrollo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partidas', type=int, default=1000)
+        parser.add_argument('--niveles', nargs='*', help="Nombres de niveles (por defecto, todos).")
+        parser.add_argument('--estrategia', choices=sorted(ESTRATEGIAS), default='memoria_perfecta')
+        parser.add_argument('--memoria', type=float, help="Probabilidad de recordar una carta (sobrescribe la estrategia).")
+        parser.add_argument('--procesos', type=int, default=1, help="Procesos en paralelo (expone contención).")
+        parser.add_argument('--semilla', type=int)
+        parser.add_argument(
+            '--en-memoria', action='store_true',
+            help="Juega solo contra el núcleo Tablero, sin base de datos (ignora --procesos).",
+        )
+        parser.add_argument(
+            '--limpiar', action='store_true',
+            help="Al terminar, borra los usuarios simulados y reconstruye los percentiles.",
+        )
+
+    def handle(self, *args, **options):
+        niveles = Nivel.objects.order_by('dificultad')
+        if options['niveles']:
+            niveles = niveles.filter(nombre__in=options['niveles'])
+        niveles = list(niveles)
+        if not niveles:
+            raise CommandError("No hay niveles para simular.")
+
+        if options['en_memoria']:
+            resultado = simular_en_memoria(
+                options['partidas'], niveles,
+                estrategia=options['estrategia'],
+                memoria=options['memoria'],
+                semilla=options['semilla'],
+            )
+        else:
+            resultado = simular_en_paralelo(
+                options['partidas'], niveles,
+                procesos=options['procesos'],
+                estrategia=options['estrategia'],
+                memoria=options['memoria'],
+                semilla=options['semilla'],
+            )
+
+        self.stdout.write(f"Niveles: {', '.join(n.nombre for n in niveles)}")
+        self.stdout.write(f"Estrategia: {options['estrategia']}  Procesos: {options['procesos']}")
+        for clave, valor in resultado.resumen().items():
+            self.stdout.write(f"  {clave:<24} {valor}")
+
+        if options['limpiar']:
+            limpiar_simulacion()
+            reconstruir_bosquejos()
+            self.stdout.write("Usuarios simulados borrados.")
+
+        self.stdout.write(self.style.SUCCESS("Simulación completada."))
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from memory_game.services.temporizadores import TAMANO_LOTE, Temporizador, medir_cola, vencer_partidas
+
+
+class Command(BaseCommand):
+    help = (
+        "Da por perdidas las partidas cuya fecha límite pasó. Por defecto queda en "
+        "marcha con las partidas activas en una cola de vencimientos; --una-vez hace "
+        "una sola pasada (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help="Una pasada y termina.")
+        parser.add_argument(
+            '--intervalo', type=float, default=1.0,
+            help="Segundos máximos entre lecturas de partidas nuevas (por defecto 1).",
+        )
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Partidas por transacción.")
+        parser.add_argument(
+            '--medir', type=int, metavar='N',
+            help="Solo mide la cola de vencimientos con N partidas (sin base de datos).",
+        )
+
+    def handle(self, *args, **options):
+        if options['medir']:
+            self.stdout.write(json.dumps(medir_cola(options['medir'])))
+            return
+
+        if options['una_vez']:
+            perdidas = vencer_partidas(tamano_lote=options['lote'])
+            self.stdout.write(self.style.SUCCESS(f"Partidas vencidas: {perdidas}"))
+            return
+
+        temporizador = Temporizador(tamano_lote=options['lote'])
+        self.stdout.write(f"Vigilando vencimientos (intervalo {options['intervalo']} s)...")
+        try:
+            temporizador.ejecutar(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS(f"Detenido. Partidas en cola: {len(temporizador.cola)}"))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory_game', '0003_estadistica_intentos_estadistica_nivel_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partida',
+            name='carta_pendiente',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='memory_game.carta'),
+        ),
+        migrations.AddField(
+            model_name='partida',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory_game', '0005_marcaagua_alter_intento_fecha_resumenintentos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partida',
+            name='motivo_fin',
+            field=models.CharField(blank=True, choices=[('victoria', 'Victoria'), ('derrota', 'Derrota'), ('abandono', 'Abandono')], max_length=10, null=True),
+        ),
+        migrations.AlterField(
+            model_name='partida',
+            name='ultima_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='ResumenNivelDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('iniciadas', models.IntegerField(default=0)),
+                ('ganadas', models.IntegerField(default=0)),
+                ('perdidas', models.IntegerField(default=0)),
+                ('abandonadas', models.IntegerField(default=0)),
+                ('movimientos_total', models.BigIntegerField(default=0)),
+                ('duracion_total_ms', models.BigIntegerField(default=0)),
+                ('nivel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='memory_game.nivel')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('nivel', 'dia'), name='resumen_nivel_dia_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory_game', '0006_partida_motivo_fin_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadistica',
+            name='duracion_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='estadistica',
+            index=models.Index(fields=['nivel', 'duracion_ms'], name='estadistica_nivel_duracion'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+import re
+
+from django.db import migrations, transaction
+
+LOTE = 1000
+
+# Copia del parser de services/duraciones.py de esta versión: la migración no debe
+# cambiar si el servicio cambia después
+_TIEMPO = re.compile(r'^\s*(?:(\d+):)?(\d+):(\d{1,2})(?:\.(\d{1,3}))?\s*$')
+MAX_DURACION_MS = 2_147_483_647
+
+
+def tiempo_a_ms(texto):
+    m = _TIEMPO.match(str(texto or ''))
+    if not m:
+        return None
+    horas, minutos, segundos, fraccion = m.groups()
+    ms = ((int(horas or 0) * 60 + int(minutos)) * 60 + int(segundos)) * 1000
+    if fraccion:
+        ms += int(fraccion.ljust(3, '0'))
+    return min(ms, MAX_DURACION_MS)
+
+
+def rellenar_duraciones(apps, schema_editor):
+    """
+    Copia 'tiempo' ('MM:SS') a duracion_ms por lotes de pk, cada uno en su propia
+    transacción, para no bloquear la tabla entera durante el despliegue.
+    """
+    Estadistica = apps.get_model('memory_game', 'Estadistica')
+    db = schema_editor.connection.alias
+    pendientes = Estadistica.objects.using(db).filter(duracion_ms__isnull=True).order_by('pk')
+
+    ultimo = 0
+    while True:
+        lote = list(pendientes.filter(pk__gt=ultimo).only('pk', 'tiempo')[:LOTE])
+        if not lote:
+            break
+        ultimo = lote[-1].pk
+
+        cambiados = []
+        for e in lote:
+            e.duracion_ms = tiempo_a_ms(e.tiempo)
+            if e.duracion_ms is not None:
+                cambiados.append(e)
+        with transaction.atomic(using=db):
+            Estadistica.objects.using(db).bulk_update(cambiados, ['duracion_ms'])
+
+
+class Migration(migrations.Migration):
+    # Cada lote confirma por separado
+    atomic = False
+
+    dependencies = [
+        ('memory_game', '0007_estadistica_duracion_ms'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_duraciones, migrations.RunPython.noop),
+    ]
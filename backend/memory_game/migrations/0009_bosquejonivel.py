@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory_game', '0008_backfill_estadistica_duracion_ms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BosquejoNivel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metrica', models.CharField(choices=[('movimientos', 'Movimientos'), ('duracion_ms', 'Duración (ms)')], max_length=20)),
+                ('datos', models.JSONField(default=dict)),
+                ('total', models.IntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('nivel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='memory_game.nivel')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('nivel', 'metrica'), name='bosquejo_nivel_metrica_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def rellenar_pares(apps, schema_editor):
+    # Solo las partidas activas: las terminadas ya no reciben jugadas
+    Partida = apps.get_model('memory_game', 'Partida')
+    Carta = apps.get_model('memory_game', 'Carta')
+    cartas = (
+        Carta.objects.filter(partida=OuterRef('pk')).order_by()
+        .values('partida').annotate(n=Count('pk')).values('n')
+    )
+    Partida.objects.filter(activa=True).update(pares=Coalesce(Subquery(cartas), 0) / 2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory_game', '0009_bosquejonivel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partida',
+            name='pares',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='carta',
+            index=models.Index(fields=['partida', 'posicion'], name='carta_partida_posicion'),
+        ),
+        migrations.RunPython(rellenar_pares, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory_game', '0010_partida_pares_carta_partida_posicion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sala',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=12, unique=True)),
+                ('max_jugadores', models.PositiveSmallIntegerField(default=4)),
+                ('estado', models.CharField(choices=[('esperando', 'Esperando jugadores'), ('jugando', 'Jugando'), ('terminada', 'Terminada')], default='esperando', max_length=10)),
+                ('turno', models.PositiveSmallIntegerField(default=0)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('creador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='salas_creadas', to=settings.AUTH_USER_MODEL)),
+                ('nivel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='memory_game.nivel')),
+                ('partida', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sala', to='memory_game.partida')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JugadorSala',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orden', models.PositiveSmallIntegerField()),
+                ('aciertos', models.IntegerField(default=0)),
+                ('unido', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('sala', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jugadores', to='memory_game.sala')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('sala', 'usuario'), name='jugador_sala_unico'), models.UniqueConstraint(fields=('sala', 'orden'), name='jugador_sala_orden_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory_game', '0011_sala_jugadorsala'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RondaTorneo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('disposicion', models.JSONField(default=list)),
+                ('jugadores', models.PositiveIntegerField(default=0)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('nivel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='memory_game.nivel')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='partida',
+            name='ronda',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='partidas', to='memory_game.rondatorneo'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fusionar_duplicadas(apps, schema_editor):
+    """
+    guardar_estadistica creaba una fila por partida: se dejan en una por usuario y
+    nivel (la más reciente) sumando los totales y con el mejor tiempo (la menor
+    duracion_ms) del grupo. `manage.py reconstruir_estadisticas` las recalcula
+    después a partir de las partidas.
+    """
+    Estadistica = apps.get_model('memory_game', 'Estadistica')
+    db = schema_editor.connection.alias
+    grupos = (
+        Estadistica.objects.using(db)
+        .values('usuario_id', 'nivel_id')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+    )
+    for grupo in grupos.iterator():
+        filas = list(
+            Estadistica.objects.using(db)
+            .filter(usuario_id=grupo['usuario_id'], nivel_id=grupo['nivel_id'])
+            .order_by('-id')
+        )
+        destino = filas[0]
+        total = sum(f.total_partidas for f in filas)
+        if total:
+            destino.promedio_intentos = round(sum(f.promedio_intentos * f.total_partidas for f in filas) / total, 2)
+        destino.victorias = sum(f.victorias for f in filas)
+        destino.derrotas = sum(f.derrotas for f in filas)
+        destino.total_partidas = total
+        con_duracion = [f for f in filas if f.duracion_ms is not None]
+        if con_duracion:
+            mejor = min(con_duracion, key=lambda f: f.duracion_ms)
+            destino.duracion_ms = mejor.duracion_ms
+            destino.tiempo = mejor.tiempo
+        destino.save()
+        Estadistica.objects.using(db).filter(pk__in=[f.pk for f in filas[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory_game', '0012_rondatorneo_partida_ronda'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='estadistica',
+            constraint=models.UniqueConstraint(
+                fields=('usuario', 'nivel'), name='estadistica_usuario_nivel_unica',
+            ),
+        ),
+    ]
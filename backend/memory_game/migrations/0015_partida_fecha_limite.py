@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory_game', '0014_partidas_en_shards'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partida',
+            name='fecha_limite',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='partida',
+            index=models.Index(condition=models.Q(('activa', True), ('fecha_limite__isnull', False)), fields=['fecha_limite'], name='partida_activa_limite'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory_game', '0015_partida_fecha_limite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carta',
+            name='imagen',
+            field=models.ImageField(blank=True, null=True, upload_to='cartas/'),
+        ),
+    ]
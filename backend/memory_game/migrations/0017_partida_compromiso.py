@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory_game', '0016_carta_imagen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partida',
+            name='compromiso',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+    ]
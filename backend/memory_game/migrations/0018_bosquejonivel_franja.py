@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memory_game', '0017_partida_compromiso'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='bosquejonivel',
+            name='bosquejo_nivel_metrica_unico',
+        ),
+        migrations.AddField(
+            model_name='bosquejonivel',
+            name='franja',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='bosquejonivel',
+            constraint=models.UniqueConstraint(fields=('nivel', 'metrica', 'franja'), name='bosquejo_nivel_metrica_franja_unico'),
+        ),
+    ]
@@ -2,6 +2,77 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+
+# -------------------------------
+# SEGUIMIENTO DE CAMPOS MODIFICADOS
+# -------------------------------
+class CambiosRastreados(models.Model):
+    """
+    Recuerda los valores leídos de la base de datos. save() sin update_fields
+    escribe solo las columnas que cambiaron (más las auto_now) y, si no cambió
+    nada, no ejecuta ningún UPDATE. Los valores se comparan con ==: un campo
+    mutable modificado en sitio no se detecta (hay que reasignarlo).
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._valores_bd = dict(zip(field_names, values))
+        return instance
+
+    def campos_modificados(self):
+        """attname de los campos que difieren de lo leído o guardado (None si nunca se leyó)."""
+        originales = getattr(self, '_valores_bd', None)
+        if originales is None:
+            return None
+        actuales = self.__dict__
+        return {
+            campo.attname for campo in self._meta.concrete_fields
+            if campo.attname in actuales and (
+                campo.attname not in originales or actuales[campo.attname] != originales[campo.attname]
+            )
+        }
+
+    def marcar_guardado(self, campos=None):
+        """Toma los valores actuales (todos o solo ``campos``) como los que hay en la base de datos."""
+        actuales = self.__dict__
+        if campos is None:
+            self._valores_bd = {
+                c.attname: actuales[c.attname] for c in self._meta.concrete_fields if c.attname in actuales
+            }
+            return
+        originales = self.__dict__.setdefault('_valores_bd', {})
+        for nombre in campos:
+            attname = self._meta.get_field(nombre).attname
+            if attname in actuales:
+                originales[attname] = actuales[attname]
+
+    def save(self, *args, **kwargs):
+        if (
+            args or self._state.adding or getattr(self, '_valores_bd', None) is None
+            or kwargs.get('force_insert') or kwargs.get('update_fields') is not None
+        ):
+            super().save(*args, **kwargs)
+            self.marcar_guardado(kwargs.get('update_fields'))
+            return
+
+        cambiados = self.campos_modificados()
+        if not cambiados:
+            return
+        if self._meta.pk.attname not in cambiados:
+            kwargs['update_fields'] = cambiados | {
+                c.attname for c in self._meta.concrete_fields if getattr(c, 'auto_now', False)
+            }
+        super().save(**kwargs)
+        self.marcar_guardado(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self.marcar_guardado(fields)
+
 # -------------------------------
 # MODELO: NIVEL
 # -------------------------------
@@ -18,17 +89,26 @@ class Nivel(models.Model):
 # -------------------------------
 # MODELO: CARTA
 # -------------------------------
-class Carta(models.Model):
+class Carta(CambiosRastreados):
     partida = models.ForeignKey('Partida', on_delete=models.CASCADE, null=True, blank=True)
-    nivel = models.ForeignKey('Nivel', on_delete=models.CASCADE)
+    # Sin FK en la base: las cartas de partida viven en el shard del jugador y los niveles en 'default'
+    nivel = models.ForeignKey('Nivel', on_delete=models.CASCADE, db_constraint=False)
     identificador = models.CharField(max_length=100, null=True, blank=True)
     nombre = models.CharField(max_length=100, null=True, blank=True)
     simbolo = models.CharField(max_length=10, null=True, blank=True)
     posicion = models.IntegerField()
     valor = models.CharField(max_length=100, null=True, blank=True)
+    # Imagen de las cartas de catálogo: se sirve empaquetada en el atlas del nivel (services/atlas.py)
+    imagen = models.ImageField(upload_to='cartas/', null=True, blank=True)
     revelada = models.BooleanField(default=False)
     emparejada = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Cada jugada lee solo las cartas que toca: coste constante en tableros grandes
+            models.Index(fields=['partida', 'posicion'], name='carta_partida_posicion'),
+        ]
+
     def __str__(self):
         return f"{self.simbolo or '❓'} ({self.nivel.nombre})"
 
@@ -36,16 +116,55 @@ class Carta(models.Model):
 # -------------------------------
 # MODELO: PARTIDA
 # -------------------------------
-class Partida(models.Model):
-    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
-    nivel = models.ForeignKey(Nivel, on_delete=models.CASCADE)
+class Partida(CambiosRastreados):
+    MOTIVO_VICTORIA = 'victoria'
+    MOTIVO_DERROTA = 'derrota'      # tiempo agotado o salida del tablero
+    MOTIVO_ABANDONO = 'abandono'    # reemplazada por una partida nueva
+    MOTIVOS_FIN = [
+        (MOTIVO_VICTORIA, 'Victoria'),
+        (MOTIVO_DERROTA, 'Derrota'),
+        (MOTIVO_ABANDONO, 'Abandono'),
+    ]
+
+    # Usuario, nivel y ronda viven en 'default' y la partida en el shard del usuario
+    # (db_routers.ShardRouter): sin FK en la base, el ORM mantiene la relación
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    nivel = models.ForeignKey(Nivel, on_delete=models.CASCADE, db_constraint=False)
     fecha_inicio = models.DateTimeField(auto_now_add=True)
     fecha_fin = models.DateTimeField(null=True, blank=True)
     activa = models.BooleanField(default=True)
     ganada = models.BooleanField(default=False)
     movimientos = models.IntegerField(default=0)
     aciertos = models.IntegerField(default=0)
-    ultima_actualizacion = models.DateTimeField(auto_now=True)
+    ultima_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
+    motivo_fin = models.CharField(max_length=10, choices=MOTIVOS_FIN, null=True, blank=True)
+    # Concurrencia optimista: cada jugada incrementa la versión (compare-and-set)
+    version = models.IntegerField(default=0)
+    carta_pendiente = models.ForeignKey(
+        'Carta', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    # Pares del tablero al crearla (0 = partida anterior a este campo: se cuentan las cartas)
+    pares = models.PositiveIntegerField(default=0)
+    # Ronda de torneo que la creó (todas las partidas de la ronda comparten tablero)
+    ronda = models.ForeignKey(
+        'RondaTorneo', on_delete=models.SET_NULL, null=True, blank=True, related_name='partidas',
+        db_constraint=False,
+    )
+    # Hora a la que vence (individuales): pasada, el servidor la da por perdida aunque el
+    # navegador ya no esté (services/temporizadores.py). Null = sin límite.
+    fecha_limite = models.DateTimeField(null=True, blank=True)
+    # Partidas jugadas sin conexión: identificador del compromiso firmado con el que se
+    # registró (services/offline.py). Único: cada compromiso se registra una sola vez
+    compromiso = models.CharField(max_length=32, null=True, blank=True, unique=True)
+
+    class Meta:
+        indexes = [
+            # Vencimientos pendientes: solo las partidas activas con límite
+            models.Index(
+                fields=['fecha_limite'], name='partida_activa_limite',
+                condition=models.Q(activa=True, fecha_limite__isnull=False),
+            ),
+        ]
 
     def __str__(self):
         return f"Partida de {self.usuario.username} - Nivel {self.nivel.nombre}"
@@ -53,6 +172,7 @@ class Partida(models.Model):
     def finalizar(self, ganada=True):
         self.ganada = ganada
         self.activa = False
+        self.motivo_fin = self.MOTIVO_VICTORIA if ganada else self.MOTIVO_DERROTA
         self.fecha_fin = timezone.now()
         self.save()
 
@@ -61,11 +181,12 @@ class Partida(models.Model):
 # MODELO: INTENTO
 # -------------------------------
 class Intento(models.Model):
-    usuario = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    # En el shard del usuario, como su partida (sin FK en la base hacia 'default')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, db_constraint=False)
     partida = models.ForeignKey('Partida', on_delete=models.CASCADE, null=True, blank=True)
     carta1 = models.ForeignKey('Carta', on_delete=models.CASCADE, related_name='carta1', null=True, blank=True)
     carta2 = models.ForeignKey('Carta', on_delete=models.CASCADE, related_name='carta2', null=True, blank=True)
-    fecha = models.DateTimeField(auto_now_add=True)
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
     es_correcto = models.BooleanField(default=False)
 
     def __str__(self):
@@ -76,10 +197,11 @@ class Intento(models.Model):
 # -------------------------------
 # MODELO: ESTADISTICA
 # -------------------------------
-class Estadistica(models.Model):
+class Estadistica(CambiosRastreados):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     nivel = models.ForeignKey('Nivel', on_delete=models.CASCADE, null=True, blank=True)
-    tiempo = models.CharField(max_length=10, default="00:00")
+    tiempo = models.CharField(max_length=10, default="00:00")  # solo presentación, derivado de duracion_ms
+    duracion_ms = models.PositiveIntegerField(null=True, blank=True)  # mejor tiempo: la victoria más rápida
     intentos = models.IntegerField(default=0)
     pares_encontrados = models.IntegerField(default=0)
     total_partidas = models.IntegerField(default=0)
@@ -87,7 +209,181 @@ class Estadistica(models.Model):
     derrotas = models.IntegerField(default=0)
     promedio_intentos = models.FloatField(default=0.0)
 
+    class Meta:
+        indexes = [
+            # Rankings y promedios de tiempo por nivel
+            models.Index(fields=['nivel', 'duracion_ms'], name='estadistica_nivel_duracion'),
+        ]
+        constraints = [
+            # Una fila por usuario y nivel (permite reconstruirlas con upserts en bloque)
+            models.UniqueConstraint(
+                fields=['usuario', 'nivel'], name='estadistica_usuario_nivel_unica',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.usuario.username if self.usuario else 'Desconocido'} - {self.nivel.nombre if self.nivel else 'Sin nivel'}"
 
 
+
+
+# -------------------------------
+# MODELO: RESUMEN DIARIO DE INTENTOS
+# -------------------------------
+class ResumenIntentos(models.Model):
+    """Agregado por usuario, nivel y día de los Intento ya purgados o por purgar."""
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    nivel = models.ForeignKey('Nivel', on_delete=models.CASCADE, null=True, blank=True)
+    dia = models.DateField()
+    intentos = models.IntegerField(default=0)
+    correctos = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'nivel', 'dia'],
+                name='resumen_intentos_unico',
+                nulls_distinct=False,
+            ),
+        ]
+
+    @property
+    def precision(self):
+        return self.correctos / self.intentos if self.intentos else 0.0
+
+    def __str__(self):
+        return f"{self.usuario.username if self.usuario else 'Desconocido'} - {self.dia} ({self.correctos}/{self.intentos})"
+
+
+# -------------------------------
+# MODELO: MARCA DE AGUA (PROCESOS INCREMENTALES)
+# -------------------------------
+class MarcaAgua(models.Model):
+    """Hasta dónde llegó un proceso incremental (rollups, reconstrucciones)."""
+    nombre = models.CharField(max_length=100, unique=True)
+    fecha = models.DateTimeField(null=True, blank=True)
+    valor = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.fecha or self.valor}"
+
+
+# -------------------------------
+# MODELO: RESUMEN DIARIO POR NIVEL
+# -------------------------------
+class ResumenNivelDiario(models.Model):
+    """Analítica por nivel y día de inicio de las partidas (mantenida por rollup_niveles)."""
+    nivel = models.ForeignKey('Nivel', on_delete=models.CASCADE)
+    dia = models.DateField()
+    iniciadas = models.IntegerField(default=0)
+    ganadas = models.IntegerField(default=0)
+    perdidas = models.IntegerField(default=0)
+    abandonadas = models.IntegerField(default=0)
+    movimientos_total = models.BigIntegerField(default=0)
+    duracion_total_ms = models.BigIntegerField(default=0)  # solo partidas terminadas
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['nivel', 'dia'], name='resumen_nivel_dia_unico'),
+        ]
+
+    @property
+    def terminadas(self):
+        return self.ganadas + self.perdidas + self.abandonadas
+
+    def __str__(self):
+        return f"{self.nivel.nombre} - {self.dia}"
+
+
+# -------------------------------
+# MODELO: BOSQUEJO DE PERCENTILES POR NIVEL
+# -------------------------------
+class BosquejoNivel(models.Model):
+    """
+    Bosquejo de cuantiles (BosquejoCuantiles serializado) de una métrica de las
+    partidas ganadas. Cada nivel y métrica se reparte en varias franjas que se
+    combinan al leer, para que las victorias no esperen todas el mismo bloqueo.
+    """
+    METRICA_MOVIMIENTOS = 'movimientos'
+    METRICA_DURACION = 'duracion_ms'
+    METRICAS = [
+        (METRICA_MOVIMIENTOS, 'Movimientos'),
+        (METRICA_DURACION, 'Duración (ms)'),
+    ]
+
+    nivel = models.ForeignKey('Nivel', on_delete=models.CASCADE)
+    metrica = models.CharField(max_length=20, choices=METRICAS)
+    franja = models.PositiveSmallIntegerField(default=0)
+    datos = models.JSONField(default=dict)
+    total = models.IntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['nivel', 'metrica', 'franja'], name='bosquejo_nivel_metrica_franja_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.nivel.nombre} - {self.metrica} #{self.franja} ({self.total})"
+
+
+# -------------------------------
+# MODELO: SALA MULTIJUGADOR
+# -------------------------------
+class Sala(models.Model):
+    """Tablero compartido por turnos entre 2..N jugadores, con espectadores de solo lectura."""
+    ESTADO_ESPERANDO = 'esperando'
+    ESTADO_JUGANDO = 'jugando'
+    ESTADO_TERMINADA = 'terminada'
+    ESTADOS = [
+        (ESTADO_ESPERANDO, 'Esperando jugadores'),
+        (ESTADO_JUGANDO, 'Jugando'),
+        (ESTADO_TERMINADA, 'Terminada'),
+    ]
+
+    codigo = models.CharField(max_length=12, unique=True)
+    creador = models.ForeignKey(User, on_delete=models.CASCADE, related_name='salas_creadas')
+    nivel = models.ForeignKey(Nivel, on_delete=models.CASCADE)
+    # Tablero de la sala (no cuenta como partida individual del creador)
+    partida = models.OneToOneField(Partida, on_delete=models.CASCADE, related_name='sala')
+    max_jugadores = models.PositiveSmallIntegerField(default=4)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=ESTADO_ESPERANDO)
+    turno = models.PositiveSmallIntegerField(default=0)  # orden del jugador que mueve
+    creada = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Sala {self.codigo} ({self.estado})"
+
+
+class JugadorSala(models.Model):
+    sala = models.ForeignKey(Sala, on_delete=models.CASCADE, related_name='jugadores')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    orden = models.PositiveSmallIntegerField()
+    aciertos = models.IntegerField(default=0)
+    unido = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sala', 'usuario'], name='jugador_sala_unico'),
+            models.UniqueConstraint(fields=['sala', 'orden'], name='jugador_sala_orden_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario.username} en {self.sala.codigo}"
+
+
+# -------------------------------
+# MODELO: RONDA DE TORNEO
+# -------------------------------
+class RondaTorneo(models.Model):
+    """Ronda provisionada en bloque: una partida por jugador, todas con la misma disposición."""
+    nombre = models.CharField(max_length=100)
+    nivel = models.ForeignKey(Nivel, on_delete=models.CASCADE)
+    # Valores por posición, compartidos por todas las partidas de la ronda
+    disposicion = models.JSONField(default=list)
+    jugadores = models.PositiveIntegerField(default=0)
+    creada = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.nombre} ({self.nivel.nombre}, {self.jugadores} jugadores)"
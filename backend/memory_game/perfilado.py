@@ -0,0 +1,210 @@
+# memory_game/perfilado.py
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+# -------------------------------
+# CONFIGURACIÓN
+# -------------------------------
+
+CABECERA = 'HTTP_X_PERFILAR'     # X-Perfilar: 1 (solo staff)
+ROTAR_CADA = 0.1                 # se rota tras guardar ~10% de PERFILADO_MAXIMO
+
+
+def _config(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def directorio_perfiles():
+    return Path(_config('PERFILADO_DIR', settings.BASE_DIR / 'perfiles'))
+
+
+# -------------------------------
+# MUESTREADOR DE PILAS
+# -------------------------------
+
+class Muestreador:
+    """
+    Hilo que cada ``intervalo`` segundos toma la pila del hilo observado con
+    sys._current_frames() y la cuenta en formato "plegado" (marco;marco;marco),
+    el que consumen flamegraph.pl y speedscope. El hilo observado no se instrumenta:
+    solo paga el GIL que toma el muestreador.
+    """
+
+    def __init__(self, hilo_id, intervalo, raiz=None):
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.raiz = raiz          # código donde se corta la pila (el middleware)
+        self.pilas = Counter()
+        self.segundos = 0.0
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name='perfilado', daemon=True)
+
+    def iniciar(self):
+        self._inicio = time.perf_counter()
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._parar.set()
+        self._hilo.join()
+        self.segundos = time.perf_counter() - self._inicio
+        return self
+
+    def _muestrear(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.hilo_id)
+            if frame is not None:
+                self.pilas[self._plegar(frame)] += 1
+
+    def _plegar(self, frame):
+        marcos = []
+        while frame is not None and frame.f_code is not self.raiz:
+            marcos.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}")
+            frame = frame.f_back
+        return ';'.join(reversed(marcos))
+
+
+# -------------------------------
+# ALMACENAMIENTO CON ROTACIÓN
+# -------------------------------
+
+_guardados = itertools.count(1)   # perfiles guardados por este proceso
+
+
+def guardar_perfil(datos):
+    """
+    Escribe el perfil como JSON. Listar y ordenar el directorio cuesta O(archivos),
+    así que la rotación a los PERFILADO_MAXIMO más recientes no se hace en cada
+    guardado sino cada ROTAR_CADA · PERFILADO_MAXIMO guardados del proceso.
+    """
+    directorio = directorio_perfiles()
+    directorio.mkdir(parents=True, exist_ok=True)
+    nombre = f"{time.time_ns()}_{os.getpid()}_{datos['vista'].replace('.', '-')}.json"
+    temporal = directorio / f".{nombre}.tmp"
+    temporal.write_text(json.dumps(datos), encoding='utf-8')
+    temporal.replace(directorio / nombre)  # el comando nunca lee un archivo a medias
+
+    maximo = _config('PERFILADO_MAXIMO', 500)
+    if next(_guardados) % max(1, int(maximo * ROTAR_CADA)) == 0:
+        rotar_perfiles(directorio, maximo)
+    return nombre
+
+
+def rotar_perfiles(directorio, maximo):
+    # El nombre empieza por la marca de tiempo: orden alfabético = cronológico
+    archivos = sorted(directorio.glob('*.json'))
+    for viejo in archivos[:max(0, len(archivos) - maximo)]:
+        viejo.unlink(missing_ok=True)
+
+
+def leer_perfiles(vista=None):
+    for archivo in sorted(directorio_perfiles().glob('*.json')):
+        try:
+            datos = json.loads(archivo.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue  # borrado por la rotación de otro proceso
+        if vista is None or vista in datos['vista']:
+            yield datos
+
+
+def plegar_perfiles(perfiles, por_vista=True):
+    """Suma las pilas de varios perfiles; con ``por_vista`` cada vista es una raíz del flamegraph."""
+    total = Counter()
+    for perfil in perfiles:
+        for pila, n in perfil['pilas'].items():
+            total[f"{perfil['vista']};{pila}" if por_vista else pila] += n
+    return total
+
+
+# -------------------------------
+# MIDDLEWARE
+# -------------------------------
+
+class PerfiladoMiddleware:
+    """
+    Perfila por muestreo las peticiones a vistas de PERFILADO_MODULOS cuando:
+    - un usuario staff envía la cabecera ``X-Perfilar: 1``, o
+    - la petición cae en la fracción PERFILADO_MUESTREO (0 = desactivado).
+    Desactivado cuesta una comparación por petición: el sorteo va antes que la
+    cabecera y el usuario, y la vista se resuelve antes de arrancar el muestreador
+    para no perfilar peticiones que luego se descartarían. Bajo ASGI se muestrea el
+    hilo del bucle de eventos (las partes síncronas de la vista corren en otros hilos).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.muestreo = _config('PERFILADO_MUESTREO', 0.0)
+        self.intervalo = _config('PERFILADO_INTERVALO', 0.005)
+        self.modulos = tuple(_config('PERFILADO_MODULOS', ('memory_game.views', 'memory_game.services.game_engine')))
+        # Se decide una vez: inspeccionar en cada petición costaría más que el propio chequeo
+        self._asincrono = iscoroutinefunction(get_response)
+        if self._asincrono:
+            markcoroutinefunction(self)
+
+    def _sorteo(self):
+        return self.muestreo > 0 and random.random() < self.muestreo
+
+    def _vista(self, request):
+        """La función de la vista si está en PERFILADO_MODULOS; None si no se perfila."""
+        try:
+            funcion = resolve(request.path_info, getattr(request, 'urlconf', None)).func
+        except Resolver404:
+            return None
+        return funcion if funcion.__module__.startswith(self.modulos) else None
+
+    def __call__(self, request):
+        if self._asincrono:
+            return self.__acall__(request)
+        # Una petición sorteada no mira al usuario (ni carga la sesión para ello)
+        sorteada = self._sorteo()
+        pedido = not sorteada and CABECERA in request.META and request.user.is_staff
+        if not (sorteada or pedido) or (vista := self._vista(request)) is None:
+            return self.get_response(request)
+
+        muestreador = Muestreador(threading.get_ident(), self.intervalo, raiz=self.__call__.__code__).iniciar()
+        try:
+            response = self.get_response(request)
+        finally:
+            muestreador.detener()
+        return self._registrar(request, response, muestreador, vista, pedido)
+
+    async def __acall__(self, request):
+        sorteada = self._sorteo()
+        pedido = not sorteada and CABECERA in request.META and (await request.auser()).is_staff
+        if not (sorteada or pedido) or (vista := self._vista(request)) is None:
+            return await self.get_response(request)
+
+        muestreador = Muestreador(threading.get_ident(), self.intervalo, raiz=self.__acall__.__code__).iniciar()
+        try:
+            response = await self.get_response(request)
+        finally:
+            muestreador.detener()
+        return self._registrar(request, response, muestreador, vista, pedido)
+
+    def _registrar(self, request, response, muestreador, funcion, pedido):
+        nombre = guardar_perfil({
+            'vista': f"{funcion.__module__}.{funcion.__name__}",
+            'ruta': request.path,
+            'metodo': request.method,
+            'estado': response.status_code,
+            'ms': round(1000 * muestreador.segundos, 2),
+            'intervalo_ms': 1000 * self.intervalo,
+            'muestras': sum(muestreador.pilas.values()),
+            'pilas': dict(muestreador.pilas),
+        })
+        if pedido:
+            response['X-Perfil'] = nombre
+        return response
@@ -0,0 +1,171 @@
+# memory_game/services/analytics.py
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..db_routers import agregar_en_shards, en_cada_shard
+from ..models import Estadistica, MarcaAgua, Nivel, Partida, ResumenNivelDiario
+
+MARCA_NIVELES = 'rollup_niveles_diario'
+
+# Margen de re-lectura sobre la marca de agua: transacciones que confirmaron
+# tarde con un ultima_actualizacion anterior a la marca no se pierden
+SOLAPAMIENTO = timedelta(minutes=5)
+
+
+def _rango_dia(dia):
+    inicio = timezone.make_aware(datetime.combine(dia, time.min))
+    return inicio, inicio + timedelta(days=1)
+
+
+# -------------------------------
+# ROLLUP INCREMENTAL POR NIVEL Y DÍA
+# -------------------------------
+
+def rollup_niveles():
+    """
+    Recalcula los ResumenNivelDiario afectados por partidas modificadas desde la
+    marca de agua (por ultima_actualizacion). Devuelve cuántos resúmenes escribió.
+    """
+    marca, _ = MarcaAgua.objects.get_or_create(nombre=MARCA_NIVELES)
+
+    cambiadas = Partida.objects.all()
+    if marca.fecha:
+        cambiadas = cambiadas.filter(ultima_actualizacion__gt=marca.fecha - SOLAPAMIENTO)
+
+    nueva_marca = agregar_en_shards(cambiadas, m=Max('ultima_actualizacion'))['m']
+    if nueva_marca is None:
+        return 0
+
+    # Buckets (día -> niveles) tocados desde la última corrida, en todos los shards
+    sucios = {}
+    for qs in en_cada_shard(cambiadas):
+        for fila in qs.annotate(dia=TruncDate('fecha_inicio')).values('dia', 'nivel_id').distinct():
+            sucios.setdefault(fila['dia'], set()).add(fila['nivel_id'])
+
+    duracion = ExpressionWrapper(F('fecha_fin') - F('fecha_inicio'), output_field=DurationField())
+    terminada = Q(activa=False)
+
+    resumenes = []
+    for dia, niveles in sucios.items():
+        inicio, fin = _rango_dia(dia)
+        # Cada nivel tiene partidas en varios shards: los conteos y sumas se combinan
+        filas = agregar_en_shards(
+            Partida.objects.filter(nivel_id__in=niveles, fecha_inicio__gte=inicio, fecha_inicio__lt=fin),
+            agrupar=('nivel_id',),
+            iniciadas=Count('id'),
+            ganadas=Count('id', filter=Q(ganada=True)),
+            abandonadas=Count('id', filter=terminada & Q(ganada=False, motivo_fin=Partida.MOTIVO_ABANDONO)),
+            # Partidas antiguas sin motivo_fin cuentan como perdidas
+            perdidas=Count('id', filter=terminada & Q(ganada=False) & ~Q(motivo_fin=Partida.MOTIVO_ABANDONO)),
+            movimientos_total=Sum('movimientos'),
+            duracion_total=Sum(duracion, filter=terminada & Q(fecha_fin__isnull=False)),
+        )
+        for f in filas:
+            resumenes.append(ResumenNivelDiario(
+                nivel_id=f['nivel_id'],
+                dia=dia,
+                iniciadas=f['iniciadas'],
+                ganadas=f['ganadas'],
+                perdidas=f['perdidas'],
+                abandonadas=f['abandonadas'],
+                movimientos_total=f['movimientos_total'] or 0,
+                duracion_total_ms=int(f['duracion_total'].total_seconds() * 1000) if f['duracion_total'] else 0,
+            ))
+
+    with transaction.atomic():
+        ResumenNivelDiario.objects.bulk_create(
+            resumenes,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['nivel', 'dia'],
+            update_fields=[
+                'iniciadas', 'ganadas', 'perdidas', 'abandonadas',
+                'movimientos_total', 'duracion_total_ms',
+            ],
+        )
+        marca.fecha = nueva_marca
+        marca.save(update_fields=['fecha', 'actualizado'])
+
+    return len(resumenes)
+
+
+# -------------------------------
+# TABLERO DEL ADMINISTRADOR
+# -------------------------------
+
+def dashboard_niveles(dias=30):
+    """Totales por nivel de los últimos ``dias`` leídos solo de los resúmenes diarios."""
+    desde = timezone.localdate() - timedelta(days=dias - 1)
+    totales = {
+        f['nivel_id']: f
+        for f in ResumenNivelDiario.objects.filter(dia__gte=desde).values('nivel_id').annotate(
+            iniciadas=Sum('iniciadas'),
+            ganadas=Sum('ganadas'),
+            perdidas=Sum('perdidas'),
+            abandonadas=Sum('abandonadas'),
+            movimientos=Sum('movimientos_total'),
+            duracion_ms=Sum('duracion_total_ms'),
+        )
+    }
+
+    filas = []
+    for nivel in Nivel.objects.order_by('dificultad'):
+        t = totales.get(nivel.id)
+        if not t:
+            continue
+        terminadas = t['ganadas'] + t['perdidas'] + t['abandonadas']
+        filas.append({
+            'nivel': nivel,
+            'iniciadas': t['iniciadas'],
+            'ganadas': t['ganadas'],
+            'perdidas': t['perdidas'],
+            'abandonadas': t['abandonadas'],
+            'tasa_victoria': round(100 * t['ganadas'] / terminadas, 1) if terminadas else 0,
+            'promedio_movimientos': round(t['movimientos'] / t['iniciadas'], 1) if t['iniciadas'] else 0,
+            'duracion_promedio_s': round(t['duracion_ms'] / terminadas / 1000, 1) if terminadas else 0,
+        })
+    return filas
+
+
+# -------------------------------
+# RANKINGS POR TIEMPO
+# -------------------------------
+
+def ranking_tiempos(nivel, limite=10):
+    """Mejores tiempos del nivel; recorre el índice (nivel, duracion_ms) en orden."""
+    return list(
+        Estadistica.objects
+        .filter(nivel=nivel, duracion_ms__isnull=False)
+        .order_by('duracion_ms')
+        .values('usuario__username', 'duracion_ms', 'tiempo')[:limite]
+    )
+
+
+_AGREGADOS_TIEMPO = {
+    'mejor_tiempo_ms': Min('duracion_ms'),
+    'tiempo_promedio_ms': Avg('duracion_ms'),
+}
+
+
+def _redondear_tiempos(r):
+    if r['tiempo_promedio_ms'] is not None:
+        r['tiempo_promedio_ms'] = round(r['tiempo_promedio_ms'])
+    return r
+
+
+def resumen_tiempos(**filtros):
+    """Mejor tiempo y tiempo promedio (ms) de las estadísticas que cumplen los filtros."""
+    return _redondear_tiempos(
+        Estadistica.objects.filter(duracion_ms__isnull=False, **filtros).aggregate(**_AGREGADOS_TIEMPO)
+    )
+
+
+async def aresumen_tiempos(**filtros):
+    """resumen_tiempos con el ORM asíncrono."""
+    return _redondear_tiempos(
+        await Estadistica.objects.filter(duracion_ms__isnull=False, **filtros).aaggregate(**_AGREGADOS_TIEMPO)
+    )
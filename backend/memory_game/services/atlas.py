@@ -0,0 +1,212 @@
+# memory_game/services/atlas.py
+"""
+Atlas de sprites de las cartas: las imágenes de las cartas de catálogo de un nivel
+se empaquetan (Pillow) en una sola imagen por tamaño de casilla, y el tablero
+descarga una imagen en vez de una por carta.
+
+Los atlas se generan al guardar o borrar una carta de catálogo (signals.py) o con
+``manage.py generar_atlas``, nunca en una petición: junto a ellos queda un
+manifiesto por nivel (disposición y archivos) que la vista del tablero solo lee.
+
+El nombre del archivo lleva un hash de lo que entra en él (símbolos, contenido de
+las imágenes, tamaño y formato): si las cartas del nivel no cambian, el nombre
+tampoco y el atlas ya generado se reutiliza; si cambian (también si se sube otra
+imagen con el mismo nombre de archivo), sale otro nombre (caché inmutable en el
+navegador) y el viejo queda para ``manage.py generar_atlas --limpiar``.
+"""
+import hashlib
+import io
+import json
+import math
+import posixpath
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from ..models import Carta
+
+# Cambiarlo invalida todos los atlas (cambio de formato o de disposición)
+VERSION_ATLAS = 1
+
+DIRECTORIO = 'atlas'
+FORMATO = 'WEBP'
+CALIDAD = 85
+
+def tamanos():
+    """Lado en px de cada casilla: 1x y 2x (pantallas de alta densidad)."""
+    return tuple(getattr(settings, 'ATLAS_TAMANOS', (96, 192)))
+
+
+# -------------------------------
+# DISPOSICIÓN
+# -------------------------------
+
+def sprites_de(cartas):
+    """
+    Cartas que entran en el atlas: una por símbolo (las de un par comparten imagen),
+    solo las que tienen imagen, ordenadas por símbolo.
+    """
+    por_simbolo = {}
+    for carta in sorted(cartas, key=lambda c: (c.simbolo or '', c.posicion, c.pk)):
+        if carta.imagen and carta.simbolo not in por_simbolo:
+            por_simbolo[carta.simbolo] = carta
+    return list(por_simbolo.values())
+
+
+def _rejilla(n):
+    columnas = max(1, math.ceil(math.sqrt(n)))
+    return columnas, max(1, math.ceil(n / columnas))
+
+
+def huella_imagen(carta):
+    """SHA-256 del contenido de la imagen de la carta."""
+    huella = hashlib.sha256()
+    with carta.imagen.open('rb') as archivo:
+        for bloque in archivo.chunks():
+            huella.update(bloque)
+    return huella.hexdigest()
+
+
+def nombre_atlas(nivel_id, sprites, tamano, huellas):
+    """``huellas``: {simbolo: huella_imagen} de los sprites."""
+    huella = hashlib.sha256(f'{VERSION_ATLAS}|{FORMATO}|{CALIDAD}|{tamano}'.encode())
+    for carta in sprites:
+        huella.update(f'|{carta.simbolo}={huellas[carta.simbolo]}'.encode())
+    return posixpath.join(DIRECTORIO, f'nivel{nivel_id}-{tamano}-{huella.hexdigest()[:16]}.{FORMATO.lower()}')
+
+
+def nombre_manifiesto(nivel_id):
+    return posixpath.join(DIRECTORIO, f'nivel{nivel_id}.json')
+
+
+def _clave_cache(nivel_id):
+    return f'atlas:nivel:{nivel_id}'
+
+
+# -------------------------------
+# GENERACIÓN
+# -------------------------------
+
+def componer(sprites, tamano):
+    """Bytes del atlas: cada imagen recortada al cuadrado y escalada a ``tamano`` px, en filas."""
+    columnas, filas = _rejilla(len(sprites))
+    atlas = Image.new('RGBA', (columnas * tamano, filas * tamano), (0, 0, 0, 0))
+    for i, carta in enumerate(sprites):
+        with carta.imagen.open('rb') as archivo, Image.open(archivo) as imagen:
+            casilla = ImageOps.fit(imagen.convert('RGBA'), (tamano, tamano), Image.Resampling.LANCZOS)
+        atlas.paste(casilla, ((i % columnas) * tamano, (i // columnas) * tamano))
+
+    salida = io.BytesIO()
+    atlas.save(salida, FORMATO, quality=CALIDAD, method=4)
+    return salida.getvalue()
+
+
+def _asegurar(nombre, sprites, tamano):
+    """Genera el atlas si aún no existe. Devuelve True si lo generó."""
+    if default_storage.exists(nombre):
+        return False
+    guardado = default_storage.save(nombre, ContentFile(componer(sprites, tamano)))
+    if guardado != nombre:
+        # Otro proceso lo generó a la vez: el contenido es el mismo, sobra la copia
+        default_storage.delete(guardado)
+    return True
+
+
+def generar_nivel(nivel, cartas=None):
+    """
+    Genera los atlas que falten del nivel (``cartas``: las de catálogo, si ya están
+    cargadas) y reescribe su manifiesto. Devuelve (nombres de los atlas vigentes,
+    cuántos se generaron); sin cartas con imagen, borra el manifiesto.
+    """
+    sprites = sprites_de(cartas_de_catalogo(nivel) if cartas is None else cartas)
+    manifiesto = nombre_manifiesto(nivel.pk)
+    if not sprites:
+        default_storage.delete(manifiesto)
+        cache.delete(_clave_cache(nivel.pk))
+        return set(), 0
+
+    huellas = {carta.simbolo: huella_imagen(carta) for carta in sprites}
+    columnas, filas = _rejilla(len(sprites))
+    archivos, generados = {}, 0
+    for tamano in tamanos():
+        nombre = nombre_atlas(nivel.pk, sprites, tamano, huellas)
+        generados += _asegurar(nombre, sprites, tamano)
+        archivos[tamano] = nombre
+
+    datos = {
+        'archivos': archivos,
+        'tamano': tamanos()[0],
+        'columnas': columnas,
+        'filas': filas,
+        'sprites': {carta.simbolo: i for i, carta in enumerate(sprites)},
+    }
+    default_storage.delete(manifiesto)
+    default_storage.save(manifiesto, ContentFile(json.dumps(datos).encode()))
+    cache.delete(_clave_cache(nivel.pk))
+    return set(archivos.values()), generados
+
+
+def _leer_manifiesto(nivel_id):
+    nombre = nombre_manifiesto(nivel_id)
+    if not default_storage.exists(nombre):
+        return None
+    with default_storage.open(nombre) as archivo:
+        datos = json.load(archivo)
+    # JSON convierte las claves en texto
+    datos['archivos'] = {int(tamano): nombre for tamano, nombre in datos['archivos'].items()}
+    return datos
+
+
+def atlas_para(nivel):
+    """
+    Atlas ya generado del nivel, leído de su manifiesto (cacheado): no genera nada ni
+    consulta la base de datos. None si el nivel no tiene atlas.
+    {'urls': {tamano: url}, 'tamano', 'columnas', 'filas', 'sprites': {simbolo: indice}}
+    """
+    clave = _clave_cache(nivel.pk)
+    datos = cache.get(clave)
+    if datos is None:
+        # Sin manifiesto no se cachea: puede estar a punto de escribirse
+        datos = _leer_manifiesto(nivel.pk)
+        if datos is None:
+            return None
+        cache.set(clave, datos, getattr(settings, 'CACHE_FRAGMENTOS_S', 3600))
+    return {
+        'urls': {tamano: default_storage.url(nombre) for tamano, nombre in datos['archivos'].items()},
+        **{k: v for k, v in datos.items() if k != 'archivos'},
+    }
+
+
+# -------------------------------
+# TODOS LOS NIVELES
+# -------------------------------
+
+def cartas_de_catalogo(nivel):
+    return Carta.objects.filter(nivel=nivel, partida__isnull=True)
+
+
+def generar_todos(niveles, limpiar=False):
+    """
+    Genera los atlas que falten de ``niveles``. Con ``limpiar`` borra los atlas de esos
+    niveles que ya no corresponden a sus cartas actuales. Devuelve {'generados', 'borrados'}.
+    """
+    generados, vigentes = 0, set()
+    for nivel in niveles:
+        archivos, nuevos = generar_nivel(nivel)
+        vigentes |= archivos
+        generados += nuevos
+
+    borrados = 0
+    if limpiar and default_storage.exists(DIRECTORIO):
+        prefijos = tuple(f'nivel{nivel.pk}-' for nivel in niveles)
+        _, archivos = default_storage.listdir(DIRECTORIO)
+        for archivo in archivos:
+            nombre = posixpath.join(DIRECTORIO, archivo)
+            # Los manifiestos (nivelN.json) no llevan el guion del prefijo
+            if archivo.startswith(prefijos) and nombre not in vigentes:
+                default_storage.delete(nombre)
+                borrados += 1
+    return {'generados': generados, 'borrados': borrados}
@@ -0,0 +1,242 @@
+# memory_game/services/broker.py
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+# -------------------------------
+# BROKER PUB/SUB EN PROCESO
+# -------------------------------
+
+class Suscripcion:
+    """
+    Cola de frames SSE de un cliente. Si el cliente no consume y la cola se llena,
+    se marca como desbordada: recibe un evento 'resync' y debe pedir el estado completo.
+
+    Se consume con ``aframes`` desde el bucle de eventos (ASGI: miles de conexiones
+    abiertas por worker) o con ``frames``/``esperar`` desde un hilo. Se publica desde
+    cualquier hilo: al consumidor asíncrono se le avisa con call_soon_threadsafe.
+    """
+
+    def __init__(self, broker, canal, maximo):
+        self.broker = broker
+        self.canal = canal
+        self.cola = deque(maxlen=maximo)
+        self.desbordada = False
+        self._hay_datos = threading.Event()
+        self._bucle = None
+        self._aviso = None
+
+    def entregar(self, frame):
+        if len(self.cola) == self.cola.maxlen:
+            self.desbordada = True
+        self.cola.append(frame)
+        self._hay_datos.set()
+        if self._bucle is not None:
+            try:
+                self._bucle.call_soon_threadsafe(self._aviso.set)
+            except RuntimeError:
+                pass  # bucle cerrado: la conexión ya terminó
+
+    def _vaciar(self):
+        frames = []
+        while self.cola:
+            frames.append(self.cola.popleft())
+        if self.desbordada:
+            self.desbordada = False
+            frames.append(b"event: resync\ndata: {}\n\n")
+        return frames
+
+    def esperar(self, timeout=None):
+        """Devuelve los frames pendientes (lista vacía si venció el timeout)."""
+        self._hay_datos.wait(timeout)
+        # Limpiar antes de vaciar: lo publicado durante el vaciado vuelve a activar el evento
+        self._hay_datos.clear()
+        return self._vaciar()
+
+    async def aesperar(self, timeout=None):
+        """Como ``esperar``, sin bloquear el bucle. None si venció el timeout sin frames."""
+        if self._bucle is None:
+            self._bucle, self._aviso = asyncio.get_running_loop(), asyncio.Event()
+        if not self.cola and not self.desbordada:
+            try:
+                await asyncio.wait_for(self._aviso.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        self._aviso.clear()
+        return self._vaciar()
+
+    def frames(self, latido=15):
+        """Generador síncrono para StreamingHttpResponse: ocupa un hilo mientras dure la conexión."""
+        try:
+            yield b"retry: 2000\n\n"
+            while True:
+                frames = self.esperar(latido)
+                if frames:
+                    yield b"".join(frames)
+                else:
+                    yield b": latido\n\n"  # comentario SSE: mantiene viva la conexión
+        finally:
+            self.broker.desuscribir(self)
+
+    async def aframes(self, latido=15):
+        """Generador asíncrono para StreamingHttpResponse bajo ASGI; se desuscribe al desconectarse."""
+        try:
+            yield b"retry: 2000\n\n"
+            while True:
+                frames = await self.aesperar(latido)
+                if frames is None:
+                    yield b": latido\n\n"
+                elif frames:
+                    yield b"".join(frames)
+        finally:
+            self.broker.desuscribir(self)
+
+
+class Broker:
+    """
+    Stand-in en memoria de un broker pub/sub (Redis, NATS...). Cada evento se
+    serializa una sola vez como frame SSE y el mismo objeto bytes se entrega a
+    todas las suscripciones del canal. Guarda un historial corto por canal para
+    que un cliente reconectado continúe desde su Last-Event-ID.
+    """
+
+    def __init__(self, historial=100, maximo_cola=256):
+        self.historial = historial
+        self.maximo_cola = maximo_cola
+        self._lock = threading.Lock()
+        # Copy-on-write: publicar lee la tupla sin tomar el lock
+        self._suscripciones = {}
+        self._historial = {}
+        self._secuencias = {}
+
+    def suscribir(self, canal, desde=None):
+        sus = Suscripcion(self, canal, self.maximo_cola)
+        with self._lock:
+            self._suscripciones[canal] = self._suscripciones.get(canal, ()) + (sus,)
+            if desde is not None:
+                for id_evento, frame in self._historial.get(canal, ()):
+                    if id_evento > desde:
+                        sus.entregar(frame)
+        return sus
+
+    def desuscribir(self, sus):
+        with self._lock:
+            resto = tuple(s for s in self._suscripciones.get(sus.canal, ()) if s is not sus)
+            if resto:
+                self._suscripciones[sus.canal] = resto
+            else:
+                self._suscripciones.pop(sus.canal, None)
+
+    def suscriptores(self, canal):
+        return len(self._suscripciones.get(canal, ()))
+
+    def ultimo_id(self, canal):
+        return self._secuencias[canal][1] if canal in self._secuencias else 0
+
+    def publicar(self, canal, tipo, datos):
+        """Publica un evento; devuelve (id, destinatarios)."""
+        with self._lock:
+            contador, _ = self._secuencias.get(canal, (itertools.count(1), 0))
+            id_evento = next(contador)
+            self._secuencias[canal] = (contador, id_evento)
+            frame = (
+                f"id: {id_evento}\nevent: {tipo}\n"
+                f"data: {json.dumps(datos, separators=(',', ':'), ensure_ascii=False)}\n\n"
+            ).encode()
+            self._historial.setdefault(canal, deque(maxlen=self.historial)).append((id_evento, frame))
+            destinatarios = self._suscripciones.get(canal, ())
+
+        for sus in destinatarios:
+            sus.entregar(frame)
+        return id_evento, len(destinatarios)
+
+    def cerrar_canal(self, canal):
+        """Olvida el historial de un canal (p. ej. sala terminada)."""
+        with self._lock:
+            self._historial.pop(canal, None)
+            self._secuencias.pop(canal, None)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = Broker(
+                    historial=getattr(settings, 'SALA_HISTORIAL_EVENTOS', 100),
+                    maximo_cola=getattr(settings, 'SALA_MAXIMO_COLA', 256),
+                )
+    return _broker
+
+
+# -------------------------------
+# BENCHMARK DE FAN-OUT
+# -------------------------------
+
+def medir_fanout(espectadores, eventos=200, intervalo=0.02):
+    """
+    Publica ``eventos`` eventos (uno cada ``intervalo`` segundos) en un canal con
+    ``espectadores`` suscripciones, cada una consumida por su propio hilo (como un
+    worker SSE). Mide el coste de publicar y la latencia publicación → entrega.
+    """
+    broker = Broker(historial=0, maximo_cola=eventos + 1)
+    canal = 'benchmark'
+    suscripciones = [broker.suscribir(canal) for _ in range(espectadores)]
+    latencias = []
+    latencias_lock = threading.Lock()
+    listos = threading.Barrier(espectadores + 1)
+
+    def consumir(sus):
+        recibidos, propias = 0, []
+        listos.wait()
+        limite = time.perf_counter() + 30
+        while recibidos < eventos and time.perf_counter() < limite:
+            # Puede volver vacío (aviso de un frame ya recogido): seguir esperando
+            frames = sus.esperar(1)
+            ahora = time.perf_counter()
+            for frame in frames:
+                publicado = float(frame.rsplit(b'"t":', 1)[1].split(b'}', 1)[0])
+                propias.append(ahora - publicado)
+            recibidos += len(frames)
+        with latencias_lock:
+            latencias.extend(propias)
+
+    hilos = [threading.Thread(target=consumir, args=(s,), daemon=True) for s in suscripciones]
+    for h in hilos:
+        h.start()
+    listos.wait()
+
+    costes = []
+    for i in range(eventos):
+        inicio = time.perf_counter()
+        broker.publicar(canal, 'jugada', {'n': i, 't': inicio})
+        costes.append(time.perf_counter() - inicio)
+        time.sleep(intervalo)
+    for h in hilos:
+        h.join()
+
+    latencias.sort()
+    costes.sort()
+
+    def pct(valores, q):
+        return round(1000 * valores[min(len(valores) - 1, int(q * len(valores)))], 3) if valores else None
+
+    return {
+        'espectadores': espectadores,
+        'entregas': len(latencias),
+        'esperadas': espectadores * eventos,
+        'ms_publicar_p50': pct(costes, 0.5),
+        'ms_publicar_p99': pct(costes, 0.99),
+        'ms_latencia_p50': pct(latencias, 0.5),
+        'ms_latencia_p99': pct(latencias, 0.99),
+        'ms_latencia_max': pct(latencias, 1.0),
+    }
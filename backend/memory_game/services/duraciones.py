@@ -0,0 +1,68 @@
+# memory_game/services/duraciones.py
+import re
+
+# 'MM:SS' o 'HH:MM:SS', con fracción de segundo opcional ('01:05.250')
+_TIEMPO = re.compile(r'^\s*(?:(\d+):)?(\d+):(\d{1,2})(?:\.(\d{1,3}))?\s*$')
+
+# Tope de PositiveIntegerField (~24 días en ms)
+MAX_DURACION_MS = 2_147_483_647
+
+
+# -------------------------------
+# CONVERSIONES
+# -------------------------------
+
+def tiempo_a_ms(texto):
+    """Convierte un tiempo del cliente ('00:42') a milisegundos; None si no se puede leer."""
+    m = _TIEMPO.match(str(texto or ''))
+    if not m:
+        return None
+    horas, minutos, segundos, fraccion = m.groups()
+    ms = ((int(horas or 0) * 60 + int(minutos)) * 60 + int(segundos)) * 1000
+    if fraccion:
+        ms += int(fraccion.ljust(3, '0'))
+    return min(ms, MAX_DURACION_MS)
+
+
+def ms_a_tiempo(ms):
+    """Formato de presentación 'MM:SS' (los minutos pueden pasar de 59)."""
+    if ms is None:
+        return "00:00"
+    segundos = int(ms) // 1000
+    return f"{segundos // 60:02d}:{segundos % 60:02d}"
+
+
+# -------------------------------
+# DURACIÓN DE UNA PARTIDA
+# -------------------------------
+
+def duracion_ms(inicio, fin):
+    """Milisegundos entre dos fechas, o None si falta alguna o el intervalo es negativo."""
+    if not inicio or not fin:
+        return None
+    ms = int((fin - inicio).total_seconds() * 1000)
+    if ms < 0:
+        return None
+    return min(ms, MAX_DURACION_MS)
+
+
+def duracion_partida_ms(partida):
+    """Duración calculada en el servidor (fecha_fin - fecha_inicio), o None si no terminó."""
+    if partida is None:
+        return None
+    return duracion_ms(partida.fecha_inicio, partida.fecha_fin)
+
+
+def registrar_duracion(estadistica, partida=None, tiempo_cliente=None):
+    """
+    Registra una victoria en el mejor tiempo de la estadística: duracion_ms (y el texto
+    'tiempo' derivado) solo cambia si esta victoria es más rápida. Se prefiere la
+    duración de la partida en el servidor; el tiempo enviado por el cliente es el respaldo.
+    """
+    ms = duracion_partida_ms(partida)
+    if ms is None:
+        ms = tiempo_a_ms(tiempo_cliente)
+    if ms is None or (estadistica.duracion_ms is not None and estadistica.duracion_ms <= ms):
+        return
+    estadistica.duracion_ms = ms
+    estadistica.tiempo = ms_a_tiempo(ms)
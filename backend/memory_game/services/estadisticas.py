@@ -0,0 +1,216 @@
+# memory_game/services/estadisticas.py
+import multiprocessing
+
+from django.db import connections, router, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from ..db_routers import agregar_en_shards, en_cada_shard, hay_shards
+from ..models import Estadistica, MarcaAgua, Partida
+from .duraciones import MAX_DURACION_MS, duracion_ms, ms_a_tiempo
+
+MARCA_ESTADISTICAS = 'reconstruir_estadisticas'
+
+# Rango de ids de usuario por bloque: cada bloque es una tarea del pool y una transacción
+TAMANO_BLOQUE = 2000
+
+CAMPOS_ESTADISTICA = [
+    'tiempo', 'duracion_ms', 'intentos', 'pares_encontrados',
+    'total_partidas', 'victorias', 'derrotas', 'promedio_intentos',
+]
+
+
+def partidas_contables():
+    """Las que cuentan en Estadistica: individuales y terminadas, salvo las abandonadas."""
+    return (
+        Partida.objects
+        .filter(activa=False, sala__isnull=True)
+        .exclude(motivo_fin=Partida.MOTIVO_ABANDONO)
+    )
+
+
+# -------------------------------
+# CÁLCULO DE UN BLOQUE
+# -------------------------------
+
+def calcular_bloque(desde, hasta):
+    """
+    Estadísticas (sin guardar) de los usuarios con id en [desde, hasta), con la misma
+    semántica que actualizar_estadisticas: totales, promedio de movimientos, y
+    movimientos/aciertos de la última partida y duración de la victoria más rápida.
+    Las partidas de un usuario están en un solo shard: se recorre uno tras otro.
+    """
+    filas = (
+        partidas_contables()
+        .filter(usuario_id__gte=desde, usuario_id__lt=hasta)
+        .order_by('usuario_id', 'nivel_id', 'fecha_fin', 'id')
+        .values_list('usuario_id', 'nivel_id', 'ganada', 'movimientos', 'aciertos', 'fecha_inicio', 'fecha_fin')
+    )
+
+    estadisticas, sumas, clave, partidas = [], [], None, 0
+    for usuario_id, nivel_id, ganada, movimientos, aciertos, inicio, fin in _recorrer_shards(filas):
+        partidas += 1
+        if (usuario_id, nivel_id) != clave:
+            clave = (usuario_id, nivel_id)
+            actual = Estadistica(usuario_id=usuario_id, nivel_id=nivel_id)
+            estadisticas.append(actual)
+            sumas.append(0)
+        actual.total_partidas += 1
+        sumas[-1] += movimientos or 0
+        actual.intentos = movimientos or 0
+        actual.pares_encontrados = aciertos or 0
+        if ganada:
+            actual.victorias += 1
+            ms = duracion_ms(inicio, fin)
+            if ms is not None and (actual.duracion_ms is None or ms < actual.duracion_ms):
+                actual.duracion_ms = ms
+                actual.tiempo = ms_a_tiempo(ms)
+        else:
+            actual.derrotas += 1
+
+    for e, suma in zip(estadisticas, sumas):
+        e.promedio_intentos = round(suma / e.total_partidas, 2)
+    return estadisticas, partidas
+
+
+def _recorrer_shards(filas):
+    for qs in en_cada_shard(filas):
+        yield from qs.iterator(chunk_size=5000)
+
+
+def reconstruir_bloque(rango):
+    """Recalcula y guarda un bloque con un upsert multi-fila. Devuelve (hasta, partidas, filas)."""
+    desde, hasta = rango
+    db = router.db_for_write(Estadistica)
+    with transaction.atomic(using=db):
+        # INSERT ... SELECT solo si partidas y estadísticas están en la misma base
+        if connections[db].vendor == 'postgresql' and not hay_shards():
+            partidas, filas = _reconstruir_bloque_postgres(db, desde, hasta)
+        else:
+            estadisticas, partidas = calcular_bloque(desde, hasta)
+            Estadistica.objects.using(db).bulk_create(
+                estadisticas,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['usuario', 'nivel'],
+                update_fields=CAMPOS_ESTADISTICA,
+            )
+            filas = len(estadisticas)
+    return hasta, partidas, filas
+
+
+def _reconstruir_bloque_postgres(db, desde, hasta):
+    """
+    Lo mismo que calcular_bloque + bulk_create, agregado y escrito por Postgres en una
+    sentencia (INSERT ... SELECT ... GROUP BY ... ON CONFLICT): las partidas no salen
+    de la base de datos. El filtro es el mismo queryset, compilado como subconsulta.
+    """
+    base, params = (
+        partidas_contables()
+        .filter(usuario_id__gte=desde, usuario_id__lt=hasta)
+        .values_list('id', 'usuario_id', 'nivel_id', 'ganada', 'movimientos', 'aciertos', 'fecha_inicio', 'fecha_fin')
+        .query.sql_with_params()
+    )
+    # Orden "última partida" de calcular_bloque (fecha_fin ascendente, nulos al final), invertido
+    ultima = 'ORDER BY fecha_fin DESC, id DESC'
+    with connections[db].cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH p AS ({base}),
+            agregados AS (
+                SELECT usuario_id, nivel_id,
+                       count(*) AS total,
+                       count(*) FILTER (WHERE ganada) AS victorias,
+                       round(avg(coalesce(movimientos, 0))::numeric, 2)::float8 AS promedio,
+                       (array_agg(coalesce(movimientos, 0) {ultima}))[1] AS intentos,
+                       (array_agg(coalesce(aciertos, 0) {ultima}))[1] AS pares,
+                       min(least(floor(extract(epoch FROM fecha_fin - fecha_inicio) * 1000)::bigint, %s))
+                           FILTER (WHERE ganada AND fecha_fin >= fecha_inicio) AS duracion
+                FROM p
+                GROUP BY usuario_id, nivel_id
+            ),
+            escritas AS (
+                INSERT INTO {Estadistica._meta.db_table}
+                    (usuario_id, nivel_id, tiempo, duracion_ms, intentos, pares_encontrados,
+                     total_partidas, victorias, derrotas, promedio_intentos)
+                SELECT usuario_id, nivel_id,
+                       -- ms_a_tiempo: 'MM:SS', los minutos pueden pasar de 59
+                       coalesce(lpad((duracion / 60000)::text, 2, '0') || ':'
+                                || lpad((duracion / 1000 %% 60)::text, 2, '0'), '00:00'),
+                       duracion, intentos, pares, total, victorias, total - victorias, promedio
+                FROM agregados
+                ON CONFLICT (usuario_id, nivel_id) DO UPDATE SET
+                    tiempo = EXCLUDED.tiempo,
+                    duracion_ms = EXCLUDED.duracion_ms,
+                    intentos = EXCLUDED.intentos,
+                    pares_encontrados = EXCLUDED.pares_encontrados,
+                    total_partidas = EXCLUDED.total_partidas,
+                    victorias = EXCLUDED.victorias,
+                    derrotas = EXCLUDED.derrotas,
+                    promedio_intentos = EXCLUDED.promedio_intentos
+                RETURNING 1
+            )
+            SELECT (SELECT coalesce(sum(total), 0) FROM agregados), (SELECT count(*) FROM escritas)
+            """,
+            [*params, MAX_DURACION_MS],
+        )
+        partidas, filas = cursor.fetchone()
+    return int(partidas), filas
+
+
+def _trabajador(rango):
+    try:
+        return reconstruir_bloque(rango)
+    finally:
+        connections.close_all()
+
+
+# -------------------------------
+# RECONSTRUCCIÓN COMPLETA CON PUNTO DE CONTROL
+# -------------------------------
+
+def reconstruir_estadisticas(procesos=1, tamano_bloque=TAMANO_BLOQUE, desde_cero=False, progreso=None):
+    """
+    Recalcula Estadistica a partir del historial de Partida, por bloques de ids de
+    usuario repartidos entre ``procesos`` procesos (fork). MarcaAgua.valor guarda
+    el primer id de usuario pendiente: tras una interrupción se continúa desde ahí
+    (``desde_cero`` lo ignora). Al terminar vuelve a 0 y ``fecha`` registra la
+    última reconstrucción completa.
+
+    Las filas de usuario/nivel sin partidas contables no se tocan.
+    ``progreso(hasta, partidas, filas)`` se llama tras cada bloque confirmado.
+    """
+    marca, _ = MarcaAgua.objects.get_or_create(nombre=MARCA_ESTADISTICAS)
+    limites = agregar_en_shards(Partida.objects.all(), minimo=Min('usuario_id'), maximo=Max('usuario_id'))
+    if limites['maximo'] is None:
+        return {'partidas': 0, 'filas': 0, 'bloques': 0}
+
+    inicio = limites['minimo'] if desde_cero or not marca.valor else max(marca.valor, limites['minimo'])
+    rangos = [(d, d + tamano_bloque) for d in range(inicio, limites['maximo'] + 1, tamano_bloque)]
+    total = {'partidas': 0, 'filas': 0, 'bloques': 0, 'reanudada_desde': None if inicio == limites['minimo'] else inicio}
+
+    def registrar(resultado):
+        hasta, partidas, filas = resultado
+        total['partidas'] += partidas
+        total['filas'] += filas
+        total['bloques'] += 1
+        # imap entrega en orden: todo lo anterior a ``hasta`` ya está confirmado
+        marca.valor = hasta
+        marca.save(update_fields=['valor', 'actualizado'])
+        if progreso:
+            progreso(hasta, partidas, filas)
+
+    if procesos <= 1:
+        for rango in rangos:
+            registrar(reconstruir_bloque(rango))
+    else:
+        # Las conexiones abiertas no deben heredarse entre procesos
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(procesos) as pool:
+            for resultado in pool.imap(_trabajador, rangos):
+                registrar(resultado)
+
+    marca.valor = 0
+    marca.fecha = timezone.now()
+    marca.save(update_fields=['valor', 'fecha', 'actualizado'])
+    return total
@@ -0,0 +1,233 @@
+# memory_game/services/formato.py
+"""
+Formatos de transporte del estado de una partida, elegidos por cabecera Accept
+(o ?formato=json|compacto|binario):
+
+- JSON detallado (por defecto): una lista de dicts por carta, como siempre.
+- JSON compacto: bitmaps de reveladas/emparejadas y solo los valores visibles,
+  internados (etiquetas únicas + índices).
+- Binario: lo mismo empaquetado con struct.
+
+Las respuestas mayores que UMBRAL_GZIP se comprimen con gzip si el cliente lo acepta.
+"""
+import base64
+import json
+import re
+import struct
+
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+TIPO_JSON = 'application/json'
+TIPO_COMPACTO = 'application/vnd.memorygame.compacto+json'
+TIPO_BINARIO = 'application/vnd.memorygame.binario'
+FORMATOS = {'json': TIPO_JSON, 'compacto': TIPO_COMPACTO, 'binario': TIPO_BINARIO}
+
+VERSION = 1
+
+# Por debajo de este tamaño gzip no compensa la CPU ni la cabecera
+UMBRAL_GZIP = 1024
+_ACEPTA_GZIP = re.compile(r'\bgzip\b')
+
+# Cabecera binaria: magia, versión, flags, partida_id, movimientos, aciertos,
+# total_cartas, cartas incluidas
+_CABECERA = struct.Struct('<2sBBQIIII')
+_MAGIA = b'MG'
+_F_ACTIVA = 1
+_F_GANADA = 2
+_F_POSICIONES = 4   # estado parcial: se envía la lista de posiciones
+_F_INDICES_32 = 8   # más de 65535 etiquetas
+
+# Claves del estado que viajan en la cabecera o en los bitmaps
+_CLAVES_BASE = ('partida_id', 'movimientos', 'aciertos', 'activa', 'ganada', 'total_cartas', 'cartas')
+
+
+# -------------------------------
+# BITMAPS
+# -------------------------------
+
+def _bitmap(bits):
+    """Bit i = carta i (bit menos significativo primero)."""
+    datos = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            datos[i >> 3] |= 1 << (i & 7)
+    return bytes(datos)
+
+
+def _bits(datos, n):
+    return [bool(datos[i >> 3] >> (i & 7) & 1) for i in range(n)]
+
+
+# -------------------------------
+# JSON COMPACTO
+# -------------------------------
+
+def compactar(estado):
+    """Estado detallado (serialize_game_state) → forma compacta."""
+    cartas = estado['cartas']
+    compacto = {'v': VERSION, **{k: v for k, v in estado.items() if k != 'cartas'}}
+
+    # Tablero completo: las posiciones son 0..total-1 y no se envían
+    posiciones = [c['posicion'] for c in cartas]
+    if posiciones != list(range(estado['total_cartas'])):
+        compacto['posiciones'] = posiciones
+    compacto['reveladas'] = base64.b64encode(_bitmap([c['revelada'] for c in cartas])).decode()
+    compacto['emparejadas'] = base64.b64encode(_bitmap([c['emparejada'] for c in cartas])).decode()
+
+    # Valores solo de las cartas visibles, en orden de posición
+    visibles = [c for c in cartas if c['valor'] is not None]
+    indice = {}
+    compacto['valores'] = [indice.setdefault(c['valor'], len(indice)) for c in visibles]
+    compacto['etiquetas'] = list(indice)
+    if any(c['simbolo'] != c['valor'] for c in visibles):
+        compacto['simbolos'] = [c['simbolo'] for c in visibles]
+    return compacto
+
+
+def expandir(compacto):
+    """Inversa de compactar: devuelve el estado detallado."""
+    estado = {k: v for k, v in compacto.items() if k not in (
+        'v', 'posiciones', 'reveladas', 'emparejadas', 'valores', 'etiquetas', 'simbolos',
+    )}
+    posiciones = compacto.get('posiciones')
+    if posiciones is None:
+        posiciones = range(compacto['total_cartas'])
+    n = len(posiciones)
+    reveladas = base64.b64decode(compacto['reveladas'])
+    emparejadas = base64.b64decode(compacto['emparejadas'])
+
+    valores = iter(compacto['etiquetas'][i] for i in compacto['valores'])
+    simbolos = iter(compacto.get('simbolos', ()))
+    cartas = []
+    for pos, revelada, emparejada in zip(posiciones, _bits(reveladas, n), _bits(emparejadas, n)):
+        valor = next(valores) if revelada else None
+        cartas.append({
+            'posicion': pos,
+            'revelada': revelada,
+            'emparejada': emparejada,
+            'valor': valor,
+            'simbolo': next(simbolos, valor) if revelada else None,
+        })
+    estado['cartas'] = cartas
+    return estado
+
+
+# -------------------------------
+# BINARIO
+# -------------------------------
+
+def codificar_binario(estado):
+    """
+    Cabecera fija, [posiciones u32], bitmap de reveladas, bitmap de emparejadas,
+    índices de valor (u16/u32), etiquetas UTF-8 separadas por NUL y un JSON final
+    con el resto de claves (ventana, columnas, simbolos...).
+    """
+    compacto = compactar(estado)
+    posiciones = compacto.pop('posiciones', None)
+    reveladas = base64.b64decode(compacto.pop('reveladas'))
+    emparejadas = base64.b64decode(compacto.pop('emparejadas'))
+    valores = compacto.pop('valores')
+    etiquetas = compacto.pop('etiquetas')
+
+    flags = (
+        (_F_ACTIVA if estado['activa'] else 0)
+        | (_F_GANADA if estado['ganada'] else 0)
+        | (_F_POSICIONES if posiciones is not None else 0)
+        | (_F_INDICES_32 if len(etiquetas) > 0xFFFF else 0)
+    )
+    partes = [_CABECERA.pack(
+        _MAGIA, VERSION, flags, int(estado['partida_id']),
+        estado['movimientos'], estado['aciertos'], estado['total_cartas'], len(estado['cartas']),
+    )]
+    if posiciones is not None:
+        partes.append(struct.pack(f'<{len(posiciones)}I', *posiciones))
+    partes += [reveladas, emparejadas]
+    partes.append(struct.pack(f"<{len(valores)}{'I' if flags & _F_INDICES_32 else 'H'}", *valores))
+
+    texto = '\0'.join(etiquetas).encode()
+    extras = json.dumps(
+        {k: v for k, v in compacto.items() if k not in _CLAVES_BASE and k != 'v'},
+        separators=(',', ':'),
+    ).encode()
+    partes += [struct.pack('<I', len(texto)), texto, struct.pack('<I', len(extras)), extras]
+    return b''.join(partes)
+
+
+def decodificar_binario(datos):
+    """Binario → estado detallado."""
+    magia, version, flags, partida_id, movimientos, aciertos, total, n = _CABECERA.unpack_from(datos)
+    if magia != _MAGIA or version != VERSION:
+        raise ValueError("Formato binario desconocido")
+    pos = _CABECERA.size
+
+    compacto = {
+        'v': version, 'partida_id': str(partida_id), 'movimientos': movimientos, 'aciertos': aciertos,
+        'activa': bool(flags & _F_ACTIVA), 'ganada': bool(flags & _F_GANADA), 'total_cartas': total,
+    }
+    if flags & _F_POSICIONES:
+        compacto['posiciones'] = list(struct.unpack_from(f'<{n}I', datos, pos))
+        pos += 4 * n
+    tam_bitmap = (n + 7) // 8
+    reveladas = datos[pos:pos + tam_bitmap]
+    emparejadas = datos[pos + tam_bitmap:pos + 2 * tam_bitmap]
+    pos += 2 * tam_bitmap
+    compacto['reveladas'] = base64.b64encode(reveladas).decode()
+    compacto['emparejadas'] = base64.b64encode(emparejadas).decode()
+
+    visibles = sum(_bits(reveladas, n))
+    formato_indice = 'I' if flags & _F_INDICES_32 else 'H'
+    compacto['valores'] = list(struct.unpack_from(f'<{visibles}{formato_indice}', datos, pos))
+    pos += struct.calcsize(f'<{visibles}{formato_indice}')
+
+    (largo,) = struct.unpack_from('<I', datos, pos)
+    texto = datos[pos + 4:pos + 4 + largo].decode()
+    compacto['etiquetas'] = texto.split('\0') if texto else []
+    pos += 4 + largo
+    (largo,) = struct.unpack_from('<I', datos, pos)
+    compacto.update(json.loads(datos[pos + 4:pos + 4 + largo]))
+    return expandir(compacto)
+
+
+# -------------------------------
+# NEGOCIACIÓN Y RESPUESTA
+# -------------------------------
+
+def formato_pedido(request):
+    """Tipo de contenido elegido por ?formato= o por la cabecera Accept (JSON por defecto)."""
+    nombre = request.GET.get('formato')
+    if nombre in FORMATOS:
+        return FORMATOS[nombre]
+    return request.get_preferred_type([TIPO_JSON, TIPO_COMPACTO, TIPO_BINARIO]) or TIPO_JSON
+
+
+def respuesta_estado(request, datos, status=200):
+    """
+    Respuesta con el estado de una partida (o una respuesta de jugada con
+    'estado_partida') en el formato negociado. El binario solo se sirve para
+    estados completos; en respuestas de jugada se usa el JSON compacto.
+    """
+    tipo = formato_pedido(request)
+    if tipo == TIPO_BINARIO and 'cartas' in datos:
+        response = HttpResponse(codificar_binario(datos), content_type=TIPO_BINARIO, status=status)
+    elif tipo != TIPO_JSON:
+        if 'cartas' in datos:
+            datos = compactar(datos)
+        elif 'estado_partida' in datos:
+            datos = {**datos, 'estado_partida': compactar(datos['estado_partida'])}
+        response = JsonResponse(
+            datos, status=status, content_type=TIPO_COMPACTO,
+            json_dumps_params={'separators': (',', ':')},
+        )
+    else:
+        response = JsonResponse(datos, status=status)
+
+    patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+    if len(response.content) >= UMBRAL_GZIP and _ACEPTA_GZIP.search(request.headers.get('Accept-Encoding', '')):
+        comprimido = compress_string(response.content)
+        if len(comprimido) < len(response.content):
+            response.content = comprimido
+            response['Content-Encoding'] = 'gzip'
+            response['Content-Length'] = str(len(comprimido))
+    return response
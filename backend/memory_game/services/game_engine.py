@@ -1,19 +1,39 @@
 # memory_game/services/game_engine.py
 import random
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.conf import settings
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
+from django.db import router, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Mod
+from django.db.models.lookups import Range
 from django.utils import timezone
 
 # Importar modelos desde el paquete superior (memory_game.models)
 from ..models import (
     Partida as Game,
     Carta as Card,
-    Intento as Attempt,
     Nivel as Level,
     Estadistica,
 )
+from ..db_routers import para_partida, para_usuario
+from .throttle import throttle_moves, coalesce_reveals
+from .formato import respuesta_estado
+from .duraciones import registrar_duracion
+from .percentiles import percentiles_partida, registrar_partida
+from .tablero import (
+    EMPAREJADA, OCULTA, REVELADA,
+    EV_IGNORADA, EV_PAR, EV_RECHAZADA, EV_REVELADA,
+    Tablero,
+)
+
+# Tope de cartas por tablero (los valores 'card_N' deben caber en Carta.simbolo)
+MAX_CARTAS_TABLERO = 10000
+
+# Hasta este tamaño las respuestas de jugada incluyen el tablero completo;
+# en tableros mayores solo las cartas que cambiaron
+MAX_CARTAS_ESTADO_COMPLETO = 64
 
 # -------------------------------
 # FUNCIONES AUXILIARES
@@ -38,11 +58,11 @@ def _get_card_pairs_from_level(level):
         except Exception:
             pass
 
-    rows = getattr(level, 'rows', None)
-    cols = getattr(level, 'cols', None)
+    rows = getattr(level, 'filas', None)
+    cols = getattr(level, 'columnas', None)
     if rows and cols:
         try:
-            return (int(rows) * int(cols)) // 2
+            return max(2, min(int(rows) * int(cols), MAX_CARTAS_TABLERO) // 2)
         except Exception:
             pass
 
@@ -65,25 +85,46 @@ def _get_card_pairs_from_level(level):
 # CREAR PARTIDA Y BARAJAR CARTAS
 # -------------------------------
 
-def create_game(player, level, meta=None):
-    """Crea una partida y sus cartas barajadas."""
+def fecha_limite_nueva(segundos=None):
+    """Fecha límite de una partida que empieza ahora; None si no hay límite (0 segundos)."""
+    if segundos is None:
+        segundos = getattr(settings, 'PARTIDA_TIEMPO_LIMITE_S', 0)
+    return timezone.now() + timedelta(seconds=segundos) if segundos else None
+
+
+def _vencida(game):
+    return game.activa and game.fecha_limite is not None and timezone.now() >= game.fecha_limite
+
+
+def create_game(player, level, meta=None, cerrar_previas=True, using=None, tiempo_limite=None):
+    """
+    Crea una partida y sus cartas barajadas, en el shard del jugador salvo que ``using``
+    indique otra base. ``tiempo_limite`` en segundos (por defecto PARTIDA_TIEMPO_LIMITE_S;
+    0 = sin límite).
+    """
     card_pairs = _get_card_pairs_from_level(level)
     total_cards = card_pairs * 2
     values = _generate_values(card_pairs)
 
-    # Cerrar partidas activas previas del usuario
-    Game.objects.filter(usuario=player, activa=True).update(
-        activa=False, fecha_fin=timezone.now(), ganada=False
-    )
+    # Cerrar partidas activas previas del usuario (los tableros de sala no cuentan)
+    if cerrar_previas:
+        ahora = timezone.now()
+        player.partida_set.filter(activa=True, sala__isnull=True).update(
+            activa=False, fecha_fin=ahora, ganada=False,
+            motivo_fin=Game.MOTIVO_ABANDONO, ultima_actualizacion=ahora,
+        )
 
     # Crear nueva partida
-    game = Game.objects.create(
+    partidas = para_usuario(Game, player.pk) if using is None else Game.objects.using(using)
+    game = partidas.create(
         usuario=player,
         nivel=level,
         activa=True,
         ganada=False,
         movimientos=0,
-        aciertos=0
+        aciertos=0,
+        pares=card_pairs,
+        fecha_limite=fecha_limite_nueva(tiempo_limite),
     )
 
     # Crear cartas asociadas
@@ -99,129 +140,292 @@ def create_game(player, level, meta=None):
             revelada=False,
             emparejada=False
         ))
-    Card.objects.bulk_create(cards)
+    Card.objects.using(game._state.db).bulk_create(cards, batch_size=1000)
 
     return game
 
 
+# -------------------------------
+# CONCURRENCIA OPTIMISTA (COMPARE-AND-SET)
+# -------------------------------
+
+# Reintentos ante conflicto de versión antes de rendirse
+MAX_REINTENTOS_JUGADA = 10
+
+_CAMPOS_ESTADO = (
+    'version', 'carta_pendiente', 'activa', 'ganada', 'movimientos', 'aciertos', 'fecha_fin', 'motivo_fin',
+)
+
+
+class ConflictoVersion(Exception):
+    """Otra jugada modificó la partida entre la lectura y el UPDATE condicional."""
+
+
+def _cas(game, version, solo_activa=True, **cambios):
+    """
+    UPDATE condicional de la partida: solo se aplica si nadie cambió la versión.
+    Si se aplica, sincroniza el objeto en memoria; si no, lanza ConflictoVersion.
+    """
+    filtro = {'pk': game.pk, 'version': version}
+    if solo_activa:
+        filtro['activa'] = True
+    cambios['ultima_actualizacion'] = timezone.now()
+    filas = para_partida(Game, game.pk).filter(**filtro).update(version=version + 1, **cambios)
+    if not filas:
+        raise ConflictoVersion()
+    game.version = version + 1
+    for campo, valor in cambios.items():
+        setattr(game, campo, valor)
+    game.marcar_guardado(['version', *cambios])
+
+
+def _con_reintentos(game, jugada):
+    """Ejecuta ``jugada`` en una transacción (en el shard de la partida), releyendo la partida tras cada conflicto."""
+    db = router.db_for_write(Game, instance=game)
+    for _ in range(MAX_REINTENTOS_JUGADA):
+        try:
+            with transaction.atomic(using=db):
+                return jugada()
+        except ConflictoVersion:
+            game.refresh_from_db(fields=_CAMPOS_ESTADO)
+    return {'status': 'error', 'message': 'Partida ocupada, intenta de nuevo'}
+
+
+# -------------------------------
+# ADAPTADOR ORM ↔ TABLERO
+# -------------------------------
+
+def _pares_de(game):
+    """Pares del tablero; las partidas anteriores al campo ``pares`` cuentan sus cartas una vez."""
+    if not game.pares:
+        game.pares = game.carta_set.count() // 2
+    return game.pares
+
+
+def _consulta_tablero(game, filtro=None):
+    cartas_qs = game.carta_set.all()
+    if filtro is not None:
+        if game.carta_pendiente_id:
+            filtro |= Q(pk=game.carta_pendiente_id)
+        cartas_qs = cartas_qs.filter(filtro)
+    return cartas_qs.order_by('posicion').values_list(
+        'pk', 'posicion', 'valor', 'simbolo', 'revelada', 'emparejada'
+    )
+
+
+def _cargar_tablero(game, filtro=None):
+    """
+    Construye el Tablero de la partida con una sola consulta. Sin ``filtro`` se carga
+    entero; con un Q solo esas cartas (y la pendiente) en un Tablero parcial.
+    Devuelve también {posicion: (pk, simbolo)} de las cartas cargadas.
+    """
+    filas = _consulta_tablero(game, filtro)
+    if filtro is not None:
+        _pares_de(game)
+    return _construir_tablero(game, filas, parcial=filtro is not None)
+
+
+def _estado_tablero(game, pendiente=None):
+    return {
+        'pendiente': pendiente,
+        'movimientos': game.movimientos,
+        'aciertos': game.aciertos,
+        'activa': game.activa,
+        'ganada': game.ganada,
+        'motivo_fin': game.motivo_fin,
+    }
+
+
+def _construir_tablero(game, filas, parcial=False):
+    cartas, casillas = {}, {}
+    pendiente = None
+    for pk, pos, valor, simbolo, revelada, emparejada in filas:
+        if pk == game.carta_pendiente_id:
+            pendiente = pos
+        cartas[pos] = (pk, simbolo)
+        casillas[pos] = (valor, EMPAREJADA if emparejada else REVELADA if revelada else OCULTA)
+
+    estado = _estado_tablero(game, pendiente)
+    if not parcial:
+        tablero = Tablero(
+            [valor for valor, _ in casillas.values()],
+            pares=game.pares or None,
+            estados=[e for _, e in casillas.values()],
+            **estado,
+        )
+    else:
+        tablero = Tablero.parcial(game.pares, casillas, **estado)
+    return tablero, cartas
+
+
+def _cargar_para_jugada(game, *posiciones):
+    """Tableros pequeños se cargan enteros; en los grandes solo las cartas de la jugada."""
+    if _pares_de(game) * 2 <= MAX_CARTAS_ESTADO_COMPLETO:
+        return _cargar_tablero(game)
+    return _cargar_tablero(game, Q(posicion__in=posiciones))
+
+
+def _estado_partida(game, tablero, cartas):
+    cards_list = []
+    for pos, (_, simbolo) in cartas.items():
+        visible = tablero.visible(pos)
+        cards_list.append({
+            'posicion': pos,
+            'revelada': tablero.estados[pos] != OCULTA,
+            'emparejada': tablero.estados[pos] == EMPAREJADA,
+            'valor': tablero.valor(pos) if visible else None,
+            'simbolo': simbolo if visible else None,
+        })
+
+    estado = {
+        'partida_id': str(game.id),
+        'movimientos': game.movimientos,
+        'aciertos': game.aciertos,
+        'activa': game.activa,
+        'ganada': game.ganada,
+        'total_cartas': len(tablero),
+        'cartas': cards_list,
+    }
+    if len(cartas) < len(tablero):
+        # Solo las cartas cargadas (las de la jugada o las de la ventana pedida)
+        estado['parcial'] = True
+    return estado
+
+
 # -------------------------------
 # LÓGICA DE JUEGO
 # -------------------------------
 
-@transaction.atomic
-def reveal_card(game, position):
-    """Revela una carta y compara si hay pareja."""
-    if not game.activa:
-        return {'status': 'error', 'message': 'Partida finalizada'}
+def reveal_card(game, position, individual=True):
+    """
+    Revela una carta y compara si hay pareja (sin bloqueos de fila: compare-and-set).
+    ``individual=False`` (tableros de sala) no actualiza estadísticas ni percentiles.
+    """
+    return _con_reintentos(game, lambda: _revelar(game, position, individual))
 
-    try:
-        card = Card.objects.select_for_update().get(partida=game, posicion=position)
-    except Card.DoesNotExist:
-        return {'status': 'error', 'message': 'Posición inválida'}
 
-    # Si ya está emparejada o revelada, ignorar
-    if card.emparejada:
-        return {'status': 'ignored', 'message': 'Carta ya emparejada'}
-    if card.revelada:
-        return {'status': 'ignored', 'message': 'Carta ya revelada'}
+def _revelar(game, position, individual=True):
+    if _vencida(game):
+        # Vencida pero aún no procesada por el temporizador: se da por perdida aquí
+        _abandonar(game)
+        return {'status': 'error', 'message': 'Tiempo agotado'}
+    version = game.version
+    tablero, cartas = _cargar_para_jugada(game, position)
+    if tablero.activa and position not in cartas and 0 <= position < len(tablero):
+        return {'status': 'error', 'message': 'Posición inválida'}
+    eventos = tablero.revelar(position)
+    evento = eventos[0]
 
-    # Revelar carta
-    card.revelada = True
-    card.save()
+    if evento.tipo == EV_RECHAZADA:
+        return {'status': 'error', 'message': evento.mensaje}
+    if evento.tipo == EV_IGNORADA:
+        return {'status': 'ignored', 'message': evento.mensaje}
 
-    # Buscar otra carta revelada sin emparejar
-    other = Card.objects.filter(
-        partida=game, revelada=True, emparejada=False
-    ).exclude(posicion=position).first()
+    card_pk, simbolo = cartas[position]
 
-    if not other:
-        # Solo una carta revelada
+    if evento.tipo == EV_REVELADA:
+        # Primera carta del par: queda como carta pendiente de la partida
+        _cas(game, version, carta_pendiente_id=card_pk)
+        game.carta_set.filter(pk=card_pk).update(revelada=True)
         return {
             'status': 'first_reveal',
-            'posicion': card.posicion,
-            'valor': card.valor,
-            'simbolo': card.simbolo,
-            'estado_partida': serialize_game_state(game)
+            'posicion': position,
+            'valor': tablero.valor(position),
+            'simbolo': simbolo,
+            'estado_partida': _estado_partida(game, tablero, cartas)
         }
 
-    # Dos cartas reveladas → comparar
-    game.movimientos += 1
-    es_par = (other.valor == card.valor)
+    # Segunda carta → se comparó con la pendiente
+    otra = evento.posiciones[0]
+    other_pk, other_simbolo = cartas[otra]
+    es_par = evento.tipo == EV_PAR
 
-    if es_par:
-        other.emparejada = True
-        card.emparejada = True
-        other.save()
-        card.save()
+    cambios = {
+        'carta_pendiente_id': None,
+        'movimientos': tablero.movimientos,
+        'aciertos': tablero.aciertos,
+    }
+    if tablero.ganada:
+        cambios.update(activa=False, ganada=True, fecha_fin=timezone.now(), motivo_fin=tablero.motivo_fin)
 
-        # ✅ Guardar el acierto inmediatamente
-        game.aciertos += 1
-        game.save(update_fields=["aciertos"])
+    _cas(game, version, **cambios)
 
-        Attempt.objects.create(partida=game, carta1=other, carta2=card, es_correcto=True)
+    if es_par:
+        game.carta_set.filter(pk__in=[other_pk, card_pk]).update(revelada=True, emparejada=True)
     else:
-        Attempt.objects.create(partida=game, carta1=other, carta2=card, es_correcto=False)
-
-    # Verificar si ganó
-    total_pairs = _get_card_pairs_from_level(game.nivel)
-    if game.aciertos >= total_pairs:
-        game.activa = False
-        game.ganada = True
-        game.fecha_fin = timezone.now()
-        actualizar_estadisticas(game)
+        game.carta_set.filter(pk=card_pk).update(revelada=True)
 
-    game.save()
+    game.intento_set.create(carta1_id=other_pk, carta2_id=card_pk, es_correcto=es_par)
 
-    return {
+    if game.ganada and individual:
+        actualizar_estadisticas(game)
+
+    resultado = {
         'status': 'checked',
         'acierto': es_par,
-        'posiciones': [other.posicion, card.posicion],
-        'valores': [other.valor, card.valor],
-        'simbolos': [other.simbolo, card.simbolo],
-        'estado_partida': serialize_game_state(game)
+        'posiciones': [otra, position],
+        'valores': [tablero.valor(otra), tablero.valor(position)],
+        'simbolos': [other_simbolo, simbolo],
+        'estado_partida': _estado_partida(game, tablero, cartas)
     }
+    if game.ganada and individual:
+        resultado['percentiles'] = percentiles_partida(game)
+    return resultado
 
 
 # -------------------------------
 # OCULTAR CARTAS INCORRECTAS
 # -------------------------------
 
-@transaction.atomic
 def hide_unmatched(game, pos1, pos2):
     """Oculta dos cartas que no hicieron par (usado por la vista/JS tras timeout)."""
-    cards = list(Card.objects.select_for_update().filter(
-        partida=game, posicion__in=[pos1, pos2]
-    ))
-    ocultadas = []
-    for c in cards:
-        if not c.emparejada:
-            c.revelada = False
-            c.save()
-            ocultadas.append(c.posicion)
-    return {'status': 'ok', 'ocultadas': ocultadas, 'estado_partida': serialize_game_state(game)}
+    return _con_reintentos(game, lambda: _ocultar(game, int(pos1), int(pos2)))
+
+
+def _ocultar(game, pos1, pos2):
+    version = game.version
+    tablero, cartas = _cargar_para_jugada(game, pos1, pos2)
+    eventos = tablero.ocultar(*(p for p in (pos1, pos2) if p in cartas))
+
+    ocultadas = list(eventos[0].posiciones) if eventos else []
+    if ocultadas:
+        _cas(game, version, solo_activa=False)
+        game.carta_set.filter(pk__in=[cartas[p][0] for p in ocultadas]).update(revelada=False)
+    return {'status': 'ok', 'ocultadas': ocultadas, 'estado_partida': _estado_partida(game, tablero, cartas)}
 
 
 # -------------------------------
 # ABANDONAR PARTIDA
 # -------------------------------
 
-@transaction.atomic
 def forfeit_game(game):
     """
     Marca la partida como derrota y actualiza las estadísticas.
     """
-    if not game or not game.activa:
+    if not game:
         return "Partida inválida o ya finalizada"
+    with transaction.atomic(using=router.db_for_write(Game, instance=game)):
+        return _abandonar(game)
+
+
+def _abandonar(game):
+    # Abandonar no depende de las cartas: tablero parcial sin casillas, sin consultarlas
+    tablero = Tablero.parcial(game.pares or 0, {}, **_estado_tablero(game))
+    evento = tablero.abandonar(Game.MOTIVO_DERROTA)[0]
+    if evento.tipo == EV_RECHAZADA:
+        return evento.mensaje
+
+    # UPDATE condicional: evita contar dos veces la derrota y pisar jugadas concurrentes
+    fecha_fin = timezone.now()
+    filas = para_partida(Game, game.pk).filter(pk=game.pk, activa=True).update(
+        activa=False, ganada=False, fecha_fin=fecha_fin, motivo_fin=tablero.motivo_fin,
+        carta_pendiente=None, version=F('version') + 1, ultima_actualizacion=fecha_fin,
+    )
+    if not filas:
+        return "Partida inválida o ya finalizada"
+    game.refresh_from_db(fields=_CAMPOS_ESTADO)
 
-    game.activa = False
-    game.ganada = False
-    game.fecha_fin = timezone.now()
-    game.save()
-
-    stats, _ = Estadistica.objects.get_or_create(usuario=game.usuario, nivel=game.nivel)
-    stats.total_partidas += 1
-    stats.derrotas += 1
-    stats.save()
+    actualizar_estadisticas(game)
     return "Partida marcada como derrota"
 
 
@@ -230,29 +434,56 @@ def forfeit_game(game):
 # SERIALIZAR ESTADO
 # -------------------------------
 
-def serialize_game_state(game):
-    """Devuelve el estado actual de la partida con campos necesarios para el cliente."""
-    cards_qs = game.carta_set.all().order_by('posicion')
-    cards_list = []
-
-    for c in cards_qs:
-        item = {
-            'posicion': c.posicion,
-            'revelada': c.revelada,
-            'emparejada': c.emparejada,
-            'valor': c.valor if (c.revelada or c.emparejada) else None,
-            'simbolo': c.simbolo if (c.revelada or c.emparejada) else None,
-        }
-        cards_list.append(item)
-
-    return {
-        'partida_id': str(game.id),
-        'movimientos': game.movimientos,
-        'aciertos': game.aciertos,
-        'activa': game.activa,
-        'ganada': game.ganada,
-        'cartas': cards_list,
-    }
+def serialize_game_state(game, ventana=None):
+    """
+    Devuelve el estado actual de la partida con campos necesarios para el cliente.
+    ``ventana`` = (fila, columna, alto, ancho) limita las cartas a ese rectángulo
+    del tablero (filas × columnas del nivel), para tableros grandes.
+    """
+    if ventana is None:
+        return _estado_partida(game, *_cargar_tablero(game))
+
+    columnas = game.nivel.columnas
+    filtro, ventana = _filtro_ventana(columnas, ventana)
+    estado = _estado_partida(game, *_cargar_tablero(game, filtro))
+    estado['columnas'] = columnas
+    estado['ventana'] = ventana
+    return estado
+
+
+async def aserialize_game_state(game, ventana=None):
+    """Versión con el ORM asíncrono de serialize_game_state (vistas servidas por ASGI)."""
+    if ventana is None:
+        filas = [fila async for fila in _consulta_tablero(game)]
+        return _estado_partida(game, *_construir_tablero(game, filas))
+
+    nivel = await Level.objects.aget(pk=game.nivel_id)
+    filtro, ventana = _filtro_ventana(nivel.columnas, ventana)
+    if not game.pares:
+        game.pares = await game.carta_set.acount() // 2
+    filas = [fila async for fila in _consulta_tablero(game, filtro)]
+    estado = _estado_partida(game, *_construir_tablero(game, filas, parcial=True))
+    estado['columnas'] = nivel.columnas
+    estado['ventana'] = ventana
+    return estado
+
+
+def _filtro_ventana(columnas, ventana):
+    """
+    Q de las posiciones del rectángulo (fila, columna, alto, ancho) y la ventana ajustada
+    al tablero: un rango de posiciones (índice de la partida) y la columna por módulo,
+    dos condiciones sea cual sea el tamaño de la ventana.
+    """
+    fila, columna, alto, ancho = ventana
+    ancho = max(0, min(ancho, columnas - columna))
+    if not alto or not ancho:
+        return Q(pk__in=[]), [fila, columna, alto, ancho]
+    primera = fila * columnas + columna
+    ultima = (fila + alto - 1) * columnas + columna + ancho - 1
+    filtro = Q(posicion__range=(primera, ultima))
+    if ancho < columnas:
+        filtro &= Q(Range(Mod('posicion', columnas), (columna, columna + ancho - 1)))
+    return filtro, [fila, columna, alto, ancho]
 
 # -------------------------------
 # ACTUALIZAR ESTADÍSTICAS
@@ -270,11 +501,17 @@ def actualizar_estadisticas(game):
     # 🔹 Registrar victoria o derrota
     if game.ganada:
         stats.victorias += 1
+        registrar_duracion(stats, game)
+        registrar_partida(game)
     else:
         stats.derrotas += 1
 
-    # 🔹 Calcular promedio de intentos
+    # 🔹 Movimientos y aciertos de la última partida
     intentos = game.movimientos or 0
+    stats.intentos = intentos
+    stats.pares_encontrados = game.aciertos or 0
+
+    # 🔹 Calcular promedio de intentos
     if stats.total_partidas > 0:
         promedio = (
             ((stats.promedio_intentos * (stats.total_partidas - 1)) + intentos)
@@ -291,13 +528,15 @@ def actualizar_estadisticas(game):
 # -------------------------------
 
 @login_required
+@throttle_moves
+@coalesce_reveals
 def reveal_card_view(request, pos):
     """Endpoint GET para revelar carta por posición (URL: /reveal/<pos>/)."""
-    partida = Game.objects.filter(usuario=request.user, activa=True).first()
+    partida = request.user.partida_set.filter(activa=True, sala__isnull=True).first()
     if not partida:
         return JsonResponse({'status': 'error', 'message': 'No hay partida activa'}, status=400)
 
     resultado = reveal_card(partida, pos)
     resultado["aciertos_actuales"] = partida.aciertos
 
-    return JsonResponse(resultado)
+    return respuesta_estado(request, resultado)
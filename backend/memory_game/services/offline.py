@@ -0,0 +1,218 @@
+# memory_game/services/offline.py
+"""
+Partidas sin conexión: una petición al empezar y otra al terminar, en vez de una por jugada.
+
+1. ``emitir_compromiso``: el servidor baraja el tablero y devuelve su disposición
+   con un compromiso firmado (django.core.signing) que fija usuario, nivel, semilla
+   del barajado y hora de emisión.
+2. El cliente juega en local y envía el registro completo de jugadas: las
+   posiciones reveladas, en orden (tras un fallo las dos cartas se ocultan solas).
+3. ``registrar_partida_offline``: el servidor rehace el tablero a partir de la
+   semilla firmada, reproduce las jugadas con las reglas de Tablero y, si todas son
+   válidas, guarda Partida, Carta, Intento y Estadistica en una transacción.
+
+El cliente conoce el tablero (como ya lo conoce la página del tablero): la
+reproducción garantiza que el registro es una partida legal sobre el tablero
+comprometido, no que el jugador no haya mirado. La duración es la del servidor,
+de la emisión al envío, y no puede bajar de PARTIDA_OFFLINE_MS_POR_JUGADA por
+jugada: un registro generado por un script y enviado al instante no entra en los
+rankings de tiempo.
+"""
+import random
+import secrets
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+
+from ..db_routers import para_partida, para_usuario
+from ..models import Carta, Estadistica, Intento, Nivel, Partida
+from .game_engine import MAX_CARTAS_ESTADO_COMPLETO, _get_card_pairs_from_level, actualizar_estadisticas
+from .percentiles import percentiles_partida
+from .tablero import EMPAREJADA, EV_FALLO, EV_IGNORADA, EV_PAR, EV_RECHAZADA, OCULTA, Tablero
+
+SAL_COMPROMISO = 'memory_game.offline.compromiso'
+
+# Tableros sin conexión: los de tamaño normal (el registro entero va en una petición)
+MAX_CARTAS_OFFLINE = MAX_CARTAS_ESTADO_COMPLETO
+
+# Margen sobre PARTIDA_TIEMPO_LIMITE_S para el envío del registro (enlaces lentos)
+MARGEN_ENVIO = timedelta(seconds=30)
+
+
+class RegistroInvalido(Exception):
+    """Compromiso falso, caducado o ajeno, o registro de jugadas que no se puede reproducir."""
+
+
+class RegistroDuplicado(RegistroInvalido):
+    """El compromiso ya se usó para registrar una partida."""
+
+
+def _validez_s():
+    return getattr(settings, 'PARTIDA_OFFLINE_VALIDEZ_S', 24 * 3600)
+
+
+def _duracion_minima(jugadas):
+    return timedelta(milliseconds=len(jugadas) * getattr(settings, 'PARTIDA_OFFLINE_MS_POR_JUGADA', 300))
+
+
+def _tablero(datos):
+    return Tablero.nuevo(datos['p'], rng=random.Random(datos['s']))
+
+
+# -------------------------------
+# COMPROMISO AL EMPEZAR
+# -------------------------------
+
+def emitir_compromiso(usuario, nivel):
+    """Baraja un tablero para ``usuario`` y devuelve su disposición y el compromiso firmado."""
+    pares = _get_card_pairs_from_level(nivel)
+    if pares * 2 > MAX_CARTAS_OFFLINE:
+        raise RegistroInvalido(f"Sin conexión solo se juegan tableros de hasta {MAX_CARTAS_OFFLINE} cartas")
+
+    emitido = timezone.now()
+    datos = {
+        'id': secrets.token_hex(16),
+        'u': usuario.pk,
+        'n': nivel.pk,
+        'p': pares,
+        's': secrets.randbits(63),
+        't': int(emitido.timestamp() * 1000),
+    }
+    tablero = _tablero(datos)
+    limite = getattr(settings, 'PARTIDA_TIEMPO_LIMITE_S', 0)
+    return {
+        'compromiso': signing.dumps(datos, salt=SAL_COMPROMISO, compress=True),
+        'nivel_id': nivel.pk,
+        'valores': [tablero.valor(pos) for pos in range(len(tablero))],
+        'emitido': emitido.isoformat(),
+        'fecha_limite': (emitido + timedelta(seconds=limite)).isoformat() if limite else None,
+    }
+
+
+def _abrir(compromiso, usuario):
+    try:
+        datos = signing.loads(compromiso, salt=SAL_COMPROMISO, max_age=_validez_s())
+    except signing.SignatureExpired:
+        raise RegistroInvalido("Compromiso caducado")
+    except signing.BadSignature:
+        raise RegistroInvalido("Compromiso inválido")
+    if datos.get('u') != usuario.pk:
+        raise RegistroInvalido("El compromiso es de otro usuario")
+    return datos
+
+
+# -------------------------------
+# REPRODUCCIÓN DEL REGISTRO
+# -------------------------------
+
+def reproducir(tablero, jugadas):
+    """
+    Aplica ``jugadas`` (posiciones reveladas, en orden) sobre ``tablero`` con las
+    mismas reglas que el motor; tras un fallo las dos cartas se ocultan. Una jugada
+    ignorada o rechazada (carta ya visible, posición inválida, partida terminada)
+    invalida el registro. Devuelve los intentos como [(pos1, pos2, es_par)].
+    """
+    if not isinstance(jugadas, list) or len(jugadas) > 4 * len(tablero) * len(tablero):
+        raise RegistroInvalido("Registro de jugadas inválido")
+
+    intentos = []
+    for n, pos in enumerate(jugadas, 1):
+        if type(pos) is not int:
+            raise RegistroInvalido(f"Jugada {n}: posición inválida")
+        evento = tablero.revelar(pos)[0]
+        if evento.tipo in (EV_IGNORADA, EV_RECHAZADA):
+            raise RegistroInvalido(f"Jugada {n}: {evento.mensaje}")
+        if evento.tipo == EV_FALLO:
+            tablero.ocultar(*evento.posiciones)
+        if evento.tipo in (EV_PAR, EV_FALLO):
+            intentos.append((*evento.posiciones, evento.tipo == EV_PAR))
+    return intentos
+
+
+# -------------------------------
+# REGISTRO AL TERMINAR
+# -------------------------------
+
+def registrar_partida_offline(usuario, compromiso, jugadas):
+    """
+    Verifica y guarda una partida jugada sin conexión. Sin victoria en el registro, o
+    enviada después del tiempo límite (más MARGEN_ENVIO), cuenta como derrota.
+    Devuelve el resumen de la partida; lanza RegistroInvalido si no se puede aceptar.
+    """
+    datos = _abrir(compromiso, usuario)
+    nivel = Nivel.objects.filter(pk=datos['n']).first()
+    if nivel is None:
+        raise RegistroInvalido("El nivel del compromiso ya no existe")
+
+    tablero = _tablero(datos)
+    intentos = reproducir(tablero, jugadas)
+
+    emitido = datetime.fromtimestamp(datos['t'] / 1000, tz=dt_timezone.utc)
+    fin = timezone.now()
+    if fin - emitido < _duracion_minima(jugadas):
+        raise RegistroInvalido("Registro demasiado rápido para una partida jugada a mano")
+    limite = getattr(settings, 'PARTIDA_TIEMPO_LIMITE_S', 0)
+    ganada = tablero.ganada and not (limite and fin > emitido + timedelta(seconds=limite) + MARGEN_ENVIO)
+
+    try:
+        game = _guardar(usuario, nivel, datos['id'], tablero, intentos, emitido, fin, ganada)
+    except IntegrityError:
+        # Solo la restricción única de ``compromiso``: cualquier otra es un error de verdad
+        if para_usuario(Partida, usuario.pk).filter(compromiso=datos['id']).exists():
+            raise RegistroDuplicado("Partida ya registrada")
+        raise
+
+    resultado = {
+        'partida_id': str(game.pk),
+        'ganada': game.ganada,
+        'movimientos': game.movimientos,
+        'aciertos': game.aciertos,
+    }
+    if game.ganada:
+        resultado['percentiles'] = percentiles_partida(game)
+    return resultado
+
+
+def _guardar(usuario, nivel, compromiso_id, tablero, intentos, emitido, fin, ganada):
+    """Partida, cartas e intentos en el shard del usuario y su Estadistica, en una transacción."""
+    db = router.db_for_write(Partida, instance=usuario)
+    with transaction.atomic(using=db), transaction.atomic(using=router.db_for_write(Estadistica)):
+        game = para_usuario(Partida, usuario.pk).create(
+            usuario=usuario,
+            nivel=nivel,
+            activa=False,
+            ganada=ganada,
+            movimientos=tablero.movimientos,
+            aciertos=tablero.aciertos,
+            pares=tablero.pares,
+            fecha_fin=fin,
+            motivo_fin=Partida.MOTIVO_VICTORIA if ganada else Partida.MOTIVO_DERROTA,
+            compromiso=compromiso_id,
+        )
+        # fecha_inicio es auto_now_add: la partida empezó al emitir el compromiso
+        para_partida(Partida, game.pk).filter(pk=game.pk).update(fecha_inicio=emitido)
+        game.fecha_inicio = emitido
+        game.marcar_guardado(['fecha_inicio'])
+
+        cartas = Carta.objects.using(game._state.db).bulk_create([
+            Carta(
+                partida=game,
+                nivel=nivel,
+                posicion=pos,
+                valor=tablero.valor(pos),
+                simbolo=tablero.valor(pos),
+                revelada=tablero.estados[pos] != OCULTA,
+                emparejada=tablero.estados[pos] == EMPAREJADA,
+            )
+            for pos in range(len(tablero))
+        ])
+        Intento.objects.using(game._state.db).bulk_create([
+            Intento(usuario=usuario, partida=game, carta1=cartas[a], carta2=cartas[b], es_correcto=es_par)
+            for a, b, es_par in intentos
+        ], batch_size=1000)
+
+        actualizar_estadisticas(game)
+    return game
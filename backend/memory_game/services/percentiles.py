@@ -0,0 +1,229 @@
+# memory_game/services/percentiles.py
+import math
+import random
+
+from django.conf import settings
+from django.db import transaction
+
+from ..db_routers import en_cada_shard
+from ..models import BosquejoNivel, Partida
+from .duraciones import duracion_partida_ms
+
+# Error relativo de los cuantiles y tope de contenedores: ~1 % y a lo sumo
+# MAX_CONTENEDORES enteros por bosquejo, sin importar cuántas partidas haya
+ALFA = 0.01
+MAX_CONTENEDORES = 2048
+
+
+def franjas():
+    """Filas (franjas) por nivel y métrica: cada victoria bloquea solo una al azar."""
+    return max(1, getattr(settings, 'BOSQUEJO_FRANJAS', 8))
+
+
+# -------------------------------
+# BOSQUEJO DE CUANTILES (DDSketch)
+# -------------------------------
+
+class BosquejoCuantiles:
+    """
+    Histograma con contenedores logarítmicos (DDSketch): el valor v cae en ceil(log_gamma(v)).
+    Dos bosquejos con el mismo alfa se combinan sumando contadores; si se supera
+    MAX_CONTENEDORES se fusionan los más bajos (los cuantiles altos siguen exactos al alfa).
+    """
+
+    def __init__(self, alfa=ALFA, max_contenedores=MAX_CONTENEDORES):
+        self.alfa = alfa
+        self.gamma = (1 + alfa) / (1 - alfa)
+        self._log_gamma = math.log(self.gamma)
+        self.max_contenedores = max_contenedores
+        self.ceros = 0          # valores <= 0 (p. ej. 0 movimientos)
+        self.offset = 0         # clave del primer contador
+        self.contadores = []    # contadores densos desde offset
+        self.total = 0
+
+    def _clave(self, valor):
+        return math.ceil(math.log(valor) / self._log_gamma)
+
+    def _valor(self, clave):
+        # Punto medio (en error relativo) del contenedor (gamma^(k-1), gamma^k]
+        return 2 * self.gamma ** clave / (self.gamma + 1)
+
+    def _asegurar(self, clave):
+        if not self.contadores:
+            self.offset = clave
+            self.contadores = [0]
+        elif clave < self.offset:
+            self.contadores[:0] = [0] * (self.offset - clave)
+            self.offset = clave
+        elif clave >= self.offset + len(self.contadores):
+            self.contadores.extend([0] * (clave - self.offset - len(self.contadores) + 1))
+
+    def _colapsar(self):
+        exceso = len(self.contadores) - self.max_contenedores
+        if exceso > 0:
+            self.contadores[exceso] += sum(self.contadores[:exceso])
+            del self.contadores[:exceso]
+            self.offset += exceso
+
+    def agregar(self, valor, n=1):
+        if valor <= 0:
+            self.ceros += n
+        else:
+            clave = self._clave(valor)
+            self._asegurar(clave)
+            self.contadores[clave - self.offset] += n
+            self._colapsar()
+        self.total += n
+
+    def combinar(self, otro):
+        if otro.alfa != self.alfa:
+            raise ValueError("Solo se pueden combinar bosquejos con el mismo alfa")
+        self.ceros += otro.ceros
+        self.total += otro.total
+        if otro.contadores:
+            self._asegurar(otro.offset)
+            self._asegurar(otro.offset + len(otro.contadores) - 1)
+            base = otro.offset - self.offset
+            for i, c in enumerate(otro.contadores):
+                self.contadores[base + i] += c
+            self._colapsar()
+
+    def cuantil(self, q):
+        """Valor aproximado del cuantil q (0..1), o None si está vacío."""
+        if not self.total:
+            return None
+        rango = q * (self.total - 1)
+        acumulado = self.ceros
+        if rango < acumulado:
+            return 0
+        for i, c in enumerate(self.contadores):
+            acumulado += c
+            if rango < acumulado:
+                return self._valor(self.offset + i)
+        return self._valor(self.offset + len(self.contadores) - 1)
+
+    def fraccion_mayores(self, valor):
+        """Fracción de valores registrados que caen en un contenedor mayor que el de ``valor``."""
+        if not self.total:
+            return None
+        if valor <= 0:
+            return (self.total - self.ceros) / self.total
+        fin = self._clave(valor) - self.offset + 1
+        hasta = self.ceros + sum(self.contadores[:max(fin, 0)])
+        return (self.total - hasta) / self.total
+
+    # Serialización compacta para BosquejoNivel.datos
+    def a_dict(self):
+        return {'a': self.alfa, 'n': self.total, 'z': self.ceros, 'o': self.offset, 'c': self.contadores}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        bosquejo = cls(alfa=datos.get('a', ALFA))
+        bosquejo.total = datos.get('n', 0)
+        bosquejo.ceros = datos.get('z', 0)
+        bosquejo.offset = datos.get('o', 0)
+        bosquejo.contadores = list(datos.get('c', []))
+        return bosquejo
+
+
+# -------------------------------
+# ACTUALIZACIÓN AL TERMINAR UNA PARTIDA
+# -------------------------------
+
+def _metricas(partida):
+    """Valores de cada métrica de una partida ganada (sin los que no se conocen)."""
+    valores = {BosquejoNivel.METRICA_MOVIMIENTOS: partida.movimientos or 0}
+    duracion = duracion_partida_ms(partida)
+    if duracion is not None:
+        valores[BosquejoNivel.METRICA_DURACION] = duracion
+    return valores
+
+
+def registrar_partida(partida):
+    """
+    Agrega una partida ganada a los bosquejos de su nivel. Solo las victorias son
+    comparables ("superaste al 80 % de los jugadores"). Se escribe en una franja al
+    azar: victorias simultáneas del mismo nivel rara vez esperan el mismo bloqueo.
+    """
+    if not partida.ganada or partida.nivel_id is None:
+        return
+
+    franja = random.randrange(franjas())
+    with transaction.atomic():
+        for metrica, valor in _metricas(partida).items():
+            fila, _ = BosquejoNivel.objects.select_for_update().get_or_create(
+                nivel_id=partida.nivel_id, metrica=metrica, franja=franja,
+            )
+            bosquejo = BosquejoCuantiles.desde_dict(fila.datos) if fila.datos else BosquejoCuantiles()
+            bosquejo.agregar(valor)
+            fila.datos = bosquejo.a_dict()
+            fila.total = bosquejo.total
+            fila.save(update_fields=['datos', 'total', 'actualizado'])
+
+
+# -------------------------------
+# CONSULTA DE PERCENTILES
+# -------------------------------
+
+def bosquejos_nivel(nivel_id, metricas):
+    """{metrica: bosquejo} del nivel, combinando sus franjas."""
+    bosquejos = {}
+    for fila in BosquejoNivel.objects.filter(nivel_id=nivel_id, metrica__in=metricas):
+        bosquejo = BosquejoCuantiles.desde_dict(fila.datos)
+        if fila.metrica in bosquejos:
+            bosquejos[fila.metrica].combinar(bosquejo)
+        else:
+            bosquejos[fila.metrica] = bosquejo
+    return bosquejos
+
+
+def percentiles_partida(partida):
+    """
+    Porcentaje de victorias del nivel con más movimientos / más tiempo que esta
+    partida, por métrica. Lee las franjas de cada métrica, sin ordenar partidas.
+    """
+    valores = _metricas(partida)
+    resultado = {}
+    for metrica, bosquejo in bosquejos_nivel(partida.nivel_id, valores).items():
+        fraccion = bosquejo.fraccion_mayores(valores[metrica])
+        if fraccion is not None:
+            resultado[metrica] = round(100 * fraccion)
+    return resultado
+
+
+# -------------------------------
+# RECONSTRUCCIÓN DESDE EL HISTORIAL
+# -------------------------------
+
+def reconstruir_bosquejos(nivel=None):
+    """
+    Recalcula los bosquejos a partir de las partidas ganadas (opcionalmente de un
+    nivel). Memoria acotada: se recorre el historial con iterator(). Devuelve las
+    partidas procesadas. Cada bosquejo queda en la franja 0; las victorias nuevas
+    se reparten de nuevo entre todas.
+    """
+    ganadas = Partida.objects.filter(ganada=True, nivel__isnull=False)
+    if nivel is not None:
+        ganadas = ganadas.filter(nivel=nivel)
+
+    bosquejos = {}
+    procesadas = 0
+    ganadas = ganadas.only('nivel_id', 'movimientos', 'ganada', 'fecha_inicio', 'fecha_fin')
+    # Un mismo bosquejo por nivel y métrica recibe las partidas de todos los shards
+    for qs in en_cada_shard(ganadas):
+        for partida in qs.iterator(chunk_size=2000):
+            for metrica, valor in _metricas(partida).items():
+                bosquejos.setdefault((partida.nivel_id, metrica), BosquejoCuantiles()).agregar(valor)
+            procesadas += 1
+
+    filas = [
+        BosquejoNivel(nivel_id=nivel_id, metrica=metrica, datos=b.a_dict(), total=b.total)
+        for (nivel_id, metrica), b in bosquejos.items()
+    ]
+    with transaction.atomic():
+        borrar = BosquejoNivel.objects.all()
+        if nivel is not None:
+            borrar = borrar.filter(nivel=nivel)
+        borrar.delete()
+        BosquejoNivel.objects.bulk_create(filas)
+    return procesadas
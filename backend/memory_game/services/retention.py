@@ -0,0 +1,111 @@
+# memory_game/services/retention.py
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from ..db_routers import agregar_en_shards, en_cada_shard
+from ..models import Intento, MarcaAgua, ResumenIntentos
+
+MARCA_INTENTOS = 'rollup_intentos_diarios'
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+# -------------------------------
+# ROLLUP INCREMENTAL DE INTENTOS
+# -------------------------------
+
+def rollup_intentos(hasta=None):
+    """
+    Agrega los Intento por (usuario, nivel, día) en ResumenIntentos.
+    Solo procesa días cerrados posteriores a la marca de agua; devuelve los días procesados.
+    """
+    hoy = hasta or timezone.localdate()
+    marca, _ = MarcaAgua.objects.get_or_create(nombre=MARCA_INTENTOS)
+
+    if marca.fecha:
+        desde = timezone.localdate(marca.fecha)
+    else:
+        primero = agregar_en_shards(Intento.objects.all(), primero=Min('fecha'))['primero']
+        if primero is None:
+            return 0
+        desde = timezone.localdate(primero)
+
+    if desde >= hoy:
+        return 0
+
+    filas = agregar_en_shards(
+        Intento.objects
+        .filter(fecha__gte=_inicio_del_dia(desde), fecha__lt=_inicio_del_dia(hoy))
+        .annotate(
+            dia=TruncDate('fecha'),
+            jugador=Coalesce('usuario_id', 'partida__usuario_id'),
+            nivel_partida=F('partida__nivel_id'),
+        ),
+        agrupar=('jugador', 'nivel_partida', 'dia'),
+        intentos=Count('id'),
+        correctos=Count('id', filter=Q(es_correcto=True)),
+    )
+    resumenes = [
+        ResumenIntentos(
+            usuario_id=f['jugador'],
+            nivel_id=f['nivel_partida'],
+            dia=f['dia'],
+            intentos=f['intentos'],
+            correctos=f['correctos'],
+        )
+        for f in filas
+    ]
+
+    with transaction.atomic():
+        ResumenIntentos.objects.bulk_create(
+            resumenes,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['usuario', 'nivel', 'dia'],
+            update_fields=['intentos', 'correctos'],
+        )
+        marca.fecha = _inicio_del_dia(hoy)
+        marca.save(update_fields=['fecha', 'actualizado'])
+
+    return (hoy - desde).days
+
+
+# -------------------------------
+# PURGA DE INTENTOS ANTIGUOS
+# -------------------------------
+
+def purgar_intentos(retencion_dias=None):
+    """
+    Borra, un día a la vez, los Intento fuera de la ventana de retención cuyo día
+    ya está agregado. Devuelve el número de filas borradas.
+    """
+    if retencion_dias is None:
+        retencion_dias = getattr(settings, 'INTENTO_RETENCION_DIAS', 30)
+
+    marca = MarcaAgua.objects.filter(nombre=MARCA_INTENTOS).first()
+    if marca is None or marca.fecha is None:
+        return 0  # nada agregado todavía: no se puede borrar nada
+
+    limite = min(_inicio_del_dia(timezone.localdate() - timedelta(days=retencion_dias)), marca.fecha)
+    borrados = 0
+    for intentos in en_cada_shard(Intento.objects.filter(fecha__lt=limite)):
+        primero = intentos.order_by('fecha').values_list('fecha', flat=True).first()
+        if primero is None:
+            continue
+
+        dia = timezone.localdate(primero)
+        while _inicio_del_dia(dia) < limite:
+            inicio = _inicio_del_dia(dia)
+            fin = min(_inicio_del_dia(dia + timedelta(days=1)), limite)
+            # Intento no tiene relaciones inversas: DELETE por rango directo sobre el índice de fecha
+            n, _ = intentos.filter(fecha__gte=inicio, fecha__lt=fin).delete()
+            borrados += n
+            dia += timedelta(days=1)
+    return borrados
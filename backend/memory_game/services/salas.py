@@ -0,0 +1,174 @@
+# memory_game/services/salas.py
+import secrets
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from ..models import JugadorSala, Sala
+from .broker import get_broker
+from .game_engine import create_game, hide_unmatched, reveal_card, serialize_game_state
+
+MAX_JUGADORES_SALA = 8
+
+
+class ErrorSala(Exception):
+    """Acción no permitida en la sala (turno ajeno, sala llena, etc.)."""
+
+
+def canal_sala(sala):
+    return f"sala:{sala.codigo}"
+
+
+def _publicar(sala, tipo, datos):
+    """Publica en el broker cuando la transacción confirma (nunca estados revertidos)."""
+    canal = canal_sala(sala)
+    transaction.on_commit(lambda: get_broker().publicar(canal, tipo, datos))
+
+
+def _jugadores(sala):
+    return list(sala.jugadores.select_related('usuario').order_by('orden'))
+
+
+def _marcador(jugadores):
+    return [{'usuario': j.usuario.username, 'aciertos': j.aciertos} for j in jugadores]
+
+
+# -------------------------------
+# CICLO DE VIDA DE LA SALA
+# -------------------------------
+
+@transaction.atomic
+def crear_sala(usuario, nivel, max_jugadores=4):
+    if not 2 <= max_jugadores <= MAX_JUGADORES_SALA:
+        raise ErrorSala(f"La sala admite de 2 a {MAX_JUGADORES_SALA} jugadores")
+
+    # El tablero de la sala no cierra las partidas individuales del creador. Es de todos
+    # los jugadores: vive en 'default' (shard 0) junto a la Sala que lo referencia
+    partida = create_game(usuario, nivel, cerrar_previas=False, using='default', tiempo_limite=0)
+    sala = Sala.objects.create(
+        codigo=secrets.token_urlsafe(6),
+        creador=usuario,
+        nivel=nivel,
+        partida=partida,
+        max_jugadores=max_jugadores,
+    )
+    JugadorSala.objects.create(sala=sala, usuario=usuario, orden=0)
+    return sala
+
+
+@transaction.atomic
+def unirse(sala, usuario):
+    sala = Sala.objects.select_for_update().get(pk=sala.pk)
+    if sala.jugadores.filter(usuario=usuario).exists():
+        return sala
+    if sala.estado != Sala.ESTADO_ESPERANDO:
+        raise ErrorSala("La partida ya comenzó")
+    n = sala.jugadores.count()
+    if n >= sala.max_jugadores:
+        raise ErrorSala("La sala está llena")
+    try:
+        JugadorSala.objects.create(sala=sala, usuario=usuario, orden=n)
+    except IntegrityError:
+        raise ErrorSala("No se pudo unir a la sala, intenta de nuevo")
+
+    _publicar(sala, 'jugador_unido', {'usuario': usuario.username, 'jugadores': n + 1})
+    return sala
+
+
+@transaction.atomic
+def iniciar(sala, usuario):
+    sala = Sala.objects.select_for_update().get(pk=sala.pk)
+    if sala.creador_id != usuario.pk:
+        raise ErrorSala("Solo el creador puede iniciar la sala")
+    if sala.estado != Sala.ESTADO_ESPERANDO:
+        raise ErrorSala("La sala ya comenzó")
+    jugadores = _jugadores(sala)
+    if len(jugadores) < 2:
+        raise ErrorSala("Se necesitan al menos 2 jugadores")
+
+    sala.estado = Sala.ESTADO_JUGANDO
+    sala.turno = 0
+    sala.save(update_fields=['estado', 'turno'])
+    _publicar(sala, 'inicio', {'turno': jugadores[0].usuario.username, 'marcador': _marcador(jugadores)})
+    return sala
+
+
+# -------------------------------
+# JUGADAS POR TURNOS
+# -------------------------------
+
+@transaction.atomic
+def jugar(sala, usuario, posicion):
+    """
+    Revela una carta en el tablero de la sala si es el turno de ``usuario``.
+    Un fallo oculta las cartas y pasa el turno; un acierto lo conserva.
+    """
+    # Bloquear la sala serializa las jugadas de la sala (y el cambio de turno)
+    sala = Sala.objects.select_for_update().select_related('partida').get(pk=sala.pk)
+    if sala.estado != Sala.ESTADO_JUGANDO:
+        raise ErrorSala("La sala no está en juego")
+    jugadores = _jugadores(sala)
+    actual = jugadores[sala.turno % len(jugadores)]
+    if actual.usuario_id != usuario.pk:
+        raise ErrorSala(f"Es el turno de {actual.usuario.username}")
+
+    partida = sala.partida
+    resultado = reveal_card(partida, posicion, individual=False)
+    if resultado['status'] not in ('first_reveal', 'checked'):
+        return resultado
+
+    evento = {'jugador': usuario.username, 'status': resultado['status']}
+    if resultado['status'] == 'first_reveal':
+        evento.update(posiciones=[posicion], valores=[resultado['valor']], simbolos=[resultado['simbolo']])
+        _publicar(sala, 'jugada', evento)
+        return resultado
+
+    evento.update(
+        posiciones=resultado['posiciones'],
+        valores=resultado['valores'],
+        simbolos=resultado['simbolos'],
+        acierto=resultado['acierto'],
+    )
+    if resultado['acierto']:
+        JugadorSala.objects.filter(pk=actual.pk).update(aciertos=F('aciertos') + 1)
+        actual.aciertos += 1
+    else:
+        hide_unmatched(partida, *resultado['posiciones'])
+        sala.turno = (sala.turno + 1) % len(jugadores)
+        sala.save(update_fields=['turno'])
+
+    evento['turno'] = jugadores[sala.turno].usuario.username
+    evento['marcador'] = _marcador(jugadores)
+    _publicar(sala, 'jugada', evento)
+
+    if partida.ganada:
+        sala.estado = Sala.ESTADO_TERMINADA
+        sala.save(update_fields=['estado'])
+        mejor = max(j.aciertos for j in jugadores)
+        _publicar(sala, 'fin', {
+            'ganadores': [j.usuario.username for j in jugadores if j.aciertos == mejor],
+            'marcador': _marcador(jugadores),
+        })
+    return resultado
+
+
+# -------------------------------
+# ESTADO (SNAPSHOT PARA ESPECTADORES)
+# -------------------------------
+
+def estado_sala(sala):
+    """Estado completo + id del último evento: el cliente se suscribe desde ahí."""
+    # Leer el id antes del tablero: un evento intermedio se repite, nunca se pierde
+    ultimo_evento = get_broker().ultimo_id(canal_sala(sala))
+    jugadores = _jugadores(sala)
+    return {
+        'codigo': sala.codigo,
+        'nivel': sala.nivel.nombre,
+        'estado': sala.estado,
+        'turno': jugadores[sala.turno % len(jugadores)].usuario.username if jugadores else None,
+        'marcador': _marcador(jugadores),
+        'max_jugadores': sala.max_jugadores,
+        'espectadores': get_broker().suscriptores(canal_sala(sala)),
+        'ultimo_evento': ultimo_evento,
+        'tablero': serialize_game_state(sala.partida),
+    }
@@ -0,0 +1,519 @@
+# memory_game/services/simulador.py
+import asyncio
+import io
+import json
+import multiprocessing
+import random
+import sys
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.utils.text import compress_string
+
+from ..models import Nivel
+from .game_engine import (
+    _get_card_pairs_from_level,
+    create_game,
+    hide_unmatched,
+    reveal_card,
+    serialize_game_state,
+)
+from .formato import codificar_binario, compactar
+from .tablero import EV_PAR, EV_REVELADA, Tablero
+
+PREFIJO_USUARIO = 'simulador_'
+
+# Jugadas máximas por partida antes de abandonarla (evita bucles si algo falla)
+MAX_JUGADAS_POR_CARTA = 50
+
+
+# -------------------------------
+# ESTRATEGIAS DE JUGADOR
+# -------------------------------
+
+class Jugador:
+    """
+    Jugador simulado. Solo conoce lo que el motor le devuelve al revelar.
+    ``memoria`` es la probabilidad de recordar una carta vista: 0 = aleatorio, 1 = memoria perfecta.
+    """
+
+    def __init__(self, memoria=0.0, rng=None):
+        self.memoria = memoria
+        self.rng = rng or random.Random()
+
+    def empezar(self, total_cartas):
+        self.ocultas = set(range(total_cartas))
+        self.vistas = {}  # posicion -> valor
+
+    def _recordar(self, posicion, valor):
+        if self.rng.random() < self.memoria:
+            self.vistas[posicion] = valor
+
+    def _desconocida(self, excluir=None):
+        candidatas = [p for p in self.ocultas if p not in self.vistas and p != excluir]
+        if not candidatas:
+            candidatas = [p for p in self.ocultas if p != excluir]
+        return self.rng.choice(candidatas)
+
+    def primera(self):
+        # Un par ya conocido se juega directamente
+        por_valor = {}
+        for posicion, valor in self.vistas.items():
+            if valor in por_valor:
+                return por_valor[valor]
+            por_valor[valor] = posicion
+        return self._desconocida()
+
+    def segunda(self, primera, valor):
+        for posicion, v in self.vistas.items():
+            if v == valor and posicion != primera:
+                return posicion
+        return self._desconocida(excluir=primera)
+
+    def resultado(self, posiciones, valores, acierto):
+        if acierto:
+            for p in posiciones:
+                self.ocultas.discard(p)
+                self.vistas.pop(p, None)
+        else:
+            for p, v in zip(posiciones, valores):
+                self._recordar(p, v)
+
+
+ESTRATEGIAS = {
+    'aleatoria': 0.0,
+    'memoria_imperfecta': 0.5,
+    'memoria_perfecta': 1.0,
+}
+
+
+def crear_jugador(estrategia, memoria=None, semilla=None):
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"Estrategia desconocida: {estrategia}")
+    return Jugador(ESTRATEGIAS[estrategia] if memoria is None else memoria, random.Random(semilla))
+
+
+# -------------------------------
+# MEDICIÓN DE CONSULTAS
+# -------------------------------
+
+class Medidor:
+    """execute_wrapper que cuenta consultas y suma el tiempo pasado en la base de datos."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos_bd = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos_bd += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class Resultado:
+    """Totales de una simulación (combinables entre procesos)."""
+
+    CAMPOS = (
+        'partidas', 'ganadas', 'jugadas', 'movimientos', 'errores',
+        'consultas', 'segundos_bd', 'segundos_motor', 'segundos_creacion', 'segundos', 'procesos',
+    )
+
+    def __init__(self, **valores):
+        for campo in self.CAMPOS:
+            setattr(self, campo, valores.get(campo, 0))
+
+    def sumar(self, otro):
+        for campo in self.CAMPOS:
+            if campo != 'segundos':
+                setattr(self, campo, getattr(self, campo) + getattr(otro, campo))
+        # En paralelo el tiempo de pared es el del proceso más lento
+        self.segundos = max(self.segundos, otro.segundos)
+        return self
+
+    def a_dict(self):
+        return {campo: getattr(self, campo) for campo in self.CAMPOS}
+
+    def resumen(self):
+        s = self.segundos or 1e-9
+        return {
+            'partidas': self.partidas,
+            'ganadas': self.ganadas,
+            'errores': self.errores,
+            'partidas_por_s': round(self.partidas / s, 2),
+            'jugadas_por_s': round(self.jugadas / s, 2),
+            'ms_creacion_por_partida': round(1000 * self.segundos_creacion / self.partidas, 2) if self.partidas else 0,
+            'movimientos_por_partida': round(self.movimientos / self.partidas, 2) if self.partidas else 0,
+            'consultas_por_jugada': round(self.consultas / self.jugadas, 2) if self.jugadas else 0,
+            'ms_motor_por_jugada': round(1000 * self.segundos_motor / self.jugadas, 3) if self.jugadas else 0,
+            'ms_bd_por_jugada': round(1000 * self.segundos_bd / self.jugadas, 3) if self.jugadas else 0,
+            # Sobre el tiempo total de todos los procesos
+            'porcentaje_bd': round(100 * self.segundos_bd / (s * max(self.procesos, 1)), 1),
+        }
+
+
+# -------------------------------
+# SIMULACIÓN
+# -------------------------------
+
+def jugar_partida(usuario, nivel, jugador, medidor, max_jugadas=None):
+    """
+    Juega una partida completa (o ``max_jugadas`` pares de revelados) contra el
+    motor. Solo se miden las jugadas (reveal_card / hide_unmatched), no la creación.
+    """
+    inicio = time.perf_counter()
+    game = create_game(usuario, nivel, tiempo_limite=0)
+    r = Resultado(partidas=1, segundos_creacion=time.perf_counter() - inicio)
+    total = game.pares * 2
+    jugador.empezar(total)
+
+    def motor(fn, *args):
+        inicio = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            r.segundos_motor += time.perf_counter() - inicio
+
+    with connection.execute_wrapper(medidor):
+        for _ in range(max_jugadas or total * MAX_JUGADAS_POR_CARTA):
+            if not game.activa or not jugador.ocultas:
+                break
+            p1 = jugador.primera()
+            primera = motor(reveal_card, game, p1)
+            r.jugadas += 1
+            if primera['status'] != 'first_reveal':
+                r.errores += 1
+                jugador.ocultas.discard(p1)
+                continue
+
+            p2 = jugador.segunda(p1, primera['valor'])
+            segunda = motor(reveal_card, game, p2)
+            r.jugadas += 1
+            if segunda['status'] != 'checked':
+                r.errores += 1
+                break
+
+            jugador.resultado(segunda['posiciones'], segunda['valores'], segunda['acierto'])
+            if not segunda['acierto']:
+                motor(hide_unmatched, game, *segunda['posiciones'])
+                r.jugadas += 1
+
+    r.ganadas = int(game.ganada)
+    r.movimientos = game.movimientos
+    return r
+
+
+def simular(partidas, niveles, estrategia='memoria_perfecta', memoria=None, trabajador=0, semilla=None):
+    """Juega ``partidas`` partidas repartidas entre ``niveles`` en este proceso."""
+    usuario, _ = User.objects.get_or_create(username=f'{PREFIJO_USUARIO}{trabajador}')
+    jugador = crear_jugador(estrategia, memoria, semilla)
+    medidor = Medidor()
+    total = Resultado()
+
+    inicio = time.perf_counter()
+    for i in range(partidas):
+        total.sumar(jugar_partida(usuario, niveles[i % len(niveles)], jugador, medidor))
+    total.segundos = time.perf_counter() - inicio
+    total.consultas = medidor.consultas
+    total.segundos_bd = medidor.segundos_bd
+    total.procesos = 1
+    return total
+
+
+def jugar_en_memoria(pares, jugador, rng):
+    """Misma partida que jugar_partida, pero solo contra el núcleo Tablero (sin base de datos)."""
+    tablero = Tablero.nuevo(pares, rng)
+    jugador.empezar(len(tablero))
+    r = Resultado(partidas=1)
+
+    for _ in range(len(tablero) * MAX_JUGADAS_POR_CARTA):
+        if not tablero.activa or not jugador.ocultas:
+            break
+        p1 = jugador.primera()
+        r.jugadas += 1
+        if tablero.revelar(p1)[0].tipo != EV_REVELADA:
+            r.errores += 1
+            jugador.ocultas.discard(p1)
+            continue
+
+        p2 = jugador.segunda(p1, tablero.valor(p1))
+        evento = tablero.revelar(p2)[0]
+        r.jugadas += 1
+        acierto = evento.tipo == EV_PAR
+        jugador.resultado((p1, p2), (tablero.valor(p1), tablero.valor(p2)), acierto)
+        if not acierto:
+            tablero.ocultar(p1, p2)
+            r.jugadas += 1
+
+    r.ganadas = int(tablero.ganada)
+    r.movimientos = tablero.movimientos
+    return r
+
+
+def simular_en_memoria(partidas, niveles, estrategia='memoria_perfecta', memoria=None, semilla=None):
+    """Límite superior del motor: reglas puras, sin ORM ni consultas."""
+    jugador = crear_jugador(estrategia, memoria, semilla)
+    rng = random.Random(semilla)
+    pares = [_get_card_pairs_from_level(n) for n in niveles]
+    total = Resultado()
+
+    inicio = time.perf_counter()
+    for i in range(partidas):
+        total.sumar(jugar_en_memoria(pares[i % len(pares)], jugador, rng))
+    total.segundos = time.perf_counter() - inicio
+    total.procesos = 1
+    return total
+
+
+def medir_tablero(cartas, jugadas=300, estrategia='memoria_perfecta', semilla=None):
+    """
+    Benchmark de un tablero de ``cartas`` cartas: crea un nivel temporal, juega
+    ``jugadas`` turnos y mide también el estado completo frente a una ventana 20×20
+    y su tamaño en cada formato de transporte.
+    El nivel (y en cascada sus partidas) se borra al terminar.
+    """
+    filas = int(cartas ** 0.5)
+    while cartas % filas:
+        filas -= 1
+    nivel = Nivel.objects.create(
+        nombre=f'benchmark_{cartas}', dificultad=0, filas=filas, columnas=cartas // filas
+    )
+    try:
+        usuario, _ = User.objects.get_or_create(username=f'{PREFIJO_USUARIO}0')
+        medidor = Medidor()
+        inicio = time.perf_counter()
+        r = jugar_partida(usuario, nivel, crear_jugador(estrategia, semilla=semilla), medidor, jugadas)
+        r.segundos = time.perf_counter() - inicio
+        r.consultas, r.segundos_bd, r.procesos = medidor.consultas, medidor.segundos_bd, 1
+
+        game = usuario.partida_set.filter(nivel=nivel).latest('pk')
+        tiempos = {}
+        for clave, ventana in (('ms_estado_completo', None), ('ms_estado_ventana_20x20', (0, 0, 20, 20))):
+            inicio = time.perf_counter()
+            serialize_game_state(game, ventana)
+            tiempos[clave] = round(1000 * (time.perf_counter() - inicio), 2)
+
+        return {'cartas': cartas, **r.resumen(), **tiempos, **tamanos_estado(serialize_game_state(game))}
+    finally:
+        nivel.delete()
+
+
+def tamanos_estado(estado):
+    """Bytes del estado completo en cada formato de transporte, sin y con gzip."""
+    cuerpos = {
+        'json': json.dumps(estado).encode(),
+        'compacto': json.dumps(compactar(estado), separators=(',', ':')).encode(),
+        'binario': codificar_binario(estado),
+    }
+    tamanos = {}
+    for nombre, cuerpo in cuerpos.items():
+        tamanos[f'bytes_{nombre}'] = len(cuerpo)
+        tamanos[f'bytes_{nombre}_gzip'] = len(compress_string(cuerpo))
+    return tamanos
+
+
+def _trabajador(args):
+    trabajador, partidas, nivel_ids, estrategia, memoria, semilla = args
+    niveles = list(Nivel.objects.filter(pk__in=nivel_ids).order_by('dificultad'))
+    try:
+        return simular(partidas, niveles, estrategia, memoria, trabajador, semilla).a_dict()
+    finally:
+        connection.close()
+
+
+def simular_en_paralelo(partidas, niveles, procesos=1, estrategia='memoria_perfecta', memoria=None, semilla=None):
+    """
+    Reparte las partidas entre ``procesos`` procesos (fork), cada uno con su
+    propio usuario y conexión, para medir la contención en la base de datos.
+    """
+    if procesos <= 1:
+        return simular(partidas, niveles, estrategia, memoria, semilla=semilla)
+
+    # Las conexiones abiertas no deben heredarse entre procesos
+    connections.close_all()
+    nivel_ids = [n.pk for n in niveles]
+    reparto = [partidas // procesos + (1 if i < partidas % procesos else 0) for i in range(procesos)]
+    tareas = [
+        (i, n, nivel_ids, estrategia, memoria, None if semilla is None else semilla + i)
+        for i, n in enumerate(reparto) if n
+    ]
+    with multiprocessing.get_context('fork').Pool(len(tareas)) as pool:
+        parciales = pool.map(_trabajador, tareas)
+
+    total = Resultado()
+    for p in parciales:
+        total.sumar(Resultado(**p))
+    return total
+
+
+def limpiar_simulacion():
+    """Borra los usuarios simulados (y en cascada sus partidas y estadísticas)."""
+    borrados, _ = User.objects.filter(username__regex=rf'^{PREFIJO_USUARIO}\d+$').delete()
+    return borrados
+
+
+# -------------------------------
+# LECTURAS CONCURRENTES: WSGI FRENTE A ASGI
+# -------------------------------
+
+def _rutas_lectura(asincronas):
+    """Usuario, partida y sesión de prueba; rutas de las tres lecturas (síncronas o async)."""
+    from django.test import Client
+    from django.urls import reverse
+
+    usuario, _ = User.objects.get_or_create(username=f'{PREFIJO_USUARIO}0')
+    game = usuario.partida_set.filter(activa=True).first() or create_game(usuario, Nivel.objects.first(), tiempo_limite=0)
+    cliente = Client()
+    cliente.force_login(usuario)
+    cookie = f"sessionid={cliente.cookies['sessionid'].value}"
+
+    sufijo = '_async' if asincronas else ''
+    rutas = [
+        reverse(f'game_state{sufijo}', args=[game.pk]),
+        reverse(f'user_stats{sufijo}', args=[usuario.username]),
+        reverse(f'estadisticas_usuario{sufijo}'),
+    ]
+    return rutas, cookie
+
+
+def _latencia_bd(segundos):
+    """execute_wrapper que simula el viaje de red a una base de datos remota."""
+    def esperar(execute, sql, params, many, context):
+        time.sleep(segundos)
+        return execute(sql, params, many, context)
+    return esperar
+
+
+def _wsgi_en_un_hilo(rutas, cookie, clientes, peticiones):
+    """
+    ``clientes`` hilos sondean contra la aplicación WSGI, pero un solo worker
+    síncrono (un lock) atiende las peticiones de una en una, como gunicorn sync.
+    """
+    from django.core.wsgi import get_wsgi_application
+
+    app = get_wsgi_application()
+    worker = threading.Lock()
+    latencias, errores = [], []
+
+    def peticion(ruta):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': ruta, 'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost', 'HTTP_COOKIE': cookie,
+            'wsgi.input': io.BytesIO(b''), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        estado = []
+        with worker:
+            respuesta = app(environ, lambda status, headers: estado.append(status))
+            try:
+                b''.join(respuesta)
+            finally:
+                respuesta.close()  # request_finished: cierra la conexión del hilo
+        return estado[0].startswith('200')
+
+    def sondear(n):
+        for i in range(n):
+            inicio = time.perf_counter()
+            ok = peticion(rutas[i % len(rutas)])
+            latencias.append(time.perf_counter() - inicio)
+            if not ok:
+                errores.append(1)
+
+    reparto = [peticiones // clientes + (1 if i < peticiones % clientes else 0) for i in range(clientes)]
+    hilos = [threading.Thread(target=sondear, args=(n,)) for n in reparto]
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return time.perf_counter() - inicio, latencias, len(errores)
+
+
+def _asgi_en_un_bucle(rutas, cookie, clientes, peticiones):
+    """``clientes`` corrutinas sondean contra project_memory.asgi en un único bucle de eventos."""
+    from django.core.asgi import get_asgi_application
+
+    app = get_asgi_application()
+    latencias, errores = [], []
+
+    async def peticion(ruta):
+        cuerpo_enviado = asyncio.Event()
+        estado = []
+
+        async def receive():
+            if not cuerpo_enviado.is_set():
+                cuerpo_enviado.set()
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Future()  # el cliente no se desconecta: Django cancela la espera
+
+        async def send(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                estado.append(mensaje['status'])
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': ruta, 'raw_path': ruta.encode(),
+            'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        await app(scope, receive, send)
+        return estado[0] == 200
+
+    async def sondear(n):
+        for i in range(n):
+            inicio = time.perf_counter()
+            ok = await peticion(rutas[i % len(rutas)])
+            latencias.append(time.perf_counter() - inicio)
+            if not ok:
+                errores.append(1)
+
+    async def principal():
+        reparto = [peticiones // clientes + (1 if i < peticiones % clientes else 0) for i in range(clientes)]
+        await asyncio.gather(*(sondear(n) for n in reparto))
+
+    inicio = time.perf_counter()
+    asyncio.run(principal())
+    return time.perf_counter() - inicio, latencias, len(errores)
+
+
+def medir_lecturas(clientes, peticiones=600, latencia_bd_ms=0):
+    """
+    ``clientes`` sondeos concurrentes de estado, estadísticas JSON y página de
+    estadísticas: vistas síncronas con un worker WSGI frente a vistas async en un
+    worker ASGI. ``latencia_bd_ms`` añade un retardo por consulta (base remota).
+    """
+    resultados = {}
+    envoltura = _latencia_bd(latencia_bd_ms / 1000) if latencia_bd_ms else None
+
+    def instalar(sender, connection, **kwargs):
+        # Se dispara en cada reconexión del mismo DatabaseWrapper: instalar una vez
+        if envoltura not in connection.execute_wrappers:
+            connection.execute_wrappers.append(envoltura)
+
+    if envoltura:
+        connection_created.connect(instalar)
+    try:
+        for nombre, asincronas, medir in (('wsgi', False, _wsgi_en_un_hilo), ('asgi', True, _asgi_en_un_bucle)):
+            rutas, cookie = _rutas_lectura(asincronas)
+            connections.close_all()
+            medir(rutas, cookie, 1, len(rutas))  # calentamiento
+            segundos, latencias, errores = medir(rutas, cookie, clientes, peticiones)
+            latencias.sort()
+            resultados[nombre] = {
+                'peticiones_por_s': round(len(latencias) / segundos, 1),
+                'ms_p50': round(1000 * latencias[len(latencias) // 2], 2),
+                'ms_p99': round(1000 * latencias[min(len(latencias) - 1, int(0.99 * len(latencias)))], 2),
+                'errores': errores,
+            }
+    finally:
+        if envoltura:
+            connection_created.disconnect(instalar)
+        connections.close_all()
+    return resultados
@@ -0,0 +1,170 @@
+# memory_game/services/tablero.py
+"""
+Núcleo del juego sin ORM: reglas de revelar, ocultar y abandonar sobre un
+tablero en memoria. No importa Django; la persistencia vive en game_engine.
+"""
+import random
+from array import array
+
+# Estado de cada casilla (un byte por carta)
+OCULTA = 0
+REVELADA = 1
+EMPAREJADA = 2
+
+# Tipos de evento
+EV_REVELADA = 'revelada'        # primera carta del par
+EV_PAR = 'par'                  # segunda carta: hizo pareja
+EV_FALLO = 'fallo'              # segunda carta: no hizo pareja
+EV_VICTORIA = 'victoria'
+EV_OCULTADAS = 'ocultadas'
+EV_FIN = 'fin'                  # derrota o abandono
+EV_IGNORADA = 'ignorada'        # carta ya revelada o emparejada
+EV_RECHAZADA = 'rechazada'      # posición inválida o partida terminada
+
+# Motivos de fin (mismos valores que Partida.MOTIVO_*)
+MOTIVO_VICTORIA = 'victoria'
+MOTIVO_DERROTA = 'derrota'
+
+
+class Evento:
+    __slots__ = ('tipo', 'posiciones', 'mensaje')
+
+    def __init__(self, tipo, posiciones=(), mensaje=None):
+        self.tipo = tipo
+        self.posiciones = tuple(posiciones)
+        self.mensaje = mensaje
+
+    def __eq__(self, otro):
+        return (
+            isinstance(otro, Evento)
+            and (self.tipo, self.posiciones, self.mensaje) == (otro.tipo, otro.posiciones, otro.mensaje)
+        )
+
+    def __repr__(self):
+        return f"Evento({self.tipo!r}, {self.posiciones!r})"
+
+
+# -------------------------------
+# TABLERO
+# -------------------------------
+
+class Tablero:
+    """
+    Valores internados como códigos enteros (array) y estados en un bytearray:
+    unos pocos bytes por carta. ``pendiente`` es la posición de la primera carta
+    del par en curso, o None.
+
+    Con ``Tablero.parcial`` solo se cargan algunas casillas (dicts en lugar de
+    arrays): basta con la carta jugada y la pendiente para aplicar las reglas.
+    """
+
+    __slots__ = (
+        'etiquetas', 'codigos', 'estados', 'total', 'pares', 'pendiente',
+        'movimientos', 'aciertos', 'activa', 'ganada', 'motivo_fin',
+    )
+
+    def __init__(self, valores, pares=None, estados=None, pendiente=None,
+                 movimientos=0, aciertos=0, activa=True, ganada=False, motivo_fin=None):
+        indice = {}
+        self.etiquetas = []
+        for v in valores:
+            if v not in indice:
+                indice[v] = len(self.etiquetas)
+                self.etiquetas.append(v)
+        self.codigos = array('H' if len(self.etiquetas) <= 0xFFFF else 'I', (indice[v] for v in valores))
+        self.estados = bytearray(estados) if estados is not None else bytearray(len(self.codigos))
+        self.total = len(self.codigos)
+        self.pares = pares if pares is not None else self.total // 2
+        self.pendiente = pendiente
+        self.movimientos = movimientos
+        self.aciertos = aciertos
+        self.activa = activa
+        self.ganada = ganada
+        self.motivo_fin = motivo_fin
+
+    @classmethod
+    def nuevo(cls, pares, rng=random):
+        """Tablero barajado con ``pares`` parejas: valores 'card_0', 'card_1', ..."""
+        valores = [f"card_{i}" for i in range(pares)] * 2
+        rng.shuffle(valores)
+        return cls(valores, pares=pares)
+
+    @classmethod
+    def parcial(cls, pares, casillas, **estado):
+        """
+        Tablero de ``pares * 2`` cartas del que solo se conocen ``casillas``
+        ({posicion: (valor, estado)}). Leer otra posición lanza KeyError.
+        """
+        tablero = cls((), pares=pares, **estado)
+        indice = {}
+        tablero.codigos, tablero.estados = {}, {}
+        for pos, (valor, estado_casilla) in casillas.items():
+            if valor not in indice:
+                indice[valor] = len(tablero.etiquetas)
+                tablero.etiquetas.append(valor)
+            tablero.codigos[pos] = indice[valor]
+            tablero.estados[pos] = estado_casilla
+        tablero.total = pares * 2
+        return tablero
+
+    def __len__(self):
+        return self.total
+
+    def valor(self, pos):
+        return self.etiquetas[self.codigos[pos]]
+
+    def visible(self, pos):
+        return self.estados[pos] != OCULTA
+
+    # -------------------------------
+    # TRANSICIONES
+    # -------------------------------
+
+    def revelar(self, pos):
+        if not self.activa:
+            return [Evento(EV_RECHAZADA, mensaje='Partida finalizada')]
+        if not 0 <= pos < self.total:
+            return [Evento(EV_RECHAZADA, mensaje='Posición inválida')]
+        if self.estados[pos] == EMPAREJADA:
+            return [Evento(EV_IGNORADA, (pos,), 'Carta ya emparejada')]
+        if self.estados[pos] == REVELADA:
+            return [Evento(EV_IGNORADA, (pos,), 'Carta ya revelada')]
+
+        self.estados[pos] = REVELADA
+        otra = self.pendiente
+        if otra is None:
+            self.pendiente = pos
+            return [Evento(EV_REVELADA, (pos,))]
+
+        self.pendiente = None
+        self.movimientos += 1
+        if self.codigos[otra] != self.codigos[pos]:
+            return [Evento(EV_FALLO, (otra, pos))]
+
+        self.estados[otra] = self.estados[pos] = EMPAREJADA
+        self.aciertos += 1
+        eventos = [Evento(EV_PAR, (otra, pos))]
+        if self.aciertos >= self.pares:
+            self.activa = False
+            self.ganada = True
+            self.motivo_fin = MOTIVO_VICTORIA
+            eventos.append(Evento(EV_VICTORIA))
+        return eventos
+
+    def ocultar(self, *posiciones):
+        """Oculta las cartas reveladas sin pareja (nunca la pendiente de la jugada en curso)."""
+        ocultadas = []
+        for pos in sorted(set(posiciones)):
+            if 0 <= pos < self.total and self.estados[pos] == REVELADA and pos != self.pendiente:
+                self.estados[pos] = OCULTA
+                ocultadas.append(pos)
+        return [Evento(EV_OCULTADAS, ocultadas)] if ocultadas else []
+
+    def abandonar(self, motivo=MOTIVO_DERROTA):
+        if not self.activa:
+            return [Evento(EV_RECHAZADA, mensaje='Partida inválida o ya finalizada')]
+        self.activa = False
+        self.ganada = False
+        self.pendiente = None
+        self.motivo_fin = motivo
+        return [Evento(EV_FIN, mensaje=motivo)]
@@ -0,0 +1,280 @@
+# memory_game/services/temporizadores.py
+"""
+Vencimiento de partidas en el servidor: una partida individual con ``fecha_limite``
+pasada se da por perdida (forfeit_game) aunque el navegador se haya cerrado.
+
+Dos formas de ejecutarlo (``manage.py vencer_partidas``):
+- ``vencer_partidas()``: una pasada que busca las vencidas con el índice parcial
+  ``partida_activa_limite`` (para cron);
+- ``Temporizador``: proceso continuo con las partidas activas en un montículo en
+  memoria, alimentado de forma incremental por ``ultima_actualizacion``; cada
+  vencimiento cuesta O(log n) y duerme hasta el próximo.
+"""
+import heapq
+import json
+import logging
+import random
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..db_routers import shard_de_partida, shards
+from ..models import Partida
+from .game_engine import forfeit_game
+
+logger = logging.getLogger('memory_game.temporizadores')
+
+# Partidas por transacción al darlas por perdidas
+TAMANO_LOTE = 500
+
+# La sincronización relee este margen hacia atrás: un UPDATE que confirma tarde puede
+# traer un ultima_actualizacion anterior a la marca ya leída
+SOLAPAMIENTO = timedelta(seconds=5)
+
+
+# -------------------------------
+# COLA DE VENCIMIENTOS
+# -------------------------------
+
+class ColaVencimientos:
+    """
+    Cola de prioridad (montículo binario) de {clave: vencimiento}. Programar y sacar
+    cuestan O(log n). Reprogramar o cancelar no buscan en el montículo: la entrada
+    vieja se descarta al salir (borrado perezoso) y, si las descartadas llegan a
+    superar a las vigentes, se reconstruye en O(n).
+    """
+
+    def __init__(self):
+        self._monticulo = []    # (vencimiento, clave), incluidas entradas obsoletas
+        self._vigentes = {}     # clave -> vencimiento actual
+
+    def __len__(self):
+        return len(self._vigentes)
+
+    def __contains__(self, clave):
+        return clave in self._vigentes
+
+    def programar(self, clave, vencimiento):
+        if self._vigentes.get(clave) == vencimiento:
+            return
+        self._vigentes[clave] = vencimiento
+        heapq.heappush(self._monticulo, (vencimiento, clave))
+        self._compactar()
+
+    def cancelar(self, clave):
+        if self._vigentes.pop(clave, None) is not None:
+            self._compactar()
+
+    def proximo(self):
+        """Vencimiento más cercano, o None si la cola está vacía."""
+        while self._monticulo:
+            vencimiento, clave = self._monticulo[0]
+            if self._vigentes.get(clave) == vencimiento:
+                return vencimiento
+            heapq.heappop(self._monticulo)
+        return None
+
+    def vencidas(self, ahora, maximo=None):
+        """Saca las claves con vencimiento <= ``ahora`` (como mucho ``maximo``), de la más antigua a la más nueva."""
+        claves = []
+        while self._monticulo and (maximo is None or len(claves) < maximo):
+            vencimiento, clave = self._monticulo[0]
+            if vencimiento > ahora:
+                break
+            heapq.heappop(self._monticulo)
+            if self._vigentes.get(clave) == vencimiento:
+                del self._vigentes[clave]
+                claves.append(clave)
+        return claves
+
+    def _compactar(self):
+        if len(self._monticulo) > 2 * len(self._vigentes) + 64:
+            self._monticulo = [(v, c) for c, v in self._vigentes.items()]
+            heapq.heapify(self._monticulo)
+
+
+# -------------------------------
+# DAR POR PERDIDAS EN LOTES
+# -------------------------------
+
+def perder_por_tiempo(partida_ids, ahora=None):
+    """
+    Da por perdidas (forfeit_game) las partidas de ``partida_ids`` que sigan activas y
+    vencidas a ``ahora``: una transacción por shard, y usuario y nivel de todo el lote
+    en una consulta cada uno. Devuelve cuántas se dieron por perdidas.
+    """
+    ahora = ahora or timezone.now()
+    grupos = {}
+    for pk in partida_ids:
+        grupos.setdefault(shard_de_partida(pk), []).append(pk)
+    grupos.pop(None, None)
+
+    perdidas = 0
+    for db, ids in grupos.items():
+        with transaction.atomic(using=db):
+            lote = (
+                Partida.objects.using(db)
+                .filter(pk__in=ids, activa=True, fecha_limite__lte=ahora)
+                .prefetch_related('usuario', 'nivel')
+            )
+            for partida in lote:
+                try:
+                    forfeit_game(partida)
+                except Exception:
+                    # Una partida rota no debe impedir vencer el resto del lote
+                    logger.exception("No se pudo dar por perdida la partida %s", partida.pk)
+                    continue
+                perdidas += not partida.activa
+    return perdidas
+
+
+def vencer_partidas(ahora=None, tamano_lote=TAMANO_LOTE):
+    """
+    Una pasada: da por perdidas todas las partidas activas vencidas a ``ahora``. Devuelve
+    cuántas. Los lotes avanzan por (fecha_limite, pk): una partida que no se pudo dar por
+    perdida sigue activa, pero no se vuelve a leer en esta pasada.
+    """
+    ahora = ahora or timezone.now()
+    perdidas = 0
+    for alias in shards():
+        vencidas = (
+            Partida.objects.using(alias)
+            .filter(activa=True, fecha_limite__isnull=False, fecha_limite__lte=ahora)
+            .order_by('fecha_limite', 'pk')
+            .values_list('fecha_limite', 'pk')
+        )
+        lote = vencidas
+        while True:
+            filas = list(lote[:tamano_lote])
+            if not filas:
+                break
+            perdidas += perder_por_tiempo([pk for _, pk in filas], ahora)
+            limite, pk = filas[-1]
+            lote = vencidas.filter(Q(fecha_limite__gt=limite) | Q(fecha_limite=limite, pk__gt=pk))
+    return perdidas
+
+
+# -------------------------------
+# PROCESO CONTINUO
+# -------------------------------
+
+class Temporizador:
+    """
+    Mantiene en una ColaVencimientos las partidas activas con fecha límite de todos
+    los shards. La primera sincronización carga las activas; las siguientes leen
+    solo las modificadas desde la última (``ultima_actualizacion``, con SOLAPAMIENTO):
+    las activas se (re)programan y las terminadas salen de la cola.
+    """
+
+    def __init__(self, tamano_lote=TAMANO_LOTE):
+        self.cola = ColaVencimientos()
+        self.tamano_lote = tamano_lote
+        self._leido_hasta = {}    # alias -> mayor ultima_actualizacion leída
+
+    def sincronizar(self):
+        """Lee los cambios de cada shard. Devuelve cuántas filas leyó."""
+        leidas = 0
+        for alias in shards():
+            marca = self._leido_hasta.get(alias)
+            inicio = timezone.now()
+            cambios = Partida.objects.using(alias).filter(fecha_limite__isnull=False)
+            if marca is None:
+                cambios = cambios.filter(activa=True)
+            else:
+                cambios = cambios.filter(ultima_actualizacion__gt=marca - SOLAPAMIENTO)
+            filas = cambios.values_list('pk', 'activa', 'fecha_limite', 'ultima_actualizacion')
+            for pk, activa, fecha_limite, actualizada in filas.iterator(chunk_size=5000):
+                if activa:
+                    self.cola.programar(pk, fecha_limite.timestamp())
+                else:
+                    self.cola.cancelar(pk)
+                if actualizada and (marca is None or actualizada > marca):
+                    marca = actualizada
+                leidas += 1
+            self._leido_hasta[alias] = marca or inicio
+        return leidas
+
+    def expirar(self, ahora=None):
+        """Da por perdidas las partidas vencidas de la cola, en lotes. Devuelve cuántas."""
+        ahora = ahora or timezone.now()
+        perdidas = 0
+        while True:
+            ids = self.cola.vencidas(ahora.timestamp(), self.tamano_lote)
+            if not ids:
+                break
+            perdidas += perder_por_tiempo(ids, ahora)
+        return perdidas
+
+    def paso(self):
+        inicio = time.perf_counter()
+        leidas = self.sincronizar()
+        perdidas = self.expirar()
+        if perdidas:
+            logger.info(json.dumps({
+                'evento': 'vencimientos',
+                'perdidas': perdidas,
+                'leidas': leidas,
+                'en_cola': len(self.cola),
+                'ms': round(1000 * (time.perf_counter() - inicio), 2),
+            }))
+        return perdidas
+
+    def ejecutar(self, intervalo=1.0, detener=None):
+        """
+        Bucle principal: sincroniza, vence y duerme hasta el próximo vencimiento o
+        ``intervalo`` segundos (para ver partidas nuevas), lo que llegue antes.
+        ``detener()`` que devuelva True termina el bucle.
+        """
+        while not (detener and detener()):
+            self.paso()
+            proximo = self.cola.proximo()
+            espera = intervalo if proximo is None else min(intervalo, proximo - time.time())
+            time.sleep(max(0.0, espera))
+
+
+# -------------------------------
+# MEDICIÓN DE LA COLA
+# -------------------------------
+
+def medir_cola(partidas=100_000, reprogramadas=0.2, semilla=0):
+    """
+    Coste de la ColaVencimientos sin base de datos: programa ``partidas`` vencimientos
+    repartidos en una hora, reprograma o cancela una fracción y las vence todas.
+    Devuelve microsegundos por operación.
+    """
+    azar = random.Random(semilla)
+    cola = ColaVencimientos()
+    limites = [azar.uniform(0, 3600) for _ in range(partidas)]
+
+    inicio = time.perf_counter()
+    for pk, limite in enumerate(limites):
+        cola.programar(pk, limite)
+    programar = time.perf_counter() - inicio
+
+    cambios = azar.sample(range(partidas), int(partidas * reprogramadas))
+    inicio = time.perf_counter()
+    for i, pk in enumerate(cambios):
+        if i % 2:
+            cola.cancelar(pk)
+        else:
+            cola.programar(pk, limites[pk] + 60)
+    reprogramar = time.perf_counter() - inicio
+
+    pendientes = len(cola)
+    inicio = time.perf_counter()
+    vencidas = 0
+    for segundo in range(0, 3700, 10):
+        vencidas += len(cola.vencidas(segundo))
+    vencer = time.perf_counter() - inicio
+
+    return {
+        'partidas': partidas,
+        'us_programar': round(1e6 * programar / max(partidas, 1), 3),
+        'us_reprogramar': round(1e6 * reprogramar / max(len(cambios), 1), 3),
+        'us_vencer': round(1e6 * vencer / max(vencidas, 1), 3),
+        'vencidas': vencidas,
+        'pendientes': pendientes,
+    }
@@ -0,0 +1,223 @@
+# memory_game/services/throttle.py
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.http import HttpResponse, JsonResponse
+
+# -------------------------------
+# TOKEN BUCKET (RESPALDADO EN CACHÉ)
+# -------------------------------
+
+# Recarga y consumo en un solo paso atómico en Redis; la hora es la del servidor
+# Redis, así que los relojes de los workers no influyen
+_LUA_BUCKET = """
+local capacidad, ritmo = tonumber(ARGV[1]), tonumber(ARGV[2])
+local pedidos, ttl = tonumber(ARGV[3]), tonumber(ARGV[4])
+local reloj = redis.call('TIME')
+local ahora = tonumber(reloj[1]) + tonumber(reloj[2]) / 1000000
+local estado = redis.call('HMGET', KEYS[1], 's', 't')
+local saldo = tonumber(estado[1]) or capacidad
+local ultimo = tonumber(estado[2]) or ahora
+saldo = math.min(capacidad, saldo + math.max(0, ahora - ultimo) * ritmo)
+local permitido = 0
+if saldo >= pedidos then
+    saldo = saldo - pedidos
+    permitido = 1
+end
+redis.call('HSET', KEYS[1], 's', tostring(saldo), 't', tostring(ahora))
+redis.call('EXPIRE', KEYS[1], ttl)
+return {permitido, tostring(saldo)}
+"""
+
+
+class TokenBucket:
+    """
+    Token bucket por clave guardado en la caché de Django.
+    - Con RedisCache la recarga y el consumo son un script Lua: atómicos entre todos
+      los workers y el límite es global.
+    - Con cualquier otra caché se lee y se escribe bajo un lock del proceso. Con la
+      LocMem por defecto (una caché por proceso) es exacto, pero el límite es por
+      worker; con una caché compartida sin scripts (Memcached, BD) dos workers
+      pueden leer el mismo saldo y el límite es solo aproximado.
+    """
+
+    def __init__(self, rate, capacity, cache_alias='default', prefix='tb'):
+        self.rate = float(rate)          # tokens por segundo
+        self.capacity = float(capacity)  # ráfaga máxima
+        self.cache_alias = cache_alias
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._script = None
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @property
+    def timeout(self):
+        # El bucket caduca cuando ya estaría lleno de nuevo
+        return max(1, int(self.capacity / self.rate) + 1)
+
+    def consume(self, key, tokens=1):
+        """Intenta consumir ``tokens``. Devuelve (permitido, segundos_hasta_reintentar)."""
+        cache_key = f"{self.prefix}:{key}"
+        if isinstance(self.cache, RedisCache):
+            permitido, saldo = self._consume_redis(cache_key, tokens)
+        else:
+            permitido, saldo = self._consume_local(cache_key, tokens)
+
+        if permitido:
+            return True, 0
+        return False, (tokens - saldo) / self.rate
+
+    def _consume_redis(self, cache_key, tokens):
+        cache = self.cache
+        key = cache.make_and_validate_key(cache_key)
+        client = cache._cache.get_client(key, write=True)
+        if self._script is None:
+            self._script = client.register_script(_LUA_BUCKET)
+        permitido, saldo = self._script(
+            keys=[key], args=[self.capacity, self.rate, tokens, self.timeout], client=client,
+        )
+        return bool(permitido), float(saldo)
+
+    def _consume_local(self, cache_key, tokens):
+        now = time.time()
+        with self._lock:
+            saldo, ultimo = self.cache.get(cache_key, (self.capacity, now))
+            saldo = min(self.capacity, saldo + max(0.0, now - ultimo) * self.rate)
+            permitido = saldo >= tokens
+            if permitido:
+                saldo -= tokens
+            self.cache.set(cache_key, (saldo, now), self.timeout)
+        return permitido, saldo
+
+
+# -------------------------------
+# COALESCING DE PETICIONES EN VUELO
+# -------------------------------
+
+class _Llamada:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas idénticas concurrentes: la primera ejecuta la función y las
+    demás esperan y reciben el mismo resultado (sin volver a tocar la BD).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+
+    def do(self, key, fn):
+        """Ejecuta ``fn`` una sola vez por ``key`` en vuelo. Devuelve (resultado, compartido)."""
+        with self._lock:
+            llamada = self._en_vuelo.get(key)
+            lider = llamada is None
+            if lider:
+                llamada = self._en_vuelo[key] = _Llamada()
+
+        if not lider:
+            llamada.evento.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado, True
+
+        try:
+            llamada.resultado = fn()
+        except Exception as exc:
+            llamada.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._en_vuelo[key]
+            llamada.evento.set()
+        return llamada.resultado, False
+
+
+_move_bucket = None
+_reveals_en_vuelo = SingleFlight()
+
+
+def get_move_bucket():
+    """Bucket compartido de los endpoints de jugadas (configurable en settings)."""
+    global _move_bucket
+    if _move_bucket is None:
+        _move_bucket = TokenBucket(
+            rate=getattr(settings, 'MOVE_THROTTLE_RATE', 5),
+            capacity=getattr(settings, 'MOVE_THROTTLE_BURST', 10),
+            cache_alias=getattr(settings, 'MOVE_THROTTLE_CACHE', 'default'),
+            prefix='jugadas',
+        )
+    return _move_bucket
+
+
+def _client_key(request):
+    """Identifica al jugador: usuario autenticado, si no la sesión o la IP."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"u{user.pk}"
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return f"s{session.session_key}"
+    return f"ip{request.META.get('REMOTE_ADDR', '')}"
+
+
+# -------------------------------
+# DECORADORES PARA LAS VISTAS
+# -------------------------------
+
+def throttle_moves(view):
+    """Limita las jugadas por jugador con un token bucket; responde 429 al exceder."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if getattr(settings, 'MOVE_THROTTLE_ENABLED', True):
+            permitido, reintentar = get_move_bucket().consume(_client_key(request))
+            if not permitido:
+                response = JsonResponse(
+                    {'status': 'error', 'message': 'Demasiadas jugadas, espera un momento'},
+                    status=429,
+                )
+                response['Retry-After'] = str(max(1, round(reintentar)))
+                return response
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def coalesce_reveals(view):
+    """
+    Agrupa revelados idénticos en vuelo (mismo jugador y misma posición) en una
+    sola ejecución de la vista; los seguidores reciben una copia de la respuesta.
+    """
+    @wraps(view)
+    def wrapper(request, pos, *args, **kwargs):
+        # El formato negociado forma parte de la clave: solo se comparte la misma respuesta
+        key = (
+            view.__module__, view.__name__, _client_key(request), pos,
+            request.GET.get('formato'), request.headers.get('Accept'), request.headers.get('Accept-Encoding'),
+        )
+        response, compartido = _reveals_en_vuelo.do(
+            key, lambda: view(request, pos, *args, **kwargs)
+        )
+        if not compartido:
+            return response
+        copia = HttpResponse(
+            response.content,
+            status=response.status_code,
+            content_type=response.get('Content-Type'),
+        )
+        for cabecera in ('Content-Encoding', 'Vary'):
+            if cabecera in response:
+                copia[cabecera] = response[cabecera]
+        copia['X-Coalesced'] = '1'
+        return copia
+    return wrapper
@@ -0,0 +1,127 @@
+# memory_game/services/torneos.py
+import random
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from ..db_routers import agrupar_por_shard
+from ..models import Carta, Partida, RondaTorneo
+from .game_engine import _get_card_pairs_from_level
+from .tablero import Tablero
+
+# Jugadores por transacción: cada lote se confirma por separado, así una ronda
+# enorme no mantiene abierta una única transacción con cientos de miles de filas
+TAMANO_LOTE = 1000
+
+# Filas de Carta por INSERT multi-fila
+TAMANO_INSERT_CARTAS = 5000
+
+# Jugadores como máximo al provisionar desde una petición web (un lote): las
+# rondas mayores se provisionan con ``manage.py provisionar_ronda``
+MAX_JUGADORES_WEB = TAMANO_LOTE
+
+
+# -------------------------------
+# PROVISIÓN EN BLOQUE
+# -------------------------------
+
+def disposicion_barajada(pares, semilla=None):
+    """Valores por posición de un tablero barajado (el mismo para toda la ronda)."""
+    tablero = Tablero.nuevo(pares, random.Random(semilla))
+    return [tablero.valor(pos) for pos in range(len(tablero))]
+
+
+def _provisionar_lote(ronda, usuario_ids, ahora):
+    """Un lote por shard: cada shard recibe sus jugadores en su propia transacción."""
+    hechos = 0
+    for db, ids in agrupar_por_shard(usuario_ids).items():
+        with transaction.atomic(using=db):
+            hechos += _provisionar_en_shard(db, ronda, ids, ahora)
+    return hechos
+
+
+def _provisionar_en_shard(db, ronda, usuario_ids, ahora):
+    # Una sola sentencia cierra las partidas individuales abiertas de todo el lote
+    Partida.objects.using(db).filter(usuario_id__in=usuario_ids, activa=True, sala__isnull=True).update(
+        activa=False, fecha_fin=ahora, ganada=False,
+        motivo_fin=Partida.MOTIVO_ABANDONO, ultima_actualizacion=ahora,
+    )
+
+    partidas = Partida.objects.using(db).bulk_create([
+        Partida(
+            usuario_id=usuario_id,
+            nivel_id=ronda.nivel_id,
+            ronda=ronda,
+            activa=True,
+            pares=len(ronda.disposicion) // 2,
+        )
+        for usuario_id in usuario_ids
+    ])
+
+    if _usa_unnest(db):
+        _insertar_cartas_postgres(db, ronda, [p.pk for p in partidas])
+        return len(partidas)
+
+    # Resto de motores: las cartas de todas las partidas del lote en INSERT multi-fila
+    Carta.objects.using(db).bulk_create(
+        (
+            Carta(
+                partida_id=partida.pk,
+                nivel_id=ronda.nivel_id,
+                posicion=pos,
+                valor=valor,
+                simbolo=valor,
+            )
+            for partida in partidas
+            for pos, valor in enumerate(ronda.disposicion)
+        ),
+        batch_size=TAMANO_INSERT_CARTAS,
+    )
+    return len(partidas)
+
+
+def _usa_unnest(db):
+    return connections[db].vendor == 'postgresql'
+
+
+def _insertar_cartas_postgres(db, ronda, partida_ids):
+    """
+    INSERT ... SELECT: Postgres genera las lote × cartas filas a partir de tres
+    arrays (ids de partida, posiciones y valores), sin instanciar ningún modelo.
+    """
+    with connections[db].cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {Carta._meta.db_table}
+                (partida_id, nivel_id, posicion, valor, simbolo, revelada, emparejada)
+            SELECT p.id, %s, l.posicion, l.valor, l.valor, FALSE, FALSE
+            FROM unnest(%s::bigint[]) AS p(id)
+            CROSS JOIN unnest(%s::int[], %s::text[]) AS l(posicion, valor)
+            """,
+            [ronda.nivel_id, partida_ids, list(range(len(ronda.disposicion))), ronda.disposicion],
+        )
+
+
+def provisionar_ronda(usuario_ids, nivel, nombre='', semilla=None, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Crea una partida por jugador para una ronda de torneo, todas con la misma
+    disposición barajada. Por lote de ``tamano_lote`` jugadores y shard: un UPDATE
+    cierra sus partidas previas y dos INSERT multi-fila crean partidas y cartas.
+    ``progreso(hechos, total)`` se llama tras confirmar cada lote.
+    """
+    usuario_ids = list(dict.fromkeys(usuario_ids))  # sin duplicados, en orden
+    ronda = RondaTorneo.objects.create(
+        nombre=nombre or f"Ronda {timezone.now():%Y-%m-%d %H:%M}",
+        nivel=nivel,
+        disposicion=disposicion_barajada(_get_card_pairs_from_level(nivel), semilla),
+    )
+
+    hechos = 0
+    for i in range(0, len(usuario_ids), tamano_lote):
+        hechos += _provisionar_lote(ronda, usuario_ids[i:i + tamano_lote], timezone.now())
+        if progreso:
+            progreso(hechos, len(usuario_ids))
+
+    ronda.jugadores = hechos
+    ronda.save(update_fields=['jugadores'])
+    return ronda
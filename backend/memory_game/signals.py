@@ -0,0 +1,83 @@
+# memory_game/signals.py
+import logging
+
+from django.core.cache import cache
+from django.conf import settings
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from .db_routers import hay_shards, reservar_rango_ids, shard_de_usuario, shards
+from .models import Carta, Nivel
+
+logger = logging.getLogger('memory_game.atlas')
+
+
+# -------------------------------
+# INVALIDAR FRAGMENTOS CACHEADOS DEL TABLERO
+# -------------------------------
+
+@receiver([post_save, post_delete], sender=Nivel)
+def invalidar_cache_niveles(sender, instance, **kwargs):
+    """
+    Borra el menú de niveles y la cabecera del tablero cuando cambia un nivel. Solo
+    llega a todos los workers con una caché compartida (CACHE_REDIS_URL); con LocMem
+    los demás procesos esperan a que caduque el fragmento (CACHE_FRAGMENTOS_S).
+    """
+    cache.delete_many([
+        make_template_fragment_key('menu_niveles'),
+        make_template_fragment_key('tablero_chrome', [instance.pk]),
+    ])
+
+
+# -------------------------------
+# ATLAS DE SPRITES
+# -------------------------------
+
+@receiver([post_save, post_delete], sender=Carta)
+def regenerar_atlas(sender, instance, using, **kwargs):
+    """
+    Al cambiar una carta de catálogo se regenera el atlas de su nivel (y su manifiesto)
+    tras confirmar la transacción: la vista del tablero solo lo lee. Las cartas de
+    partida no cuentan.
+    """
+    if instance.partida_id is not None:
+        return
+    nivel_id = instance.nivel_id
+
+    def regenerar():
+        from .services.atlas import generar_nivel
+
+        nivel = Nivel.objects.filter(pk=nivel_id).first()
+        if nivel is None:
+            return
+        try:
+            generar_nivel(nivel)
+        except Exception:
+            # Una imagen ilegible no debe romper el guardado: generar_atlas lo reintenta
+            logger.exception("No se pudo generar el atlas del nivel %s", nivel_id)
+
+    transaction.on_commit(regenerar, using=using)
+
+
+# -------------------------------
+# SHARDS DE PARTIDAS
+# -------------------------------
+
+@receiver(post_migrate)
+def reservar_ids_del_shard(sender, using, **kwargs):
+    """Tras migrar un shard, sus secuencias empiezan en su rango de ids (db_routers.BITS_SHARD)."""
+    if sender.name == 'memory_game' and using in shards():
+        reservar_rango_ids(using)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def borrar_partidas_del_shard(sender, instance, using, **kwargs):
+    """
+    El borrado en cascada del usuario solo recorre la base donde se borra ('default'):
+    sus partidas (con cartas) e intentos en otro shard se borran aquí.
+    """
+    if hay_shards() and shard_de_usuario(instance.pk) != using:
+        instance.intento_set.all().delete()
+        instance.partida_set.all().delete()
@@ -0,0 +1,114 @@
+# memory_game/storage.py
+import gzip
+import os
+import shutil
+import subprocess
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: solo se usa en la etapa de build
+    brotli = None
+
+
+# -------------------------------
+# CONFIGURACIÓN DE COMPRESIÓN
+# -------------------------------
+
+# Extensiones de texto que se pre-comprimen (.gz / .br) para nginx
+TEXT_EXTENSIONS = ('.css', '.js', '.html', '.svg', '.json', '.txt', '.map')
+
+# No vale la pena comprimir archivos muy pequeños
+MIN_COMPRESS_SIZE = 256
+
+# Variantes de audio generadas a partir de los .wav (extensión -> argumentos ffmpeg)
+AUDIO_VARIANTS = {
+    '.ogg': ['-c:a', 'libopus', '-b:a', '64k'],
+    '.mp3': ['-c:a', 'libmp3lame', '-b:a', '96k'],
+}
+AUDIO_SOURCE_EXTENSIONS = ('.wav',)
+
+
+def audio_variant_names(name):
+    """Devuelve los nombres de las variantes comprimidas de un sonido (en orden de preferencia)."""
+    base, ext = os.path.splitext(name)
+    if ext.lower() not in AUDIO_SOURCE_EXTENSIONS:
+        return []
+    return [base + variant for variant in AUDIO_VARIANTS]
+
+
+# -------------------------------
+# STORAGE: MANIFEST + PRE-COMPRESIÓN
+# -------------------------------
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Storage de collectstatic que, además de los nombres con hash del manifest:
+      - transcodifica los .wav a variantes de audio comprimidas (si hay ffmpeg),
+      - escribe variantes .gz y .br de los assets de texto.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run=dry_run, **options)
+            return
+
+        # 1) Generar variantes de audio antes del hash para que entren en el manifest
+        paths = dict(paths)
+        for name in list(paths):
+            for variant in self._transcode_audio(name, paths[name]):
+                paths[variant] = (self, variant)
+
+        # 2) Hash + manifest
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+        # 3) Pre-comprimir originales y versiones con hash
+        for name, hashed_name in self.hashed_files.items():
+            for target in {name, hashed_name}:
+                if target.endswith(TEXT_EXTENSIONS):
+                    self._compress(target)
+
+    def _transcode_audio(self, name, source):
+        """Genera las variantes de audio de ``name`` y devuelve sus nombres."""
+        variants = audio_variant_names(name)
+        ffmpeg = shutil.which('ffmpeg')
+        if not variants or not ffmpeg:
+            return []
+
+        storage, path = source
+        src_path = storage.path(path)
+        generated = []
+        for variant in variants:
+            dest_path = self.path(variant)
+            args = AUDIO_VARIANTS[os.path.splitext(variant)[1]]
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            result = subprocess.run(
+                [ffmpeg, '-y', '-loglevel', 'error', '-i', src_path, '-vn', *args, dest_path],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            if result.returncode == 0:
+                generated.append(variant)
+        return generated
+
+    def _compress(self, name):
+        """Escribe ``name.gz`` (y ``name.br`` si brotli está disponible) junto al archivo."""
+        with self.open(name) as f:
+            content = f.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+
+        compressed = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed['.br'] = brotli.compress(content, quality=11)
+
+        for suffix, data in compressed.items():
+            # Solo guardar si realmente ahorra bytes
+            if len(data) >= len(content):
+                continue
+            target = name + suffix
+            if self.exists(target):
+                self.delete(target)
+            self._save(target, ContentFile(data))
@@ -0,0 +1,44 @@
+# memory_game/templatetags/static_assets.py
+import mimetypes
+import os
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from ..storage import audio_variant_names
+
+register = template.Library()
+
+AUDIO_MIME_TYPES = {
+    '.ogg': 'audio/ogg; codecs=opus',
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+}
+
+
+@lru_cache(maxsize=None)
+def _available_audio(name):
+    """Lista de (nombre, tipo) disponibles para un sonido: variantes comprimidas + original."""
+    names = [v for v in audio_variant_names(name) if staticfiles_storage.exists(v)]
+    names.append(name)
+    sources = []
+    for n in names:
+        ext = os.path.splitext(n)[1].lower()
+        sources.append((n, AUDIO_MIME_TYPES.get(ext) or mimetypes.guess_type(n)[0] or ''))
+    return tuple(sources)
+
+
+@register.simple_tag
+def audio_sources(name):
+    """
+    Genera las etiquetas <source> de un <audio>, prefiriendo las variantes
+    comprimidas generadas por collectstatic y usando el archivo original como respaldo.
+    """
+    return format_html_join(
+        '\n',
+        '<source src="{}" type="{}">',
+        ((static(n), mime) for n, mime in _available_audio(name)),
+    )
@@ -1,3 +1,1789 @@
-from django.test import TestCase
+import asyncio
+import contextvars
+import gzip
+import importlib
+import io
+import itertools
+import json
+import os
+import random
+import runpy
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.finders import FileSystemFinder
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import SystemCheckError
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import Count
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from .calentamiento import PASOS, PLANTILLAS, calentar
+from .checks import partidas_fuera_de_shard
+from .consultas_lentas import RegistroConsultas, normalizar_sql
+from .db_routers import (
+    BITS_SHARD,
+    ReplicaRouter,
+    _jump_hash,
+    agregar_en_shards,
+    hay_shards,
+    leer_de_replica,
+    para_partida,
+    para_usuario,
+    replica_alias,
+    shard_de_partida,
+    shard_de_usuario,
+)
+from .models import (
+    BosquejoNivel,
+    Carta,
+    Estadistica,
+    MarcaAgua,
+    Nivel,
+    Partida,
+    ResumenIntentos,
+    ResumenNivelDiario,
+    RondaTorneo,
+    Sala,
+)
+from .perfilado import Muestreador, PerfiladoMiddleware, guardar_perfil, leer_perfiles, rotar_perfiles
+from .services.analytics import (
+    MARCA_NIVELES,
+    SOLAPAMIENTO,
+    dashboard_niveles,
+    ranking_tiempos,
+    resumen_tiempos,
+    rollup_niveles,
+)
+from .services.atlas import atlas_para, generar_todos
+from .services.broker import Broker, get_broker
+from .services.duraciones import registrar_duracion, tiempo_a_ms
+from .services.estadisticas import CAMPOS_ESTADISTICA, reconstruir_estadisticas
+from .services.formato import (
+    _F_ACTIVA,
+    _F_INDICES_32,
+    _F_POSICIONES,
+    TIPO_BINARIO,
+    TIPO_COMPACTO,
+    TIPO_JSON,
+    codificar_binario,
+    compactar,
+    decodificar_binario,
+    expandir,
+    respuesta_estado,
+)
+from .services.game_engine import (
+    _get_card_pairs_from_level,
+    actualizar_estadisticas,
+    create_game,
+    forfeit_game,
+    hide_unmatched,
+    reveal_card,
+    serialize_game_state,
+)
+from .services.percentiles import (
+    ALFA,
+    BosquejoCuantiles,
+    percentiles_partida,
+    reconstruir_bosquejos,
+    registrar_partida,
+)
+from .services.retention import MARCA_INTENTOS, purgar_intentos, rollup_intentos
+from .services.salas import canal_sala, crear_sala
+from .services.simulador import (
+    PREFIJO_USUARIO,
+    Resultado,
+    crear_jugador,
+    limpiar_simulacion,
+    simular,
+    simular_en_memoria,
+)
+from .services.tablero import (
+    EMPAREJADA,
+    EV_FALLO,
+    EV_FIN,
+    EV_IGNORADA,
+    EV_OCULTADAS,
+    EV_PAR,
+    EV_RECHAZADA,
+    EV_REVELADA,
+    EV_VICTORIA,
+    OCULTA,
+    REVELADA,
+    Evento,
+    Tablero,
+)
+from .services.temporizadores import ColaVencimientos, Temporizador, vencer_partidas
+from .services.throttle import SingleFlight, TokenBucket
+from .services.torneos import disposicion_barajada, provisionar_ronda
+from .storage import brotli
+from .templatetags.static_assets import _available_audio
+
+
+# -------------------------------
+# PRUEBAS: ESTÁTICOS CON HASH Y PRE-COMPRIMIDOS
+# -------------------------------
+
+class EstaticosTests(TestCase):
+
+    def setUp(self):
+        self.fuente = tempfile.mkdtemp()
+        for nombre, contenido in [
+            ('css/estilo.css', b'.carta { color: red; }\n' * 40),
+            ('js/mini.js', b'let a = 1;\n'),
+            ('sounds/exito.wav', b'RIFF' + bytes(60)),
+        ]:
+            ruta = os.path.join(self.fuente, nombre)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            with open(ruta, 'wb') as archivo:
+                archivo.write(contenido)
+        self.destino = tempfile.mkdtemp()
+        _available_audio.cache_clear()
+        self.addCleanup(_available_audio.cache_clear)
+
+    def _collectstatic(self):
+        self.enterContext(override_settings(
+            STATICFILES_DIRS=[self.fuente],
+            STATIC_ROOT=self.destino,
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'memory_game.storage.CompressedManifestStaticFilesStorage',
+            }},
+        ))
+        with mock.patch('django.contrib.staticfiles.finders.get_finders',
+                        return_value=[FileSystemFinder()]):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.destino, 'staticfiles.json')) as archivo:
+            return json.load(archivo)['paths']
+
+    def _leer(self, nombre):
+        with open(os.path.join(self.destino, nombre), 'rb') as archivo:
+            return archivo.read()
+
+    def test_manifest_con_hash_y_variantes_comprimidas(self):
+        with mock.patch('memory_game.storage.shutil.which', return_value=None):
+            rutas = self._collectstatic()
+
+        css = rutas['css/estilo.css']
+        self.assertRegex(css, r'^css/estilo\.[0-9a-f]{12}\.css$')
+        for nombre in ('css/estilo.css', css):
+            self.assertEqual(gzip.decompress(self._leer(nombre + '.gz')), self._leer('css/estilo.css'))
+            self.assertEqual(os.path.exists(os.path.join(self.destino, nombre + '.br')), brotli is not None)
+        # Por debajo de MIN_COMPRESS_SIZE no se comprime
+        self.assertFalse(os.path.exists(os.path.join(self.destino, rutas['js/mini.js'] + '.gz')))
+        # Sin ffmpeg no hay variantes de audio: el tag sirve solo el .wav
+        self.assertEqual(set(rutas), {'css/estilo.css', 'js/mini.js', 'sounds/exito.wav'})
+        self.assertEqual(
+            engines['django'].from_string("{% load static_assets %}{% audio_sources 'sounds/exito.wav' %}").render({}),
+            f'<source src="/static/{rutas["sounds/exito.wav"]}" type="audio/wav">',
+        )
+
+    @skipUnless(shutil.which('ffmpeg'), "requiere ffmpeg")
+    def test_variantes_de_audio_con_ffmpeg(self):
+        with wave.open(os.path.join(self.fuente, 'sounds/exito.wav'), 'wb') as sonido:
+            sonido.setnchannels(1)
+            sonido.setsampwidth(2)
+            sonido.setframerate(8000)
+            sonido.writeframes(bytes(1600))
+        rutas = self._collectstatic()
+
+        self.assertIn('sounds/exito.ogg', rutas)
+        self.assertIn('sounds/exito.mp3', rutas)
+        fuentes = engines['django'].from_string(
+            "{% load static_assets %}{% audio_sources 'sounds/exito.wav' %}"
+        ).render({}).splitlines()
+        self.assertEqual([f.split('type=')[1] for f in fuentes],
+                         ['"audio/ogg; codecs=opus">', '"audio/mpeg">', '"audio/wav">'])
+
+    def test_tag_prefiere_las_variantes_que_existen(self):
+        for nombre in ('sounds/exito.wav', 'sounds/exito.mp3'):
+            ruta = os.path.join(self.destino, nombre)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            open(ruta, 'wb').close()
+        plantilla = engines['django'].from_string("{% load static_assets %}{% audio_sources 'sounds/exito.wav' %}")
+        with override_settings(STATIC_ROOT=self.destino):
+            self.assertEqual(plantilla.render({}), (
+                '<source src="/static/sounds/exito.mp3" type="audio/mpeg">\n'
+                '<source src="/static/sounds/exito.wav" type="audio/wav">'
+            ))
+
+
+# -------------------------------
+# PRUEBAS: FRAGMENTOS CACHEADOS DEL TABLERO
+# -------------------------------
+
+class FragmentosCacheTests(TestCase):
+
+    def test_plantillas_con_cargador_cacheado(self):
+        cargadores = engines['django'].engine.template_loaders
+        self.assertEqual([type(c).__name__ for c in cargadores], ['Loader'])
+        self.assertEqual(cargadores[0].__module__, 'django.template.loaders.cached')
+
+    def test_guardar_un_nivel_borra_sus_fragmentos(self):
+        nivel = Nivel.objects.create(nombre='Fácil', dificultad=1)
+        claves = [make_template_fragment_key('menu_niveles'), make_template_fragment_key('tablero_chrome', [nivel.pk])]
+        cache.set_many({clave: 'html' for clave in claves})
+        nivel.nombre = 'Muy fácil'
+        nivel.save()
+        self.assertEqual(cache.get_many(claves), {})
+
+
+# -------------------------------
+# PRUEBAS: LÍMITE DE JUGADAS Y COALESCING
+# -------------------------------
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'throttle-tests'}})
+class TokenBucketTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.bucket = TokenBucket(rate=2, capacity=3, prefix='prueba')
+        self.ahora = 1000.0
+        reloj = mock.patch('memory_game.services.throttle.time.time', side_effect=lambda: self.ahora)
+        reloj.start()
+        self.addCleanup(reloj.stop)
+
+    def test_rafaga_hasta_la_capacidad(self):
+        self.assertEqual([self.bucket.consume('j')[0] for _ in range(3)], [True] * 3)
+        permitido, reintentar = self.bucket.consume('j')
+        self.assertFalse(permitido)
+        self.assertAlmostEqual(reintentar, 0.5)
+        # Cada jugador tiene su propio bucket
+        self.assertTrue(self.bucket.consume('otro')[0])
+
+    def test_recarga_al_ritmo_configurado_sin_pasar_de_la_capacidad(self):
+        for _ in range(3):
+            self.bucket.consume('j')
+        self.ahora += 0.5
+        self.assertTrue(self.bucket.consume('j')[0])
+        self.assertFalse(self.bucket.consume('j')[0])
+
+        self.ahora += 60
+        self.assertEqual([self.bucket.consume('j')[0] for _ in range(4)], [True, True, True, False])
+
+    def test_consumo_concurrente_no_supera_la_rafaga(self):
+        permitidos = []
+        hilos = [threading.Thread(target=lambda: permitidos.append(self.bucket.consume('j')[0])) for _ in range(20)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(permitidos.count(True), 3)
+
+
+class SingleFlightTests(TestCase):
+
+    def test_llamadas_iguales_en_vuelo_se_ejecutan_una_vez(self):
+        vuelo = SingleFlight()
+        dentro, soltar = threading.Event(), threading.Event()
+        ejecuciones = []
+
+        def lenta():
+            ejecuciones.append(1)
+            dentro.set()
+            soltar.wait(5)
+            return 'respuesta'
+
+        resultados = []
+        lider = threading.Thread(target=lambda: resultados.append(vuelo.do('k', lenta)))
+        lider.start()
+        dentro.wait(5)
+        seguidores = [threading.Thread(target=lambda: resultados.append(vuelo.do('k', lenta))) for _ in range(4)]
+        for hilo in seguidores:
+            hilo.start()
+        # Los seguidores quedan esperando al líder
+        while len(vuelo._en_vuelo['k'].evento._cond._waiters) < 4:
+            time.sleep(0.001)
+        soltar.set()
+        for hilo in [lider, *seguidores]:
+            hilo.join()
+
+        self.assertEqual(len(ejecuciones), 1)
+        self.assertEqual(sorted(resultados), [('respuesta', False)] + [('respuesta', True)] * 4)
+        # Terminada la llamada, la siguiente vuelve a ejecutar
+        self.assertEqual(vuelo.do('k', lambda: 'nueva'), ('nueva', False))
+
+    def test_el_error_del_lider_llega_a_los_seguidores(self):
+        vuelo = SingleFlight()
+        dentro, soltar = threading.Event(), threading.Event()
+
+        def falla():
+            dentro.set()
+            soltar.wait(5)
+            raise ValueError('roto')
+
+        errores = []
+
+        def llamar():
+            try:
+                vuelo.do('k', falla)
+            except ValueError as exc:
+                errores.append(str(exc))
+
+        lider = threading.Thread(target=llamar)
+        lider.start()
+        dentro.wait(5)
+        seguidor = threading.Thread(target=llamar)
+        seguidor.start()
+        while not vuelo._en_vuelo['k'].evento._cond._waiters:
+            time.sleep(0.001)
+        soltar.set()
+        lider.join()
+        seguidor.join()
+        self.assertEqual(errores, ['roto', 'roto'])
+
+
+# -------------------------------
+# VERSIÓN DE REFERENCIA CON BLOQUEOS
+# -------------------------------
+
+def _revelar_con_bloqueo(game, position):
+    """Algoritmo anterior (select_for_update + re-consulta), usado como oráculo."""
+    with transaction.atomic(using=game._state.db):
+        return _revelar_con_bloqueo_en_transaccion(game, position)
+
+
+def _revelar_con_bloqueo_en_transaccion(game, position):
+    game.refresh_from_db()
+    if not game.activa:
+        return {'status': 'error'}
+    card = game.carta_set.select_for_update().get(posicion=position)
+    if card.emparejada or card.revelada:
+        return {'status': 'ignored'}
+    card.revelada = True
+    card.save()
+    other = game.carta_set.filter(
+        revelada=True, emparejada=False
+    ).exclude(posicion=position).first()
+    if not other:
+        return {'status': 'first_reveal'}
+    game.movimientos += 1
+    es_par = other.valor == card.valor
+    if es_par:
+        other.emparejada = card.emparejada = True
+        other.save()
+        card.save()
+        game.aciertos += 1
+    game.intento_set.create(carta1=other, carta2=card, es_correcto=es_par)
+    if game.aciertos >= _get_card_pairs_from_level(game.nivel):
+        game.activa = False
+        game.ganada = True
+    game.save()
+    return {'status': 'checked', 'acierto': es_par}
+
+
+def _ocultar_con_bloqueo(game, pos1, pos2):
+    with transaction.atomic(using=game._state.db):
+        for c in game.carta_set.select_for_update().filter(posicion__in=[pos1, pos2]):
+            if not c.emparejada:
+                c.revelada = False
+                c.save()
+
+
+# -------------------------------
+# PRUEBAS: MOVIMIENTOS CON COMPARE-AND-SET
+# -------------------------------
+
+class ConcurrenciaOptimistaTests(TransactionTestCase):
+    databases = '__all__'  # con DB_SHARDS, las partidas van al shard de cada jugador
+    # Layout fijo (nivel fácil = 6 pares): la pareja de i está en i + 6
+    VALORES = list('abcdef') * 2
+
+    def setUp(self):
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=3, columnas=4)
+        self.usuario = User.objects.create(username='jugador')
+
+    def _nueva_partida(self, usuario=None):
+        game = create_game(usuario or self.usuario, self.nivel)
+        # Fijar el layout para poder comparar ambas implementaciones
+        game.carta_set.all().delete()
+        Carta.objects.using(game._state.db).bulk_create([
+            Carta(partida=game, nivel=self.nivel, posicion=i, valor=v, simbolo=v)
+            for i, v in enumerate(self.VALORES)
+        ])
+        return game
+
+    def _estado(self, game):
+        game.refresh_from_db()
+        cartas = list(game.carta_set.order_by('posicion').values_list('revelada', 'emparejada'))
+        intentos = list(
+            game.intento_set.order_by('id')
+            .values_list('carta1__posicion', 'carta2__posicion', 'es_correcto')
+        )
+        return game.movimientos, game.aciertos, game.activa, game.ganada, cartas, intentos
+
+    def _en_paralelo(self, funciones):
+        """Ejecuta las funciones a la vez (una conexión por hilo) y devuelve sus resultados."""
+        barrera = threading.Barrier(len(funciones))
+        resultados = [None] * len(funciones)
+
+        def correr(i, fn):
+            try:
+                barrera.wait()
+                resultados[i] = fn()
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=correr, args=(i, fn)) for i, fn in enumerate(funciones)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        return resultados
+
+    def test_secuencia_igual_que_version_con_bloqueo(self):
+        jugadas = [(0, 1), (0, 6), (2, 9), (1, 7), (2, 8), (3, 9), (4, 10), (11, 5), (5, 11)]
+        optimista = self._nueva_partida()
+        referencia = self._nueva_partida(User.objects.create(username='referencia'))
+
+        for a, b in jugadas:
+            reveal_card(optimista, a)
+            r = reveal_card(optimista, b)
+            if r['status'] == 'checked' and not r['acierto']:
+                hide_unmatched(optimista, a, b)
+
+            _revelar_con_bloqueo(referencia, a)
+            r = _revelar_con_bloqueo(referencia, b)
+            if r['status'] == 'checked' and not r['acierto']:
+                _ocultar_con_bloqueo(referencia, a, b)
+
+        self.assertEqual(self._estado(optimista), self._estado(referencia))
+        self.assertTrue(optimista.ganada)
+        self.assertIsNone(optimista.carta_pendiente_id)
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_revelados_concurrentes_misma_posicion(self):
+        game = self._nueva_partida()
+        resultados = self._en_paralelo([
+            lambda: reveal_card(para_partida(Partida, game.pk).get(pk=game.pk), 0) for _ in range(8)
+        ])
+
+        estados = sorted(r['status'] for r in resultados)
+        self.assertEqual(estados, ['first_reveal'] + ['ignored'] * 7)
+        game.refresh_from_db()
+        self.assertEqual(game.carta_pendiente.posicion, 0)
+        self.assertEqual(game.movimientos, 0)
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_par_revelado_en_paralelo_igual_que_version_con_bloqueo_serial(self):
+        optimista = self._nueva_partida()
+        referencia = self._nueva_partida(User.objects.create(username='referencia'))
+
+        r_opt = self._en_paralelo([
+            lambda: reveal_card(para_partida(Partida, optimista.pk).get(pk=optimista.pk), 1),
+            lambda: reveal_card(para_partida(Partida, optimista.pk).get(pk=optimista.pk), 7),
+        ])
+        # La versión con bloqueos solo es correcta en serie: bloquear filas distintas
+        # de Carta no serializa las dos jugadas y ambas pueden quedar como 'first_reveal'
+        r_ref = [_revelar_con_bloqueo(referencia, 1), _revelar_con_bloqueo(referencia, 7)]
+        self.assertEqual(sorted(r['status'] for r in r_opt), ['checked', 'first_reveal'])
+        self.assertEqual(sorted(r['status'] for r in r_opt), sorted(r['status'] for r in r_ref))
+        # Las posiciones del intento dependen del orden en que llegaron los hilos
+        opt, ref = self._estado(optimista), self._estado(referencia)
+        self.assertEqual(opt[:5], ref[:5])
+        self.assertEqual(opt[:2], (1, 1))
+
+
+# -------------------------------
+# PRUEBAS: ROUTER DE RÉPLICA DE LECTURA
+# -------------------------------
+
+@skipUnless(replica_alias(), "requiere un alias 'replica' en DATABASES (DB_REPLICA_HOST)")
+class ReplicaRouterTests(TransactionTestCase):
+    # TransactionTestCase: la réplica (espejo de 'default' en pruebas) es otra
+    # conexión y solo ve datos confirmados
+    databases = '__all__'
+
+    def setUp(self):
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=3, columnas=4)
+        self.usuario = User.objects.create(username='jugador')
+        self.client.force_login(self.usuario)
+
+    def _consultas(self, alias, url, method='get'):
+        with CaptureQueriesContext(connections[alias]) as consultas:
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 400)
+        return len(consultas)
+
+    def test_estadisticas_se_leen_de_la_replica(self):
+        self.assertGreater(self._consultas(replica_alias(), '/stats/jugador/'), 0)
+
+    def test_escrituras_siempre_van_a_default(self):
+        # En un contexto copiado: db_for_write marca la escritura en una ContextVar
+        contextvars.copy_context().run(self._escrituras_en_vista_de_replica)
+
+    def _escrituras_en_vista_de_replica(self):
+        router = ReplicaRouter()
+        with leer_de_replica():
+            for model in (Partida, Carta, Estadistica, User):
+                self.assertEqual(router.db_for_write(model), 'default')
+
+        with CaptureQueriesContext(connections[replica_alias()]) as replica, leer_de_replica():
+            game = create_game(self.usuario, self.nivel)
+            reveal_card(game, 0)
+            reveal_card(game, 1)
+        escrituras = [q['sql'] for q in replica if not q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(escrituras, [])
+        game.refresh_from_db()
+        self.assertEqual(game.movimientos, 1)
+
+    def test_sesion_fijada_a_primaria_al_terminar_partida(self):
+        create_game(self.usuario, self.nivel)
+        self._consultas('default', '/game/marcar_derrota/', method='post')
+        self.assertEqual(self._consultas(replica_alias(), '/stats/jugador/'), 0)
+        self.assertGreater(self._consultas('default', '/stats/jugador/'), 0)
+
+
+# -------------------------------
+# PRUEBAS: ROLLUP Y PURGA DE INTENTOS
+# -------------------------------
+
+# El upsert de los resúmenes usa la restricción única con NULLS NOT DISTINCT (PostgreSQL 15+)
+@skipUnless(connections['default'].features.supports_nulls_distinct_unique_constraints, "requiere NULLS NOT DISTINCT")
+class RetencionIntentosTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.hoy = timezone.localdate()
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=2)
+        self.usuario = User.objects.create(username='jugador')
+        self.game = create_game(self.usuario, self.nivel)
+
+    def _intento(self, dias_atras, es_correcto=False):
+        intento = self.game.intento_set.create(usuario=self.usuario, es_correcto=es_correcto)
+        self.game.intento_set.filter(pk=intento.pk).update(fecha=timezone.now() - timedelta(days=dias_atras))
+
+    def _resumen(self):
+        return {
+            (r.dia, r.intentos, r.correctos)
+            for r in ResumenIntentos.objects.filter(usuario=self.usuario, nivel=self.nivel)
+        }
+
+    def test_rollup_solo_de_dias_cerrados_y_sin_repetir(self):
+        for dias_atras, es_correcto in [(3, True), (3, False), (1, True), (0, False)]:
+            self._intento(dias_atras, es_correcto)
+
+        self.assertEqual(rollup_intentos(), 3)
+        dia = lambda n: self.hoy - timedelta(days=n)
+        self.assertEqual(self._resumen(), {(dia(3), 2, 1), (dia(1), 1, 1)})
+        self.assertEqual(MarcaAgua.objects.get(nombre=MARCA_INTENTOS).fecha.date(), self.hoy)
+
+        # Hasta que el día de hoy cierre no hay nada nuevo que agregar
+        self.assertEqual(rollup_intentos(), 0)
+        self.assertEqual(rollup_intentos(hasta=self.hoy + timedelta(days=1)), 1)
+        self.assertEqual(self._resumen(), {(dia(3), 2, 1), (dia(1), 1, 1), (dia(0), 1, 0)})
+
+    def test_purga_sin_pasar_la_marca_de_agua(self):
+        for dias_atras in (40, 35, 2):
+            self._intento(dias_atras)
+        # Sin rollup no se borra nada, aunque esté fuera de la retención
+        self.assertEqual(purgar_intentos(retencion_dias=30), 0)
+
+        # Agregados solo hasta hace 36 días: el de hace 35 se conserva
+        rollup_intentos(hasta=self.hoy - timedelta(days=36))
+        self.assertEqual(purgar_intentos(retencion_dias=30), 1)
+
+        rollup_intentos()
+        self.assertEqual(purgar_intentos(retencion_dias=30), 1)
+        self.assertEqual(purgar_intentos(retencion_dias=1), 1)
+        self.assertEqual(self.game.intento_set.count(), 0)
+        self.assertEqual(sum(r[1] for r in self._resumen()), 3)
+
+
+# -------------------------------
+# PRUEBAS: ANALÍTICA DIARIA POR NIVEL
+# -------------------------------
+
+class RollupNivelesTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=2)
+        self.partidas = [
+            create_game(User.objects.create(username=f'jugador{i}'), self.nivel)
+            for i in range(3)
+        ]
+
+    def _resumen(self):
+        return ResumenNivelDiario.objects.values('iniciadas', 'ganadas', 'perdidas', 'abandonadas').get(
+            nivel=self.nivel, dia=timezone.localdate(),
+        )
+
+    def _terminar(self, partida, actualizada, **campos):
+        # Como una transacción que confirma tarde: el cambio llega con una marca antigua
+        para_partida(Partida, partida.pk).filter(pk=partida.pk).update(
+            activa=False, fecha_fin=timezone.now(), ultima_actualizacion=actualizada, **campos,
+        )
+
+    def test_relee_el_solapamiento_y_recalcula_el_dia(self):
+        self.assertEqual(rollup_niveles(), 1)
+        self.assertEqual(self._resumen(), {'iniciadas': 3, 'ganadas': 0, 'perdidas': 0, 'abandonadas': 0})
+        marca = MarcaAgua.objects.get(nombre=MARCA_NIVELES).fecha
+        self.assertEqual(rollup_niveles(), 1)
+
+        self._terminar(self.partidas[0], marca - SOLAPAMIENTO / 2, ganada=True, motivo_fin=Partida.MOTIVO_VICTORIA)
+        self._terminar(self.partidas[1], marca - SOLAPAMIENTO / 2, motivo_fin=Partida.MOTIVO_ABANDONO)
+        self.assertEqual(rollup_niveles(), 1)
+        self.assertEqual(self._resumen(), {'iniciadas': 3, 'ganadas': 1, 'perdidas': 0, 'abandonadas': 1})
+
+    def test_cambios_anteriores_al_solapamiento_no_se_releen(self):
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        ayer = timezone.now() - timedelta(days=1)
+        for partida in self.partidas:
+            para_partida(Partida, partida.pk).filter(pk=partida.pk).update(ultima_actualizacion=hace_una_hora)
+        para_partida(Partida, self.partidas[0].pk).filter(pk=self.partidas[0].pk).update(fecha_inicio=ayer)
+        self.assertEqual(rollup_niveles(), 2)
+
+        # La marca avanza con otra partida de hoy: solo se relee el día de hoy
+        adelantada = hace_una_hora + 2 * SOLAPAMIENTO
+        para_partida(Partida, self.partidas[2].pk).filter(pk=self.partidas[2].pk).update(ultima_actualizacion=adelantada)
+        rollup_niveles()
+        self.assertEqual(MarcaAgua.objects.get(nombre=MARCA_NIVELES).fecha, adelantada)
+
+        # Un cambio con marca más antigua que el solapamiento no ensucia su día
+        self._terminar(self.partidas[0], hace_una_hora, ganada=True, motivo_fin=Partida.MOTIVO_VICTORIA)
+        self.assertEqual(rollup_niveles(), 1)
+        self.assertEqual(ResumenNivelDiario.objects.get(dia=timezone.localdate(ayer)).ganadas, 0)
+
+        fila = dashboard_niveles()[0]
+        self.assertEqual((fila['nivel'], fila['iniciadas'], fila['tasa_victoria']), (self.nivel, 3, 0))
+
+
+# -------------------------------
+# PRUEBAS: MEJOR TIEMPO Y RANKINGS
+# -------------------------------
+
+class MejorTiempoTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=2)
+
+    def _victorias(self, username, *tiempos):
+        estadistica = Estadistica.objects.create(usuario=User.objects.create(username=username), nivel=self.nivel)
+        for tiempo in tiempos:
+            registrar_duracion(estadistica, tiempo_cliente=tiempo)
+        estadistica.save()
+        return estadistica
+
+    def test_una_victoria_lenta_no_empeora_el_mejor_tiempo(self):
+        estadistica = self._victorias('ana', '00:40', '00:25', '01:10')
+        self.assertEqual((estadistica.duracion_ms, estadistica.tiempo), (25_000, '00:25'))
+
+    def test_ranking_y_resumen_con_el_mejor_tiempo_de_cada_jugador(self):
+        self._victorias('ana', '00:30', '02:00')
+        self._victorias('beto', '00:45')
+        ranking = ranking_tiempos(self.nivel)
+        self.assertEqual([(r['usuario__username'], r['duracion_ms']) for r in ranking], [('ana', 30_000), ('beto', 45_000)])
+        self.assertEqual(resumen_tiempos(nivel=self.nivel), {'mejor_tiempo_ms': 30_000, 'tiempo_promedio_ms': 37_500})
+
+    def test_la_migracion_conserva_su_copia_del_parser(self):
+        migracion = importlib.import_module('memory_game.migrations.0008_backfill_estadistica_duracion_ms')
+        for texto in ('00:42', '1:02:03', '01:05.25', '99:99', 'x', None):
+            self.assertEqual(migracion.tiempo_a_ms(texto), tiempo_a_ms(texto))
+
+
+# -------------------------------
+# PRUEBAS: BOSQUEJOS DE PERCENTILES
+# -------------------------------
+
+class BosquejoCuantilesTests(TestCase):
+    databases = '__all__'
+
+    def _exacto(self, valores, q):
+        ordenados = sorted(valores)
+        return ordenados[int(q * (len(ordenados) - 1))]
+
+    def _bosquejo(self, valores, **kwargs):
+        bosquejo = BosquejoCuantiles(**kwargs)
+        for valor in valores:
+            bosquejo.agregar(valor)
+        return bosquejo
+
+    def test_error_relativo_acotado_por_alfa(self):
+        azar = random.Random(7)
+        valores = [azar.lognormvariate(8, 1.5) for _ in range(20_000)]
+        bosquejo = self._bosquejo(valores)
+        for q in (0.01, 0.25, 0.5, 0.9, 0.99, 1.0):
+            exacto = self._exacto(valores, q)
+            self.assertLessEqual(abs(bosquejo.cuantil(q) - exacto) / exacto, ALFA + 1e-9)
+        self.assertEqual((bosquejo.total, self._bosquejo([0, 0, 5]).cuantil(0.5)), (20_000, 0))
+
+    def test_combinar_equivale_a_un_solo_bosquejo(self):
+        azar = random.Random(3)
+        a = [azar.randint(0, 500) for _ in range(3000)]
+        b = [azar.randint(100, 90_000) for _ in range(3000)]
+        combinado = self._bosquejo(a)
+        combinado.combinar(self._bosquejo(b))
+        self.assertEqual(combinado.a_dict(), self._bosquejo(a + b).a_dict())
+        with self.assertRaises(ValueError):
+            combinado.combinar(BosquejoCuantiles(alfa=0.05))
+
+    def test_colapso_conserva_los_cuantiles_altos(self):
+        valores = [1.05 ** i for i in range(400)]
+        bosquejo = self._bosquejo(valores, max_contenedores=64)
+        self.assertEqual(len(bosquejo.contadores), 64)
+        self.assertEqual(bosquejo.total, 400)
+        # 64 contenedores de ~2 % cubren las ~26 mayores (cada valor es un 5 % mayor que el anterior)
+        for q in (0.95, 0.99, 1.0):
+            exacto = self._exacto(valores, q)
+            self.assertLessEqual(abs(bosquejo.cuantil(q) - exacto) / exacto, ALFA + 1e-9)
+        # Los valores bajos quedan todos en el primer contenedor
+        self.assertGreater(bosquejo.cuantil(0.01), 1.05 ** 4)
+
+    def test_serializacion_ida_y_vuelta(self):
+        bosquejo = self._bosquejo([0, 3, 3, 250, 7_000])
+        copia = BosquejoCuantiles.desde_dict(json.loads(json.dumps(bosquejo.a_dict())))
+        self.assertEqual(copia.a_dict(), bosquejo.a_dict())
+        self.assertEqual([copia.cuantil(q) for q in (0, 0.5, 1)], [bosquejo.cuantil(q) for q in (0, 0.5, 1)])
+        self.assertEqual(copia.fraccion_mayores(3), bosquejo.fraccion_mayores(3))
+
+    @override_settings(BOSQUEJO_FRANJAS=4)
+    def test_victorias_repartidas_en_franjas_y_combinadas_al_leer(self):
+        nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=2)
+        usuario = User.objects.create(username='jugador')
+        partidas = []
+        for movimientos in range(2, 42):
+            partida = usuario.partida_set.create(nivel=nivel, movimientos=movimientos, aciertos=2)
+            partida.finalizar(ganada=True)
+            registrar_partida(partida)
+            partidas.append(partida)
+
+        filas = BosquejoNivel.objects.filter(nivel=nivel, metrica=BosquejoNivel.METRICA_MOVIMIENTOS)
+        self.assertGreater(filas.count(), 1)
+        self.assertEqual(sum(filas.values_list('total', flat=True)), 40)
+        self.assertEqual(percentiles_partida(partidas[9])[BosquejoNivel.METRICA_MOVIMIENTOS], 75)
+
+        reconstruir_bosquejos(nivel)
+        self.assertEqual(filas.count(), 1)
+        self.assertEqual(percentiles_partida(partidas[9])[BosquejoNivel.METRICA_MOVIMIENTOS], 75)
+
+
+# -------------------------------
+# PRUEBAS: SIMULADOR DE PARTIDAS
+# -------------------------------
+
+class SimuladorTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=4, columnas=4)
+
+    def test_memoria_perfecta_gana_sin_errores_contra_el_motor(self):
+        resultado = simular(3, [self.nivel], 'memoria_perfecta', semilla=1)
+        self.assertEqual((resultado.partidas, resultado.ganadas, resultado.errores), (3, 3, 0))
+        self.assertGreater(resultado.consultas, 0)
+        # Con memoria perfecta: un turno por par más, como mucho, uno por carta por descubrir
+        self.assertLessEqual(resultado.movimientos, 3 * (8 + 15))
+        usuario = User.objects.get(username=f'{PREFIJO_USUARIO}0')
+        self.assertEqual(Estadistica.objects.get(usuario=usuario, nivel=self.nivel).victorias, 3)
+
+    def test_mas_memoria_menos_movimientos_en_memoria(self):
+        movimientos = {
+            estrategia: simular_en_memoria(200, [self.nivel], estrategia, semilla=5).movimientos
+            for estrategia in ('aleatoria', 'memoria_imperfecta', 'memoria_perfecta')
+        }
+        self.assertLess(movimientos['memoria_perfecta'], movimientos['memoria_imperfecta'])
+        self.assertLess(movimientos['memoria_imperfecta'], movimientos['aleatoria'])
+        # Misma semilla, mismas partidas
+        self.assertEqual(simular_en_memoria(20, [self.nivel], semilla=9).a_dict()['movimientos'],
+                         simular_en_memoria(20, [self.nivel], semilla=9).a_dict()['movimientos'])
+        with self.assertRaises(ValueError):
+            crear_jugador('adivina')
+
+    def test_resultados_combinados_y_limpieza(self):
+        total = Resultado(partidas=2, jugadas=10, segundos=3.0, procesos=1)
+        total.sumar(Resultado(partidas=1, jugadas=4, segundos=5.0, procesos=1))
+        self.assertEqual((total.partidas, total.jugadas, total.segundos, total.procesos), (3, 14, 5.0, 2))
+        self.assertEqual(total.resumen()['jugadas_por_s'], 2.8)
+
+        simular(1, [self.nivel], semilla=2)
+        User.objects.create(username=f'{PREFIJO_USUARIO}invitado')
+        limpiar_simulacion()
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), [f'{PREFIJO_USUARIO}invitado'])
+
+
+# -------------------------------
+# PRUEBAS: NÚCLEO DEL TABLERO
+# -------------------------------
+
+class TableroTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        # Parejas: (0, 2) y (1, 3)
+        self.tablero = Tablero(['a', 'b', 'a', 'b'])
+
+    def test_revelar_fallo_ocultar_par_y_victoria(self):
+        t = self.tablero
+        self.assertEqual(t.revelar(0), [Evento(EV_REVELADA, (0,))])
+        self.assertEqual(t.revelar(1), [Evento(EV_FALLO, (0, 1))])
+        self.assertEqual((t.movimientos, t.pendiente), (1, None))
+        self.assertEqual(t.ocultar(1, 0, 0), [Evento(EV_OCULTADAS, (0, 1))])
+        self.assertEqual(t.ocultar(0, 1), [])
+
+        self.assertEqual(t.revelar(0), [Evento(EV_REVELADA, (0,))])
+        self.assertEqual(t.revelar(2), [Evento(EV_PAR, (0, 2))])
+        t.revelar(3)
+        self.assertEqual(t.revelar(1), [Evento(EV_PAR, (3, 1)), Evento(EV_VICTORIA)])
+        self.assertEqual((t.activa, t.ganada, t.motivo_fin, t.movimientos, t.aciertos), (False, True, 'victoria', 3, 2))
+        self.assertEqual(t.revelar(0)[0].tipo, EV_RECHAZADA)
+
+    def test_jugadas_ignoradas_y_rechazadas(self):
+        t = self.tablero
+        t.revelar(0)
+        self.assertEqual(t.revelar(0), [Evento(EV_IGNORADA, (0,), 'Carta ya revelada')])
+        # La pendiente de la jugada en curso no se oculta
+        self.assertEqual(t.ocultar(0), [])
+        t.revelar(2)
+        self.assertEqual(t.revelar(2), [Evento(EV_IGNORADA, (2,), 'Carta ya emparejada')])
+        self.assertEqual(t.revelar(4), [Evento(EV_RECHAZADA, mensaje='Posición inválida')])
+        self.assertEqual(t.revelar(-1)[0].tipo, EV_RECHAZADA)
+        self.assertEqual(t.movimientos, 1)
+
+    def test_abandonar(self):
+        t = self.tablero
+        t.revelar(0)
+        self.assertEqual(t.abandonar(), [Evento(EV_FIN, mensaje='derrota')])
+        self.assertEqual((t.activa, t.ganada, t.pendiente), (False, False, None))
+        self.assertEqual(t.abandonar()[0].tipo, EV_RECHAZADA)
+        self.assertEqual(t.revelar(1)[0].tipo, EV_RECHAZADA)
+
+    def test_tablero_parcial(self):
+        t = Tablero.parcial(50, {10: ('x', OCULTA), 75: ('x', REVELADA)}, pendiente=75)
+        self.assertEqual(len(t), 100)
+        self.assertEqual(t.revelar(10), [Evento(EV_PAR, (75, 10))])
+        self.assertEqual(t.estados[10], EMPAREJADA)
+        with self.assertRaises(KeyError):
+            t.revelar(11)
+
+    def test_abandonar_partida_sin_leer_sus_cartas(self):
+        nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=2)
+        game = create_game(User.objects.create(username='jugador'), nivel)
+        reveal_card(game, 0)
+        with CaptureQueriesContext(connections[game._state.db]) as consultas:
+            self.assertEqual(forfeit_game(game), "Partida marcada como derrota")
+        self.assertFalse([c for c in consultas.captured_queries if 'memory_game_carta' in c['sql']])
+        self.assertEqual((game.activa, game.motivo_fin, game.carta_pendiente_id), (False, Partida.MOTIVO_DERROTA, None))
+        self.assertEqual(forfeit_game(game), "Partida inválida o ya finalizada")
+
+
+# -------------------------------
+# PRUEBAS: TABLEROS GRANDES Y VENTANAS
+# -------------------------------
+
+class VentanaTableroTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.nivel = Nivel.objects.create(nombre='Grande', dificultad=3, filas=10, columnas=10)
+        self.usuario = User.objects.create(username='jugador')
+        self.game = create_game(self.usuario, self.nivel, tiempo_limite=0)
+
+    def _posiciones(self, estado):
+        return sorted(c['posicion'] for c in estado['cartas'])
+
+    def test_ventana_rectangular_ajustada_al_tablero(self):
+        estado = serialize_game_state(self.game, (2, 3, 3, 4))
+        self.assertEqual(self._posiciones(estado), [23, 24, 25, 26, 33, 34, 35, 36, 43, 44, 45, 46])
+        self.assertEqual((estado['parcial'], estado['ventana'], estado['total_cartas']), (True, [2, 3, 3, 4], 100))
+
+        estado = serialize_game_state(self.game, (8, 8, 5, 5))
+        self.assertEqual(self._posiciones(estado), [88, 89, 98, 99])
+        self.assertEqual(estado['ventana'], [8, 8, 5, 2])
+        self.assertEqual(len(serialize_game_state(self.game, (0, 0, 10, 10))['cartas']), 100)
+        self.assertEqual(serialize_game_state(self.game, (0, 12, 3, 3))['cartas'], [])
+
+    def test_una_consulta_acotada_sea_cual_sea_la_ventana(self):
+        reveal_card(self.game, 99)
+        with CaptureQueriesContext(connections[self.game._state.db]) as consultas:
+            estado = serialize_game_state(self.game, (0, 4, 2500, 1))
+        self.assertEqual(len(consultas), 1)
+        self.assertLessEqual(consultas[0]['sql'].count(' OR '), 1)
+        # La carta pendiente viaja aunque quede fuera de la ventana
+        self.assertEqual(self._posiciones(estado), [4, 14, 24, 34, 44, 54, 64, 74, 84, 94, 99])
+
+    def test_jugada_en_tablero_grande_devuelve_solo_sus_cartas(self):
+        primera = reveal_card(self.game, 10)['estado_partida']
+        self.assertEqual((primera['parcial'], self._posiciones(primera)), (True, [10]))
+        segunda = reveal_card(self.game, 57)['estado_partida']
+        self.assertEqual(self._posiciones(segunda), [10, 57])
+
+    # La réplica de pruebas es otra conexión y no ve los datos sin confirmar de TestCase
+    @override_settings(REPLICA_DB_ALIAS='sin_replica')
+    def test_vista_de_estado_con_ventana(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(f'/state/{self.game.pk}/', {'fila': 1, 'columna': 0, 'alto': 1, 'ancho': 3})
+        self.assertEqual(self._posiciones(respuesta.json()), [10, 11, 12])
+        self.assertEqual(self.client.get(f'/state/{self.game.pk}/', {'alto': 100, 'ancho': 100}).status_code, 400)
+        self.assertEqual(self.client.get(f'/state/{self.game.pk}/', {'alto': 'x'}).status_code, 400)
+
+
+# -------------------------------
+# PRUEBAS: BROKER Y EVENTOS DE SALA
+# -------------------------------
+
+class BrokerTests(TestCase):
+
+    def setUp(self):
+        self.broker = Broker(historial=3, maximo_cola=4)
+
+    def test_un_frame_compartido_por_todos_los_suscriptores(self):
+        suscripciones = [self.broker.suscribir('sala:a') for _ in range(3)]
+        otra = self.broker.suscribir('sala:b')
+        self.assertEqual(self.broker.publicar('sala:a', 'jugada', {'pos': 1}), (1, 3))
+        frames = [s.esperar(0) for s in suscripciones]
+        self.assertEqual(frames[0], [b'id: 1\nevent: jugada\ndata: {"pos":1}\n\n'])
+        self.assertTrue(all(f[0] is frames[0][0] for f in frames))
+        self.assertEqual(otra.esperar(0), [])
+
+        self.broker.desuscribir(suscripciones[0])
+        self.assertEqual(self.broker.suscriptores('sala:a'), 2)
+        self.assertEqual(self.broker.publicar('sala:a', 'jugada', {}), (2, 2))
+
+    def test_historial_para_reconectar_desde_el_ultimo_id(self):
+        for n in range(5):
+            self.broker.publicar('sala:a', 'jugada', {'n': n})
+        self.assertEqual(self.broker.ultimo_id('sala:a'), 5)
+        reconectada = self.broker.suscribir('sala:a', desde=3)
+        self.assertEqual([f.split(b'\n')[0] for f in reconectada.esperar(0)], [b'id: 4', b'id: 5'])
+        # Solo se guardan los últimos 3
+        self.assertEqual(len(self.broker.suscribir('sala:a', desde=0).esperar(0)), 3)
+
+        self.broker.cerrar_canal('sala:a')
+        self.assertEqual((self.broker.ultimo_id('sala:a'), self.broker.suscribir('sala:a', desde=0).esperar(0)), (0, []))
+
+    def test_cola_desbordada_pide_resync(self):
+        lenta = self.broker.suscribir('sala:a')
+        for n in range(6):
+            self.broker.publicar('sala:a', 'jugada', {'n': n})
+        frames = lenta.esperar(0)
+        self.assertEqual(len(frames), 5)
+        self.assertTrue(frames[0].startswith(b'id: 3\n'))
+        self.assertEqual(frames[-1], b"event: resync\ndata: {}\n\n")
+        self.assertEqual(lenta.esperar(0), [])
+
+    def test_frames_asincronos_publicados_desde_otro_hilo(self):
+        sus = self.broker.suscribir('sala:a')
+
+        async def leer():
+            flujo = sus.aframes(latido=0.05)
+            recibidos = [await anext(flujo), await anext(flujo)]
+            hilo = threading.Thread(target=self.broker.publicar, args=('sala:a', 'jugada', {'n': 1}))
+            hilo.start()
+            recibidos.append(await anext(flujo))
+            hilo.join()
+            await flujo.aclose()
+            return recibidos
+
+        retry, latido, jugada = asyncio.run(leer())
+        self.assertEqual((retry, latido), (b"retry: 2000\n\n", b": latido\n\n"))
+        self.assertTrue(jugada.startswith(b'id: 1\nevent: jugada'))
+        # Cerrar el generador desuscribe
+        self.assertEqual(self.broker.suscriptores('sala:a'), 0)
+
+
+class EventosSalaTests(TestCase):
+
+    def setUp(self):
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=2)
+        self.sala = crear_sala(User.objects.create(username='creador'), self.nivel)
+        self.url = f'/salas/{self.sala.codigo}/eventos/'
+
+    async def test_stream_asgi_entrega_las_jugadas_publicadas(self):
+        respuesta = await self.async_client.get(self.url, headers={'Last-Event-ID': '0'})
+        self.assertEqual((respuesta.status_code, respuesta['Content-Type']), (200, 'text/event-stream'))
+        flujo = aiter(respuesta.streaming_content)
+        self.assertEqual(await anext(flujo), b"retry: 2000\n\n")
+
+        get_broker().publicar(canal_sala(self.sala), 'jugada', {'pos': 2})
+        self.assertIn(b'"pos":2', await anext(flujo))
+        self.assertEqual(get_broker().suscriptores(canal_sala(self.sala)), 1)
+
+        # El cliente se desconecta: el servidor ASGI cancela la tarea que espera eventos
+        espera = asyncio.ensure_future(anext(flujo))
+        await asyncio.sleep(0)
+        espera.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await espera
+        self.assertEqual(get_broker().suscriptores(canal_sala(self.sala)), 0)
+
+    def test_sin_asgi_no_se_abre_el_stream(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 503)
+        self.assertEqual(get_broker().suscriptores(canal_sala(self.sala)), 0)
+
+    def test_crear_sala_con_cuerpo_invalido_responde_400(self):
+        self.client.force_login(User.objects.create(username='otro'))
+        for cuerpo, error in (('{nivel', 'JSON inválido'), ('[1]', 'Se esperaba un objeto JSON')):
+            respuesta = self.client.post('/salas/nueva/', cuerpo, content_type='application/json')
+            self.assertEqual((respuesta.status_code, respuesta.json()['error']), (400, error))
+        self.assertEqual(Sala.objects.count(), 1)
+
+
+# -------------------------------
+# PRUEBAS: PROVISIÓN DE RONDAS DE TORNEO
+# -------------------------------
+
+class ProvisionRondaTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=3)
+        self.usuarios = [User.objects.create(username=f'jugador{i}') for i in range(5)]
+        self.previa = create_game(self.usuarios[0], self.nivel)
+
+    def _provisionar(self):
+        avances = []
+        ids = [u.pk for u in self.usuarios]
+        ronda = provisionar_ronda(ids + ids[:1], self.nivel, semilla=7, tamano_lote=2,
+                                  progreso=lambda hechos, total: avances.append((hechos, total)))
+        self.assertEqual(avances, [(2, 5), (4, 5), (5, 5)])
+        self.assertEqual((ronda.jugadores, ronda.disposicion), (5, disposicion_barajada(3, 7)))
+
+        for usuario in self.usuarios:
+            partida = para_usuario(Partida, usuario.pk).get(usuario=usuario, ronda=ronda)
+            self.assertTrue(partida.activa)
+            cartas = list(para_partida(Carta, partida.pk).filter(partida=partida).order_by('posicion').values_list('valor', 'simbolo', 'revelada'))
+            self.assertEqual(cartas, [(v, v, False) for v in ronda.disposicion])
+
+        self.previa.refresh_from_db()
+        self.assertEqual((self.previa.activa, self.previa.motivo_fin), (False, Partida.MOTIVO_ABANDONO))
+
+    @skipUnless(connections['default'].vendor == 'postgresql', "requiere PostgreSQL")
+    def test_cartas_con_insert_select_unnest(self):
+        self._provisionar()
+
+    def test_cartas_con_insert_multifila(self):
+        with mock.patch('memory_game.services.torneos._usa_unnest', return_value=False):
+            self._provisionar()
+
+    def test_la_peticion_web_limita_los_jugadores(self):
+        staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        url = '/torneos/rondas/'
+        cuerpo = {'nivel_id': self.nivel.pk, 'usuarios': [u.pk for u in self.usuarios]}
+
+        with mock.patch('memory_game.views.MAX_JUGADORES_WEB', 4):
+            respuesta = self.client.post(url, cuerpo, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('provisionar_ronda', respuesta.json()['error'])
+        self.assertFalse(RondaTorneo.objects.exists())
+
+        respuesta = self.client.post(url, cuerpo, content_type='application/json')
+        self.assertEqual((respuesta.status_code, respuesta.json()['jugadores']), (201, 5))
+
+        self.client.force_login(self.usuarios[1])
+        self.assertEqual(self.client.post(url, cuerpo, content_type='application/json').status_code, 403)
+
+    def test_la_peticion_web_con_json_invalido_responde_400(self):
+        self.client.force_login(User.objects.create(username='staff', is_staff=True))
+        respuesta = self.client.post('/torneos/rondas/', '{"nivel_id": ', content_type='application/json')
+        self.assertEqual((respuesta.status_code, respuesta.json()['error']), (400, 'JSON inválido'))
+        self.assertFalse(RondaTorneo.objects.exists())
+
+
+# -------------------------------
+# PRUEBAS: LECTURAS ASÍNCRONAS
+# -------------------------------
+
+@override_settings(REPLICA_DB_ALIAS='sin_replica')
+class LecturasAsincronasTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='jugador')
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=2)
+        self.partida = create_game(self.usuario, self.nivel)
+        reveal_card(self.partida, 0)
+        actualizar_estadisticas(self.partida)
+        self.rutas = [f'/state/{self.partida.pk}/', '/stats/jugador/', f'/state/{self.partida.pk}/?fila=0&columna=0&alto=1&ancho=2']
+        self.esperado = [self.client.get(ruta).json() for ruta in self.rutas]
+
+    async def test_mismas_respuestas_que_las_vistas_sincronas(self):
+        for ruta, esperado in zip(self.rutas, self.esperado):
+            respuesta = await self.async_client.get(f'/async{ruta}')
+            self.assertEqual((respuesta.status_code, respuesta.json()), (200, esperado), ruta)
+        self.assertEqual((await self.async_client.get('/async/state/999999/')).status_code, 404)
+
+    async def test_estadisticas_con_el_usuario_de_la_sesion(self):
+        with self.settings(LOGIN_URL='/accounts/login/'):
+            self.assertEqual((await self.async_client.get('/async/estadisticas/')).status_code, 302)
+
+        await self.async_client.aforce_login(self.usuario)
+        respuesta = await self.async_client.get('/async/estadisticas/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['usuario'], self.usuario)
+        self.assertEqual([e.nivel_id for e in respuesta.context['estadisticas']], [self.nivel.pk])
+
+
+# -------------------------------
+# PRUEBAS: FORMATOS DEL ESTADO
+# -------------------------------
+
+def _estado(total, posiciones=None, valor=lambda pos: f'v{pos // 2}', **extras):
+    """Estado como el de serialize_game_state: visibles las posiciones pares y emparejadas las múltiplos de 4."""
+    posiciones = range(total) if posiciones is None else posiciones
+    cartas = [{
+        'posicion': pos,
+        'revelada': pos % 2 == 0,
+        'emparejada': pos % 4 == 0,
+        'valor': valor(pos) if pos % 2 == 0 else None,
+        'simbolo': valor(pos) if pos % 2 == 0 else None,
+    } for pos in posiciones]
+    return {
+        'partida_id': '42', 'movimientos': 7, 'aciertos': 3, 'activa': True, 'ganada': False,
+        'total_cartas': total, 'cartas': cartas, **extras,
+    }
+
+
+class FormatoEstadoTests(TestCase):
+
+    def _ida_y_vuelta(self, estado):
+        self.assertEqual(expandir(json.loads(json.dumps(compactar(estado)))), estado)
+        binario = codificar_binario(estado)
+        self.assertEqual(decodificar_binario(binario), estado)
+        return compactar(estado), binario
+
+    def test_tablero_completo(self):
+        estado = _estado(20)
+        estado['cartas'][4]['simbolo'] = 'carta_v2.png'
+        compacto, binario = self._ida_y_vuelta(estado)
+        self.assertNotIn('posiciones', compacto)
+        self.assertEqual((compacto['valores'], len(compacto['etiquetas'])), ([0, 1, 2, 3, 4, 5, 6, 7, 8, 9], 10))
+        self.assertEqual(binario[3], _F_ACTIVA)
+
+    def test_ventana_parcial(self):
+        compacto, binario = self._ida_y_vuelta(
+            _estado(64, posiciones=[9, 10, 11, 17, 18, 19], parcial=True, columnas=8, ventana=[1, 1, 2, 3])
+        )
+        self.assertEqual(compacto['posiciones'], [9, 10, 11, 17, 18, 19])
+        self.assertEqual(binario[3], _F_ACTIVA | _F_POSICIONES)
+
+    def test_tablero_y_ventana_vacios(self):
+        self._ida_y_vuelta(_estado(0))
+        compacto, _ = self._ida_y_vuelta(_estado(16, posiciones=[], parcial=True))
+        self.assertEqual((compacto['posiciones'], compacto['valores']), ([], []))
+
+    def test_indices_de_32_bits_con_mas_de_65535_etiquetas(self):
+        estado = _estado(2 * 0x10001, valor=str)
+        _, binario = self._ida_y_vuelta(estado)
+        self.assertTrue(binario[3] & _F_INDICES_32)
+        self.assertFalse(codificar_binario(_estado(2 * 0xFFFF, valor=str))[3] & _F_INDICES_32)
+
+    def test_formato_negociado_por_accept(self):
+        fabrica = RequestFactory()
+        estado = _estado(600)
+
+        respuesta = respuesta_estado(fabrica.get('/'), estado)
+        self.assertEqual((respuesta['Content-Type'], json.loads(respuesta.content)), (TIPO_JSON, estado))
+        self.assertIn('Accept', respuesta['Vary'])
+
+        respuesta = respuesta_estado(fabrica.get('/', HTTP_ACCEPT=f'{TIPO_COMPACTO}, {TIPO_JSON};q=0.5'), estado)
+        self.assertEqual(respuesta['Content-Type'], TIPO_COMPACTO)
+        self.assertEqual(expandir(json.loads(respuesta.content)), estado)
+
+        respuesta = respuesta_estado(fabrica.get('/', HTTP_ACCEPT=TIPO_BINARIO), estado)
+        self.assertEqual(decodificar_binario(respuesta.content), estado)
+        # ?formato= manda sobre Accept
+        respuesta = respuesta_estado(fabrica.get('/?formato=json', HTTP_ACCEPT=TIPO_BINARIO), estado)
+        self.assertEqual(respuesta['Content-Type'], TIPO_JSON)
+
+        # Respuesta de jugada: el binario pedido se sirve como JSON compacto
+        jugada = {'message': 'Par encontrado', 'estado_partida': _estado(4, posiciones=[0, 2], parcial=True)}
+        respuesta = respuesta_estado(fabrica.get('/', HTTP_ACCEPT=TIPO_BINARIO), jugada)
+        self.assertEqual(respuesta['Content-Type'], TIPO_COMPACTO)
+        self.assertEqual(expandir(json.loads(respuesta.content)['estado_partida']), jugada['estado_partida'])
+
+        respuesta = respuesta_estado(fabrica.get('/', HTTP_ACCEPT_ENCODING='gzip, br'), estado)
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(respuesta.content)), estado)
+
+
+# -------------------------------
+# PRUEBAS: PERFILADO POR MUESTREO
+# -------------------------------
+
+class PerfiladoTests(TestCase):
+
+    def setUp(self):
+        self.directorio = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(PERFILADO_DIR=self.directorio, PERFILADO_MUESTREO=0.0))
+        self.staff = User.objects.create(username='staff', is_staff=True)
+
+    def _peticion(self, usuario, **cabeceras):
+        request = RequestFactory().get('/register/', **cabeceras)
+        request.user = usuario
+        return request
+
+    def _middleware(self, request):
+        with mock.patch('memory_game.perfilado.Muestreador', wraps=Muestreador) as muestreador:
+            response = PerfiladoMiddleware(lambda request: HttpResponse('ok'))(request)
+        return response, muestreador.call_count
+
+    def _perfil(self, vista, pilas, ms=1.0):
+        return guardar_perfil({'vista': vista, 'ms': ms, 'pilas': pilas})
+
+    def test_desactivado_no_arranca_el_muestreador(self):
+        response, muestreadores = self._middleware(self._peticion(self.staff))
+        self.assertEqual((response.status_code, muestreadores), (200, 0))
+        self.assertEqual(list(leer_perfiles()), [])
+
+    def test_la_cabecera_sin_staff_no_perfila(self):
+        request = self._peticion(User.objects.create(username='jugador'), HTTP_X_PERFILAR='1')
+        response, muestreadores = self._middleware(request)
+        self.assertEqual(muestreadores, 0)
+        self.assertNotIn('X-Perfil', response)
+
+    def test_una_peticion_sorteada_no_consulta_al_usuario(self):
+        # Sin atributos: is_staff fallaría si se consultara
+        request = self._peticion(mock.Mock(spec=[]), HTTP_X_PERFILAR='1')
+        with override_settings(PERFILADO_MUESTREO=1.0):
+            response, muestreadores = self._middleware(request)
+        self.assertEqual(muestreadores, 1)
+        self.assertNotIn('X-Perfil', response)
+        self.assertEqual([p['vista'] for p in leer_perfiles()], ['memory_game.views.register'])
+
+    def test_solo_se_perfilan_las_vistas_de_perfilado_modulos(self):
+        request = self._peticion(self.staff, HTTP_X_PERFILAR='1')
+        with override_settings(PERFILADO_MODULOS=('memory_game.services',)):
+            _, muestreadores = self._middleware(request)
+        self.assertEqual(muestreadores, 0)
+        self.assertEqual(list(leer_perfiles()), [])
+
+        with override_settings(PERFILADO_MODULOS=('memory_game.views',)):
+            response, muestreadores = self._middleware(request)
+        (perfil,) = leer_perfiles()
+        self.assertEqual(muestreadores, 1)
+        self.assertEqual((perfil['vista'], perfil['ruta'], perfil['estado']), ('memory_game.views.register', '/register/', 200))
+        self.assertTrue((self.directorio / response['X-Perfil']).exists())
+
+    def test_la_rotacion_conserva_los_mas_recientes(self):
+        with override_settings(PERFILADO_MAXIMO=3):
+            nombres = [self._perfil('memory_game.views.vista', {}) for _ in range(6)]
+        self.assertEqual(sorted(p.name for p in self.directorio.glob('*.json')), nombres[-3:])
+
+        # Con un máximo mayor, el directorio solo se lista cada 10% de guardados
+        with override_settings(PERFILADO_MAXIMO=20), \
+                mock.patch('memory_game.perfilado._guardados', itertools.count(1)), \
+                mock.patch('memory_game.perfilado.rotar_perfiles', wraps=rotar_perfiles) as rotar:
+            nombres = [self._perfil('memory_game.views.vista', {}) for _ in range(25)]
+        self.assertEqual(rotar.call_count, 12)
+        archivos = sorted(p.name for p in self.directorio.glob('*.json'))
+        self.assertEqual(archivos, nombres[-21:])
+
+    def test_el_comando_pliega_las_pilas_guardadas(self):
+        self._perfil('memory_game.views.a', {'m:f;m:g': 3, 'm:f': 1})
+        self._perfil('memory_game.views.a', {'m:f;m:g': 2})
+        self._perfil('memory_game.views.b', {'m:f': 4})
+
+        salida = io.StringIO()
+        call_command('perfiles_flamegraph', stdout=salida, stderr=io.StringIO())
+        self.assertEqual(salida.getvalue().splitlines(), [
+            'memory_game.views.a;m:f 1',
+            'memory_game.views.a;m:f;m:g 5',
+            'memory_game.views.b;m:f 4',
+        ])
+
+        salida = io.StringIO()
+        call_command('perfiles_flamegraph', '--sin-vista', '--vista', 'views.a', stdout=salida, stderr=io.StringIO())
+        self.assertEqual(salida.getvalue().splitlines(), ['m:f 1', 'm:f;m:g 5'])
+
+
+# -------------------------------
+# PRUEBAS: REGISTRO DE CONSULTAS LENTAS
+# -------------------------------
+
+class ConsultasLentasTests(TestCase):
+
+    def setUp(self):
+        self.request = RequestFactory().get('/stats/jugador/')
+        self.niveles = [Nivel.objects.create(nombre=f'N{i}', dificultad=i) for i in range(3)]
+
+    def _registros(self, logs):
+        return [json.loads(linea.split(':', 2)[2]) for linea in logs.output]
+
+    def test_normalizar_sql(self):
+        self.assertEqual(
+            normalizar_sql("SELECT *  FROM t\n WHERE id = 12 AND nombre = 'o''hara' AND x IN (%s, %s, %s)"),
+            "SELECT * FROM t WHERE id = ? AND nombre = ? AND x IN (%s, ...)",
+        )
+        self.assertEqual(
+            normalizar_sql("SELECT a FROM t WHERE id IN (%s, %s)"),
+            normalizar_sql("SELECT a FROM t WHERE id IN (%s, %s, %s, %s)"),
+        )
+
+    def test_consultas_repetidas_como_n_mas_1(self):
+        registro = RegistroConsultas(self.request, umbral_ms=10_000, repetidas=3)
+        with connection.execute_wrapper(registro):
+            for nivel in self.niveles:
+                Nivel.objects.get(pk=nivel.pk)
+            Nivel.objects.count()
+        with self.assertLogs('memory_game.consultas', 'WARNING') as logs:
+            registro.cerrar()
+
+        (n_mas_1,) = self._registros(logs)
+        self.assertEqual((n_mas_1['tipo'], n_mas_1['veces'], n_mas_1['consultas_peticion']), ('n_mas_1', 3, 4))
+        self.assertIn('WHERE', n_mas_1['sql'])
+        self.assertTrue(n_mas_1['origen'].startswith('memory_game/tests.py:'))
+
+    def test_solo_se_anotan_las_consultas_que_terminan_bien(self):
+        registro = RegistroConsultas(self.request, umbral_ms=0, repetidas=2)
+        with self.assertLogs('memory_game.consultas', 'WARNING') as logs, connection.execute_wrapper(registro):
+            list(Nivel.objects.filter(dificultad__gte=1))
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT * FROM tabla_que_no_existe")
+
+        # Los SAVEPOINT del atomic también pasan por el registro: solo interesan los SELECT
+        lentas = [r for r in self._registros(logs) if r['sql'].startswith('SELECT')]
+        self.assertEqual(len(lentas), 1)
+        self.assertEqual(lentas[0]['tipo'], 'lenta')
+        self.assertTrue(lentas[0]['plan'])
+        self.assertFalse(any('tabla_que_no_existe' in sql for sql in registro.conteo))
+
+
+# -------------------------------
+# PRUEBAS: CALENTAMIENTO DE WORKERS
+# -------------------------------
+
+class CalentamientoTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.niveles = [Nivel.objects.create(nombre=f'N{i}', dificultad=i, filas=2, columnas=2) for i in range(2)]
+        cache.clear()
+        self.cargador = engines['django'].engine.template_loaders[0]
+        self.cargador.reset()
+
+    def test_calienta_conexiones_plantillas_y_fragmentos(self):
+        abiertas = set()
+        original = BaseDatabaseWrapper.ensure_connection
+
+        def anotar(conexion):
+            abiertas.add(conexion.alias)
+            original(conexion)
+
+        with self.assertLogs('memory_game.calentamiento', 'INFO') as logs, \
+                mock.patch.object(BaseDatabaseWrapper, 'ensure_connection', autospec=True, side_effect=anotar):
+            informe = calentar()
+
+        self.assertEqual(informe['errores'], {})
+        self.assertEqual(json.loads(logs.records[0].getMessage())['pasos'].keys(), PASOS.keys())
+        self.assertEqual(informe['pasos']['niveles']['n'], 2)
+        self.assertEqual(abiertas, set(connections))
+        for alias in connections:
+            self.assertIsNotNone(connections[alias].connection, alias)
+        self.assertTrue(set(PLANTILLAS) <= set(self.cargador.get_template_cache))
+        claves = [make_template_fragment_key('menu_niveles')]
+        claves += [make_template_fragment_key('tablero_chrome', [nivel.pk]) for nivel in self.niveles]
+        self.assertEqual(cache.get_many(claves).keys(), set(claves))
+
+    def test_un_paso_que_falla_se_registra_y_no_impide_arrancar(self):
+        gunicorn_conf = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+        fallo = mock.Mock(side_effect=DatabaseError('sin conexión'))
+        with mock.patch.dict(PASOS, {'conexiones': fallo}), \
+                self.assertLogs('memory_game.calentamiento', 'WARNING') as logs:
+            gunicorn_conf['post_worker_init'](mock.Mock())
+
+        informe = json.loads(logs.records[0].getMessage())
+        self.assertEqual(informe['errores'], {'conexiones': "DatabaseError('sin conexión')"})
+        self.assertEqual(informe['pasos']['niveles']['n'], 2)
+        self.assertTrue(set(PLANTILLAS) <= set(self.cargador.get_template_cache))
+
+        with mock.patch.dict(os.environ, {'CALENTAR_WORKERS': '0'}), \
+                mock.patch('memory_game.calentamiento.calentar') as calentar_mock:
+            gunicorn_conf['post_worker_init'](mock.Mock())
+        calentar_mock.assert_not_called()
+
+    def test_comando_con_pasos(self):
+        salida = io.StringIO()
+        with self.assertLogs('memory_game.calentamiento', 'INFO'):
+            call_command('calentar', '--pasos', 'rutas', 'plantillas', stdout=salida)
+        lineas = salida.getvalue().splitlines()
+        self.assertEqual([linea.split()[0] for linea in lineas], ['rutas', 'plantillas', 'total'])
+        self.assertIn(f'n={len(PLANTILLAS)}', lineas[1])
+        self.assertEqual(self.cargador.get_template_cache.keys(), set(PLANTILLAS))
+
+
+# -------------------------------
+# PRUEBAS: GUARDADO SOLO DE CAMPOS MODIFICADOS
+# -------------------------------
+
+class CambiosRastreadosTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=2)
+        self.usuario = User.objects.create(username='jugador')
+        self.game = create_game(self.usuario, nivel)
+
+    def _sql_guardar(self, obj):
+        with CaptureQueriesContext(connections[obj._state.db]) as consultas:
+            obj.save()
+        return [q['sql'] for q in consultas]
+
+    def test_guardar_sin_cambios_no_consulta(self):
+        game = para_partida(Partida, self.game.pk).get(pk=self.game.pk)
+        self.assertEqual(self._sql_guardar(game), [])
+
+    def test_solo_se_escriben_los_campos_cambiados(self):
+        game = para_partida(Partida, self.game.pk).get(pk=self.game.pk)
+        game.movimientos = 3
+        (sql,) = self._sql_guardar(game)
+        columnas = sql.split(' SET ')[1].split(' WHERE ')[0]
+        self.assertIn('"movimientos"', columnas)
+        self.assertIn('"ultima_actualizacion"', columnas)  # auto_now
+        self.assertNotIn('"aciertos"', columnas)
+        self.assertEqual(self._sql_guardar(game), [])  # ya guardado
+        self.assertEqual(para_partida(Partida, game.pk).get(pk=game.pk).movimientos, 3)
+
+    def test_refresh_y_update_condicional_no_dejan_campos_sucios(self):
+        reveal_card(self.game, 0)
+        self.assertEqual(self.game.campos_modificados(), set())
+        para_partida(Partida, self.game.pk).filter(pk=self.game.pk).update(movimientos=7)
+        self.game.refresh_from_db(fields=['movimientos'])
+        self.assertEqual(self._sql_guardar(self.game), [])
+
+    def test_carta_y_estadistica(self):
+        carta = self.game.carta_set.first()
+        carta.revelada = True
+        (sql,) = self._sql_guardar(carta)
+        self.assertNotIn('"valor"', sql.split(' WHERE ')[0])
+
+        stats = Estadistica.objects.create(usuario=self.usuario, nivel=self.game.nivel)
+        self.assertEqual(self._sql_guardar(stats), [])
+        stats.victorias += 1
+        self.assertEqual(len(self._sql_guardar(stats)), 1)
+
+
+# -------------------------------
+# PRUEBAS: RECONSTRUCCIÓN DE ESTADÍSTICAS
+# -------------------------------
+
+class ReconstruirEstadisticasTests(TestCase):
+    databases = '__all__'
+
+    def test_reconstruccion_igual_que_actualizacion_en_vivo(self):
+        nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=2)
+        usuario = User.objects.create(username='jugador')
+        # Se guarda el mejor tiempo (30 s), no el de la última victoria (50 s)
+        for ganada, movimientos, segundos in [(True, 4, 30), (False, 7, 10), (True, 5, 50)]:
+            partida = usuario.partida_set.create(nivel=nivel, movimientos=movimientos, aciertos=2 * ganada)
+            partida.finalizar(ganada=ganada)
+            partida.fecha_inicio = partida.fecha_fin - timedelta(seconds=segundos)
+            para_partida(Partida, partida.pk).filter(pk=partida.pk).update(fecha_inicio=partida.fecha_inicio)
+            actualizar_estadisticas(partida)
+        abandonada = usuario.partida_set.create(nivel=nivel, movimientos=9, activa=False,
+                                                motivo_fin=Partida.MOTIVO_ABANDONO)
+        self.assertIsNotNone(abandonada.pk)
+
+        en_vivo = Estadistica.objects.values(*CAMPOS_ESTADISTICA).get()
+        self.assertEqual((en_vivo['duracion_ms'], en_vivo['tiempo']), (30_000, '00:30'))
+        Estadistica.objects.update(total_partidas=0, victorias=0, derrotas=0, promedio_intentos=0, intentos=0,
+                                   duracion_ms=None, tiempo='00:00')
+
+        resultado = reconstruir_estadisticas(tamano_bloque=1)
+        self.assertEqual((resultado['partidas'], resultado['filas']), (3, 1))
+        self.assertEqual(Estadistica.objects.values(*CAMPOS_ESTADISTICA).get(), en_vivo)
+
+
+# -------------------------------
+# PRUEBAS: SHARDS DE PARTIDAS
+# -------------------------------
+
+class JumpHashTests(TestCase):
+
+    def test_anadir_un_shard_solo_mueve_claves_al_nuevo(self):
+        for n in range(1, 6):
+            for clave in range(2000):
+                antes, despues = _jump_hash(clave, n), _jump_hash(clave, n + 1)
+                self.assertIn(despues, (antes, n))
+
+
+@skipUnless(hay_shards(), "requiere varios shards en DATABASES (DB_SHARDS)")
+class ShardRouterTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=2)
+        self.usuarios = [User.objects.create(username=f'jugador{i}') for i in range(12)]
+
+    def test_partidas_en_el_shard_del_usuario_con_ids_de_su_rango(self):
+        for usuario in self.usuarios:
+            game = create_game(usuario, self.nivel)
+            shard = shard_de_usuario(usuario.pk)
+            self.assertEqual(game._state.db, shard)
+            self.assertEqual(shard_de_partida(game.pk), shard)
+            self.assertEqual(game.carta_set.count(), 4)
+            self.assertEqual(game.pk >> BITS_SHARD, settings.SHARDS.index(shard))
+        self.assertGreater(len({shard_de_usuario(u.pk) for u in self.usuarios}), 1)
+
+    def test_jugada_estado_y_estadisticas(self):
+        usuario = next(u for u in self.usuarios if shard_de_usuario(u.pk) != 'default')
+        game = create_game(usuario, self.nivel)
+        valores = dict(game.carta_set.values_list('posicion', 'valor'))
+        pareja = next(p for p in valores if p and valores[p] == valores[0])
+        reveal_card(game, 0)
+        self.assertTrue(reveal_card(game, pareja)['acierto'])
+
+        self.client.force_login(usuario)
+        estado = self.client.get(f'/state/{game.pk}/').json()
+        self.assertEqual(estado['aciertos'], 1)
+        self.assertEqual(game.intento_set.count(), 1)
+
+        usuario.delete()
+        self.assertFalse(para_partida(Partida, game.pk).filter(pk=game.pk).exists())
+
+    def test_agregacion_entre_shards(self):
+        for usuario in self.usuarios:
+            create_game(usuario, self.nivel, cerrar_previas=False)
+            create_game(usuario, self.nivel, cerrar_previas=False)
+        (fila,) = agregar_en_shards(Partida.objects.all(), agrupar=('nivel_id',), total=Count('id'))
+        self.assertEqual(fila, {'nivel_id': self.nivel.pk, 'total': 2 * len(self.usuarios)})
+        self.assertEqual(agregar_en_shards(Partida.objects.all(), total=Count('id'))['total'], 2 * len(self.usuarios))
+
+
+    def test_check_de_partidas_fuera_de_su_shard(self):
+        self.assertEqual(partidas_fuera_de_shard(databases=['default']), [])
+        usuario = next(u for u in self.usuarios if shard_de_usuario(u.pk) != 'default')
+        # Como las que quedan en 'default' si se pasa a DB_SHARDS > 1 sin moverlas
+        Partida.objects.using('default').create(usuario=usuario, nivel=self.nivel)
+
+        (error,) = partidas_fuera_de_shard(databases=['default'])
+        self.assertEqual(error.id, 'memory_game.E001')
+        self.assertIn(str(usuario.pk), error.msg)
+        self.assertEqual(partidas_fuera_de_shard(databases=None), [])
+        with self.assertRaises(SystemCheckError):
+            call_command('check', databases=['default'], stdout=io.StringIO(), stderr=io.StringIO())
+
+
+# -------------------------------
+# PRUEBAS: VENCIMIENTO DE PARTIDAS
+# -------------------------------
+
+class VencimientoPartidasTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=2)
+        self.partidas = [
+            create_game(User.objects.create(username=f'jugador{i}'), self.nivel, tiempo_limite=60)
+            for i in range(4)
+        ]
+
+    def _vencer(self, partida):
+        para_partida(Partida, partida.pk).filter(pk=partida.pk).update(
+            fecha_limite=timezone.now() - timedelta(seconds=1)
+        )
+
+    def test_cola_con_reprogramaciones_y_cancelaciones(self):
+        cola = ColaVencimientos()
+        for clave, vencimiento in [('a', 5), ('b', 1), ('c', 3), ('d', 2)]:
+            cola.programar(clave, vencimiento)
+        cola.programar('b', 10)
+        cola.cancelar('d')
+        self.assertEqual(cola.proximo(), 3)
+        self.assertEqual(cola.vencidas(6), ['c', 'a'])
+        self.assertEqual((len(cola), cola.vencidas(20)), (1, ['b']))
+
+    def test_temporizador_da_por_perdidas_solo_las_vencidas(self):
+        temporizador = Temporizador(tamano_lote=1)
+        temporizador.sincronizar()
+        self.assertEqual(len(temporizador.cola), 4)
+
+        vencidas, vigentes = self.partidas[:2], self.partidas[2:]
+        for partida in vencidas:
+            self._vencer(partida)
+        temporizador.sincronizar()
+        self.assertEqual(temporizador.expirar(), 2)
+        for partida in vencidas:
+            partida.refresh_from_db()
+            self.assertEqual((partida.activa, partida.motivo_fin), (False, Partida.MOTIVO_DERROTA))
+            self.assertEqual(Estadistica.objects.get(usuario_id=partida.usuario_id).derrotas, 1)
+        self.assertEqual(len(temporizador.cola), 2)
+
+        # Vencida fuera del temporizador: la siguiente jugada la da por perdida
+        self._vencer(vigentes[0])
+        vigentes[0].refresh_from_db()
+        self.assertEqual(reveal_card(vigentes[0], 0)['message'], 'Tiempo agotado')
+        self.assertFalse(vigentes[0].activa)
+        self._vencer(vigentes[1])
+        self.assertEqual(vencer_partidas(), 1)
+
+
+    def test_una_partida_que_falla_no_repite_la_pasada(self):
+        for partida in self.partidas:
+            self._vencer(partida)
+        rota = self.partidas[1]
+
+        def forfeit(partida):
+            if partida.pk == rota.pk:
+                raise RuntimeError("partida rota")
+            forfeit_game(partida)
+
+        with mock.patch('memory_game.services.temporizadores.forfeit_game', side_effect=forfeit) as llamada, \
+                self.assertLogs('memory_game.temporizadores', 'ERROR'):
+            self.assertEqual(vencer_partidas(tamano_lote=1), 3)
+        self.assertEqual(llamada.call_count, 4)
+        rota.refresh_from_db()
+        self.assertTrue(rota.activa)
+
+
+# -------------------------------
+# PRUEBAS: ATLAS DE SPRITES
+# -------------------------------
+
+def _png(color):
+    salida = io.BytesIO()
+    Image.new('RGB', (40, 30), color).save(salida, 'PNG')
+    return SimpleUploadedFile(f'{color}.png', salida.getvalue(), content_type='image/png')
+
+
+@override_settings(ATLAS_TAMANOS=(16, 32))
+class AtlasTests(TestCase):
+
+    def setUp(self):
+        # Un directorio por prueba: los ids de nivel (y con ellos los nombres) se repiten
+        self.enterContext(override_settings(MEDIA_ROOT=tempfile.mkdtemp()))
+        cache.clear()
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            for posicion, (simbolo, color) in enumerate([('A', 'red'), ('B', 'lime'), ('C', 'blue')] * 2):
+                Carta.objects.create(nivel=self.nivel, posicion=posicion, simbolo=simbolo, imagen=_png(color))
+
+    def test_se_genera_al_guardar_las_cartas_y_la_vista_solo_lee(self):
+        with mock.patch('memory_game.services.atlas.componer', side_effect=AssertionError("no se genera")):
+            atlas = atlas_para(self.nivel)
+        self.assertEqual((atlas['columnas'], atlas['filas'], atlas['sprites']), (2, 2, {'A': 0, 'B': 1, 'C': 2}))
+
+        nombre = atlas['urls'][32].removeprefix(settings.MEDIA_URL)
+        with default_storage.open(nombre) as archivo, Image.open(archivo) as imagen:
+            self.assertEqual(imagen.size, (64, 64))
+            self.assertGreater(imagen.convert('RGB').getpixel((40, 8))[1], 200)  # 'B': verde
+        self.assertEqual(generar_todos([self.nivel])['generados'], 0)
+
+        carta = Carta.objects.filter(nivel=self.nivel).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            carta.imagen = _png('white')
+            carta.save()
+        self.assertNotEqual(atlas_para(self.nivel)['urls'], atlas['urls'])
+        self.assertEqual(generar_todos([self.nivel], limpiar=True), {'generados': 0, 'borrados': 2})
+        self.assertFalse(default_storage.exists(nombre))
+        self.assertIsNotNone(atlas_para(self.nivel))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Carta.objects.filter(nivel=self.nivel).delete()
+        self.assertIsNone(atlas_para(self.nivel))
+
+    def test_el_nombre_depende_del_contenido_de_las_imagenes(self):
+        urls = atlas_para(self.nivel)['urls']
+        # Otra imagen con el mismo nombre de archivo
+        carta = Carta.objects.filter(nivel=self.nivel, simbolo='A').first()
+        ruta = default_storage.path(carta.imagen.name)
+        Image.new('RGB', (40, 30), 'black').save(ruta, 'PNG')
+
+        self.assertEqual(generar_todos([self.nivel])['generados'], 2)
+        self.assertNotEqual(atlas_para(self.nivel)['urls'], urls)
+
+
+# -------------------------------
+# PRUEBAS: PARTIDAS SIN CONEXIÓN
+# -------------------------------
+
+class PartidaSinConexionTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.nivel = Nivel.objects.create(nombre='Fácil', dificultad=1, filas=2, columnas=3)
+        self.usuario = User.objects.create(username='jugador')
+        self.client.force_login(self.usuario)
+
+    def _post(self, ruta, datos):
+        return self.client.post(ruta, datos, content_type='application/json')
+
+    def _enviar(self, datos, segundos=30):
+        """Envío ``segundos`` después de ahora (la partida dura lo que tarda el envío)."""
+        despues = timezone.now() + timedelta(seconds=segundos)
+        with mock.patch('memory_game.services.offline.timezone.now', return_value=despues):
+            return self._post('/offline/enviar/', datos)
+
+    def _jugadas(self, valores):
+        posiciones = {}
+        for pos, valor in enumerate(valores):
+            posiciones.setdefault(valor, []).append(pos)
+        return [pos for par in posiciones.values() for pos in par]
+
+    def test_registro_reproducido_y_guardado_una_sola_vez(self):
+        emitido = self._post('/offline/nueva/', {'nivel_id': self.nivel.pk}).json()
+        valores = emitido['valores']
+        posiciones = {}
+        for pos, valor in enumerate(valores):
+            posiciones.setdefault(valor, []).append(pos)
+        primero, segundo = posiciones[valores[0]], next(p for v, p in posiciones.items() if v != valores[0])
+        # Un fallo (las cartas se ocultan solas) y luego todos los pares
+        jugadas = [primero[0], segundo[0]] + [pos for par in posiciones.values() for pos in par]
+
+        trampa = self._enviar({'compromiso': emitido['compromiso'], 'jugadas': jugadas + [0]})
+        self.assertEqual((trampa.status_code, trampa.json()['error']), (400, 'Jugada 9: Partida finalizada'))
+
+        respuesta = self._enviar({'compromiso': emitido['compromiso'], 'jugadas': jugadas})
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        resultado = respuesta.json()
+        self.assertEqual((resultado['ganada'], resultado['movimientos'], resultado['aciertos']), (True, 4, 3))
+
+        partida = para_partida(Partida, int(resultado['partida_id'])).get(pk=resultado['partida_id'])
+        self.assertEqual(partida.motivo_fin, Partida.MOTIVO_VICTORIA)
+        self.assertEqual(partida.carta_set.filter(emparejada=True).count(), 6)
+        self.assertEqual(list(partida.intento_set.order_by('pk').values_list('es_correcto', flat=True)),
+                         [False, True, True, True])
+        self.assertEqual(Estadistica.objects.get(usuario=self.usuario).victorias, 1)
+
+        repetida = self._enviar({'compromiso': emitido['compromiso'], 'jugadas': jugadas})
+        self.assertEqual(repetida.status_code, 409)
+        otro = User.objects.create(username='otro')
+        self.client.force_login(otro)
+        ajena = self._enviar({'compromiso': emitido['compromiso'], 'jugadas': jugadas})
+        self.assertEqual(ajena.status_code, 400)
+
+    def test_cuerpo_que_no_es_un_objeto_json(self):
+        for ruta in ('/offline/nueva/', '/offline/enviar/'):
+            for cuerpo in ('{"nivel_id": ', '[1, 2]'):
+                respuesta = self.client.post(ruta, cuerpo, content_type='application/json')
+                self.assertEqual(respuesta.status_code, 400, (ruta, cuerpo))
+
+    def test_registro_perfecto_enviado_al_instante(self):
+        emitido = self._post('/offline/nueva/', {'nivel_id': self.nivel.pk}).json()
+        datos = {'compromiso': emitido['compromiso'], 'jugadas': self._jugadas(emitido['valores'])}
+
+        # 6 jugadas: menos de 6 × PARTIDA_OFFLINE_MS_POR_JUGADA no es una partida a mano
+        respuesta = self._enviar(datos, segundos=1)
+        self.assertEqual((respuesta.status_code, respuesta.json()['error']),
+                         (400, 'Registro demasiado rápido para una partida jugada a mano'))
+        self.assertFalse(Estadistica.objects.filter(usuario=self.usuario).exists())
+        self.assertEqual(self._enviar(datos, segundos=3).status_code, 201)
+        self.assertGreaterEqual(Estadistica.objects.get(usuario=self.usuario).duracion_ms, 3000)
+
+    def test_solo_el_compromiso_repetido_es_un_duplicado(self):
+        emitido = self._post('/offline/nueva/', {'nivel_id': self.nivel.pk}).json()
+        datos = {'compromiso': emitido['compromiso'], 'jugadas': self._jugadas(emitido['valores'])}
+        with mock.patch('memory_game.services.offline._guardar', side_effect=IntegrityError("otra restricción")):
+            with self.assertRaises(IntegrityError):
+                self._enviar(datos)
@@ -20,6 +20,7 @@ urlpatterns = [
     path('hide/', views.hide, name='hide'),
     path('state/<int:partida_id>/', views.game_state, name='game_state'),
     path('stats/<str:username>/', views.user_stats, name='user_stats'),
+    path('ranking/<int:nivel_id>/', views.ranking_tiempos_nivel, name='ranking_tiempos'),
 
     # Autenticación
     
@@ -36,6 +37,26 @@ urlpatterns = [
     
     path('estadisticas/', views.estadisticas_usuario, name='estadisticas_usuario'),
 
+    # Salas multijugador
+    path('salas/nueva/', views.sala_nueva, name='sala_nueva'),
+    path('salas/<str:codigo>/', views.sala_estado, name='sala_estado'),
+    path('salas/<str:codigo>/unirse/', views.sala_unirse, name='sala_unirse'),
+    path('salas/<str:codigo>/iniciar/', views.sala_iniciar, name='sala_iniciar'),
+    path('salas/<str:codigo>/revelar/<int:pos>/', views.sala_revelar, name='sala_revelar'),
+    path('salas/<str:codigo>/eventos/', views.sala_eventos, name='sala_eventos'),
+
+    # Rondas de torneo (provisión en bloque, solo staff)
+    path('torneos/rondas/', views.ronda_nueva, name='ronda_nueva'),
+
+    # Partidas sin conexión: compromiso al empezar, registro completo al terminar
+    path('offline/nueva/', views.offline_nueva, name='offline_nueva'),
+    path('offline/enviar/', views.offline_enviar, name='offline_enviar'),
+
+    # Lecturas asíncronas (servidas por project_memory.asgi)
+    path('async/state/<int:partida_id>/', views.game_state_async, name='game_state_async'),
+    path('async/stats/<str:username>/', views.user_stats_async, name='user_stats_async'),
+    path('async/estadisticas/', views.estadisticas_usuario_async, name='estadisticas_usuario_async'),
+
 
 
 ]
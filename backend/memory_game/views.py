@@ -5,15 +5,23 @@ from django.contrib.auth.models import User
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.core.paginator import Paginator
+from django.conf import settings
 import json
 
 from .models import Nivel, Carta, Partida, Estadistica
 from .services.game_engine import (
     create_game,
+    fecha_limite_nueva,
     reveal_card,
     hide_unmatched,
     serialize_game_state,
 )
+from .services.throttle import throttle_moves, coalesce_reveals
+from .services.atlas import atlas_para, cartas_de_catalogo
+from .services.duraciones import registrar_duracion
+from .services.percentiles import percentiles_partida, registrar_partida
+from .services.analytics import ranking_tiempos, resumen_tiempos
+from .db_routers import para_partida, read_replica
 
 
 
@@ -30,12 +38,12 @@ def game_board(request):
         nivel = Nivel.objects.first()
 
     # ✅ Buscar partida activa o crear una nueva
-    partida = Partida.objects.filter(usuario=request.user, activa=True, nivel=nivel).first()
+    partida = request.user.partida_set.filter(activa=True, nivel=nivel, sala__isnull=True).first()
     if not partida:
         partida = create_game(request.user, nivel)
 
-    # ✅ Obtener cartas de la partida
-    cartas = Carta.objects.filter(partida=partida).order_by("posicion")
+    # ✅ Obtener cartas de la partida (en el shard del jugador)
+    cartas = partida.carta_set.order_by("posicion")
 
     # ✅ Asegurar que existan los contadores en la sesión
     if 'movimientos' not in request.session:
@@ -95,6 +103,8 @@ from django.utils import timezone
 from .models import Carta, Partida, Nivel
 from .services.game_engine import actualizar_estadisticas
 
+@throttle_moves
+@coalesce_reveals
 def reveal_card(request, pos):
     """Revela una carta, registra movimientos, guarda estadísticas y avanza de nivel."""
     cartas_ids = request.session.get('cartas', [])
@@ -127,7 +137,7 @@ def reveal_card(request, pos):
 
         revealed = []
 
-        partida = Partida.objects.filter(usuario=request.user, activa=True).last()
+        partida = request.user.partida_set.filter(activa=True, sala__isnull=True).last()
         if partida:
             partida.movimientos = movimientos
             partida.aciertos = aciertos
@@ -139,6 +149,7 @@ def reveal_card(request, pos):
             if aciertos >= total_pares:
                 partida.ganada = True
                 partida.activa = False
+                partida.motivo_fin = Partida.MOTIVO_VICTORIA
                 partida.fecha_fin = timezone.now()
                 partida.save()
 
@@ -182,11 +193,12 @@ def reveal_card(request, pos):
 # 🔁 GENERAR ESTADO DEL JUEGO (ACTUALIZADO)
 # -----------------------------
 def generar_estado(cartas_ids, revealed, matched, movimientos=0, aciertos=0, ganada=False):
+    # Una sola consulta para todas las cartas (antes era una por carta: N+1)
+    simbolos = dict(Carta.objects.filter(id__in=cartas_ids).values_list('id', 'simbolo'))
     cartas = []
     for cid in cartas_ids:
-        carta = Carta.objects.get(id=cid)
         cartas.append({
-            'simbolo': carta.simbolo if cid in revealed or cid in matched else '',
+            'simbolo': simbolos[cid] if cid in revealed or cid in matched else '',
             'revelada': cid in revealed,
             'emparejada': cid in matched,
         })
@@ -203,28 +215,6 @@ def generar_estado(cartas_ids, revealed, matched, movimientos=0, aciertos=0, gan
 
 
 
-def generar_estado(cartas_ids, revealed, matched, movimientos=0, aciertos=0, ganada=False):
-    cartas = []
-    for cid in cartas_ids:
-        carta = Carta.objects.get(id=cid)
-        cartas.append({
-            'simbolo': carta.simbolo if cid in revealed or cid in matched else '',
-            'revelada': cid in revealed,
-            'emparejada': cid in matched
-        })
-    return {
-        'cartas': cartas,
-        'movimientos': movimientos,
-        'aciertos': aciertos,
-        'ganada': ganada
-    }
-
-
-
-
-
-
-
 
 
 
@@ -236,6 +226,7 @@ def generar_estado(cartas_ids, revealed, matched, movimientos=0, aciertos=0, gan
 # 🔄 OCULTAR CARTAS INCORRECTAS
 # -----------------------------
 @csrf_exempt
+@throttle_moves
 def hide(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Método no permitido'}, status=405)
@@ -248,17 +239,41 @@ def hide(request):
     if not all([partida_id, pos1, pos2]):
         return JsonResponse({'error': 'partida_id, pos1 y pos2 son requeridos'}, status=400)
 
-    partida = get_object_or_404(Partida, id=partida_id)
+    partida = get_object_or_404(para_partida(Partida, partida_id), id=partida_id)
     resultado = hide_unmatched(partida, pos1, pos2)
-    return JsonResponse(resultado)
+    return respuesta_estado(request, resultado)
 
 
 # -----------------------------
 # 📊 ESTADO DE LA PARTIDA
 # -----------------------------
+# (Accept: application/vnd.memorygame.compacto+json o ...binario, o ?formato=, para el formato compacto)
+from .services.formato import respuesta_estado
+
+# (espectadores leen de la réplica; el jugador que acaba de mover queda fijado a la primaria)
+# (tableros grandes: ?fila=&columna=&alto=&ancho= devuelve solo esa ventana)
+MAX_CARTAS_VENTANA = 2500
+
+def _ventana_pedida(request):
+    """(ventana, error): la ventana de ?fila=&columna=&alto=&ancho= (o None) y una respuesta 400 si no es válida."""
+    if 'alto' not in request.GET and 'ancho' not in request.GET:
+        return None, None
+    try:
+        ventana = [max(0, int(request.GET.get(k, 0))) for k in ('fila', 'columna', 'alto', 'ancho')]
+    except ValueError:
+        return None, JsonResponse({'error': 'Ventana inválida'}, status=400)
+    if ventana[2] * ventana[3] > MAX_CARTAS_VENTANA:
+        return None, JsonResponse({'error': f'La ventana no puede superar {MAX_CARTAS_VENTANA} cartas'}, status=400)
+    return ventana, None
+
+
+@read_replica
 def game_state(request, partida_id):
-    partida = get_object_or_404(Partida, id=partida_id)
-    return JsonResponse(serialize_game_state(partida))
+    partida = get_object_or_404(para_partida(Partida, partida_id), id=partida_id)
+    ventana, error = _ventana_pedida(request)
+    if error:
+        return error
+    return respuesta_estado(request, serialize_game_state(partida, ventana))
 
 
 # -----------------------------
@@ -293,21 +308,51 @@ def cambiar_nivel(request):
 from django.contrib.auth.models import User
 from .models import Estadistica
 
+@read_replica
 def user_stats(request, username):
     """
     Devuelve estadísticas básicas del jugador en formato JSON.
     """
     user = get_object_or_404(User, username=username)
-    stats, _ = Estadistica.objects.get_or_create(usuario=user)
+    # Solo lectura (puede ir a la réplica): sin estadística se devuelven ceros
+    stats = Estadistica.objects.filter(usuario=user).first() or Estadistica(usuario=user)
+
+    tiempos = resumen_tiempos(usuario=user)
+    return JsonResponse(_datos_usuario(user, stats, tiempos))
+
 
-    data = {
+def _datos_usuario(user, stats, tiempos):
+    return {
         "usuario": user.username,
         "total_partidas": stats.total_partidas,
         "victorias": stats.victorias,
         "derrotas": stats.derrotas,
         "promedio_intentos": stats.promedio_intentos,
+        "mejor_tiempo_ms": tiempos['mejor_tiempo_ms'],
+        "tiempo_promedio_ms": tiempos['tiempo_promedio_ms'],
     }
-    return JsonResponse(data)
+
+
+# -----------------------------
+# 🏆 RANKING DE TIEMPOS POR NIVEL
+# -----------------------------
+@read_replica
+def ranking_tiempos_nivel(request, nivel_id):
+    """Top de tiempos del nivel, ordenado en SQL sobre duracion_ms."""
+    nivel = get_object_or_404(Nivel, pk=nivel_id)
+    try:
+        limite = min(max(int(request.GET.get('limite', 10)), 1), 100)
+    except ValueError:
+        limite = 10
+
+    return JsonResponse({
+        "nivel": nivel.nombre,
+        "ranking": [
+            {"usuario": r['usuario__username'], "duracion_ms": r['duracion_ms'], "tiempo": r['tiempo']}
+            for r in ranking_tiempos(nivel, limite)
+        ],
+        **resumen_tiempos(nivel=nivel),
+    })
 
 
 
@@ -382,18 +427,20 @@ def actualizar_estadistica(request):
         if not nivel:
             return JsonResponse({'error': 'Nivel no encontrado'}, status=404)
 
-        partida = Partida.objects.filter(usuario=usuario, nivel=nivel, activa=True).first()
+        partida = usuario.partida_set.filter(nivel=nivel, activa=True, sala__isnull=True).first()
         if partida:
             partida.ganada = True
             partida.activa = False
+            partida.motivo_fin = Partida.MOTIVO_VICTORIA
             partida.fecha_fin = timezone.now()
             partida.movimientos = intentos
             partida.aciertos = pares
             partida.save()
+            registrar_partida(partida)
 
         # Buscar o crear estadística del nivel
         estadistica, _ = Estadistica.objects.get_or_create(usuario=usuario, nivel=nivel)
-        estadistica.tiempo = tiempo
+        registrar_duracion(estadistica, partida, tiempo)
         estadistica.intentos = intentos
         estadistica.pares_encontrados = pares
         estadistica.total_partidas += 1
@@ -403,7 +450,10 @@ def actualizar_estadistica(request):
         ) / estadistica.total_partidas
         estadistica.save()
 
-        return JsonResponse({'status': 'ok'})
+        respuesta = {'status': 'ok'}
+        if partida:
+            respuesta['percentiles'] = percentiles_partida(partida)
+        return JsonResponse(respuesta)
 
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
@@ -435,20 +485,23 @@ def game_board_view(request):
         nivel = Nivel.objects.first()
 
     # 🔹 Cerrar partidas activas previas del usuario
-    Partida.objects.filter(usuario=request.user, activa=True).update(activa=False, fecha_fin=timezone.now())
+    ahora = timezone.now()
+    request.user.partida_set.filter(activa=True, sala__isnull=True).update(
+        activa=False, fecha_fin=ahora, motivo_fin=Partida.MOTIVO_ABANDONO, ultima_actualizacion=ahora
+    )
 
-    # 🔹 Crear nueva partida
-    partida = Partida.objects.create(
-        usuario=request.user,
+    # 🔹 Crear nueva partida (en el shard del jugador)
+    partida = request.user.partida_set.create(
         nivel=nivel,
         movimientos=0,
         aciertos=0,
         ganada=False,
-        activa=True
+        activa=True,
+        fecha_limite=fecha_limite_nueva(),
     )
 
-    # 🔹 Cargar cartas SOLO del nivel actual
-    cartas = list(Carta.objects.filter(nivel=nivel))
+    # 🔹 Cargar cartas SOLO del nivel actual (las de catálogo, no las de otras partidas)
+    cartas = list(cartas_de_catalogo(nivel))
     if not cartas:
         # Si el nivel no tiene cartas, mostrar mensaje especial
         return render(request, "sin_cartas.html", {"nivel": nivel})
@@ -469,7 +522,10 @@ def game_board_view(request):
         'nivel': nivel,
         'cartas': cartas,
         'niveles': niveles,
-        'partida': partida
+        'partida': partida,
+        'tiempo_limite': settings.PARTIDA_TIEMPO_LIMITE_S,
+        # 🖼️ Una sola imagen con todas las cartas del nivel (si tienen imagen)
+        'atlas': atlas_para(nivel),
     })
 
 
@@ -516,11 +572,14 @@ def next_level(request):
 # -----------------------------
 # 🏠 HOME PRINCIPAL
 # -----------------------------
+from .services.analytics import dashboard_niveles
+
 @login_required
 def home(request):
     user = request.user
     if user.is_superuser:
-        return render(request, "home_admin.html", {"user": user})
+        # 📈 Analítica por nivel desde los resúmenes diarios (sin recorrer Partida)
+        return render(request, "home_admin.html", {"user": user, "dashboard": dashboard_niveles()})
     return render(request, "home_player.html", {"user": user})
 
 
@@ -544,7 +603,7 @@ def registrar_intento(request):
         correcto = data.get('correcto', False)
 
         # Guarda un intento en la base de datos
-        Intento.objects.create(usuario=usuario, es_correcto=correcto)
+        usuario.intento_set.create(es_correcto=correcto)
         return JsonResponse({'status': 'ok'})
     
     return JsonResponse({'error': 'Método no permitido'}, status=405)
@@ -577,13 +636,12 @@ def guardar_estadistica(request):
             nivel_nombre = data.get('nivel')
             pares = int(data.get('pares', 0))
             intentos = int(data.get('intentos', 0))
-            tiempo = data.get('tiempo', '00:00')
 
             usuario = User.objects.get(username=usuario_nombre)
             nivel = Nivel.objects.get(nombre=nivel_nombre)
 
             # Buscar la última partida activa del usuario en ese nivel
-            partida = Partida.objects.filter(usuario=usuario, nivel=nivel, activa=True).last()
+            partida = usuario.partida_set.filter(nivel=nivel, activa=True, sala__isnull=True).last()
 
             if partida:
                 total_cartas = Carta.objects.filter(nivel=nivel).count()
@@ -598,20 +656,18 @@ def guardar_estadistica(request):
 
 
 
+                partida.motivo_fin = Partida.MOTIVO_VICTORIA if partida.ganada else Partida.MOTIVO_DERROTA
                 partida.fecha_fin = timezone.now()
                 partida.activa = False
                 partida.save()
 
-                # Guardar estadística individual
-                Estadistica.objects.create(
-                    usuario=usuario,
-                    nivel=nivel,
-                    pares_encontrados=pares,
-                    intentos=intentos,
-                    tiempo=tiempo
-                )
+                # Una fila por usuario y nivel, como el resto de caminos (duración medida en el servidor)
+                actualizar_estadisticas(partida)
 
-                return JsonResponse({'status': 'ok', 'mensaje': 'Estadística guardada correctamente.'})
+                respuesta = {'status': 'ok', 'mensaje': 'Estadística guardada correctamente.'}
+                if partida.ganada:
+                    respuesta['percentiles'] = percentiles_partida(partida)
+                return JsonResponse(respuesta)
 
             else:
                 return JsonResponse({'status': 'error', 'mensaje': 'No se encontró una partida activa.'})
@@ -633,6 +689,7 @@ from .models import Estadistica
 # 📊 VISTA: Estadísticas del jugador
 # -------------------------------
 @login_required
+@read_replica
 def estadisticas_usuario(request):
     """Muestra las estadísticas del usuario autenticado."""
     estadisticas = Estadistica.objects.filter(usuario=request.user).select_related('nivel')
@@ -659,7 +716,7 @@ def marcar_derrota(request):
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'No autenticado'}, status=401)
 
-    partida = Partida.objects.filter(usuario=request.user, activa=True).last()
+    partida = request.user.partida_set.filter(activa=True, sala__isnull=True).last()
     if not partida:
         return JsonResponse({'error': 'No hay partida activa'}, status=404)
 
@@ -668,3 +725,238 @@ def marcar_derrota(request):
 
 
 
+
+
+
+# -----------------------------
+# 👥 SALAS MULTIJUGADOR
+# -----------------------------
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from .models import Sala
+from .services.broker import get_broker
+from .services.salas import ErrorSala, canal_sala, crear_sala, estado_sala, iniciar, jugar, unirse
+
+
+def _cuerpo_json(request):
+    """(datos, error): el cuerpo JSON como dict (vacío sin cuerpo) y una respuesta 400 si no es válido."""
+    try:
+        datos = json.loads(request.body or b'{}')
+    except ValueError:
+        return None, JsonResponse({'error': 'JSON inválido'}, status=400)
+    if not isinstance(datos, dict):
+        return None, JsonResponse({'error': 'Se esperaba un objeto JSON'}, status=400)
+    return datos, None
+
+
+def _accion_sala(request, codigo, accion):
+    """POST autenticado sobre una sala; ErrorSala se devuelve como 400."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    sala = get_object_or_404(Sala, codigo=codigo)
+    try:
+        return JsonResponse(accion(sala))
+    except ErrorSala as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@csrf_exempt
+def sala_nueva(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+
+    data, error = _cuerpo_json(request)
+    if error:
+        return error
+    nivel = get_object_or_404(Nivel, id=data.get('nivel_id'))
+    try:
+        sala = crear_sala(request.user, nivel, int(data.get('max_jugadores', 4)))
+    except (ErrorSala, TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(estado_sala(sala), status=201)
+
+
+@csrf_exempt
+def sala_unirse(request, codigo):
+    return _accion_sala(request, codigo, lambda sala: estado_sala(unirse(sala, request.user)))
+
+
+@csrf_exempt
+def sala_iniciar(request, codigo):
+    return _accion_sala(request, codigo, lambda sala: estado_sala(iniciar(sala, request.user)))
+
+
+@csrf_exempt
+@throttle_moves
+def sala_revelar(request, codigo, pos):
+    return _accion_sala(request, codigo, lambda sala: jugar(sala, request.user, pos))
+
+
+def sala_estado(request, codigo):
+    """Snapshot para jugadores y espectadores (incluye 'ultimo_evento' para suscribirse)."""
+    sala = get_object_or_404(Sala.objects.select_related('nivel', 'partida'), codigo=codigo)
+    return JsonResponse(estado_sala(sala))
+
+
+async def sala_eventos(request, codigo):
+    """
+    Stream SSE de la sala: cada jugada se publica una vez en el broker y se reparte
+    ya serializada a todas las conexiones, en lugar de que cada espectador sondee state/<id>/.
+
+    Se sirve por project_memory.asgi: cada espectador es un generador asíncrono en
+    el bucle de eventos, no un hilo. Un worker WSGI síncrono quedaría ocupado por
+    una sola conexión, así que fuera de DEBUG (runserver, un hilo por petición) se
+    responde 503.
+    """
+    asgi = isinstance(request, ASGIRequest)
+    if not asgi and not settings.DEBUG:
+        return JsonResponse({'error': 'Los eventos de sala se sirven por ASGI'}, status=503)
+
+    sala = await aget_object_or_404(Sala, codigo=codigo)
+    desde = request.headers.get('Last-Event-ID') or request.GET.get('desde')
+    suscripcion = get_broker().suscribir(canal_sala(sala), int(desde) if str(desde).isdigit() else None)
+
+    flujo = suscripcion.aframes() if asgi else suscripcion.frames()
+    response = StreamingHttpResponse(flujo, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: no acumular el stream
+    return response
+
+
+# -----------------------------
+# 🏆 RONDAS DE TORNEO
+# -----------------------------
+from django.contrib.auth.models import User
+from .services.torneos import MAX_JUGADORES_WEB, provisionar_ronda
+
+
+def ronda_nueva(request):
+    """
+    Provisiona en bloque una ronda (solo staff): una partida por jugador con la
+    misma disposición, en lugar de una llamada a new/ por jugador.
+    Cuerpo: {"nivel_id", "usuarios": [ids] (por defecto, todos los activos), "nombre", "semilla"}.
+
+    Con sesión de staff, así que pasa la comprobación CSRF. Como mucho
+    MAX_JUGADORES_WEB jugadores: las rondas mayores, con manage.py provisionar_ronda.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+
+    data, error = _cuerpo_json(request)
+    if error:
+        return error
+    nivel = get_object_or_404(Nivel, id=data.get('nivel_id'))
+    usuarios = User.objects.filter(is_active=True)
+    if data.get('usuarios') is not None:
+        usuarios = usuarios.filter(pk__in=data['usuarios'])
+    usuario_ids = list(usuarios.order_by('pk').values_list('pk', flat=True))
+    if not usuario_ids:
+        return JsonResponse({'error': 'No hay jugadores para la ronda'}, status=400)
+    if len(usuario_ids) > MAX_JUGADORES_WEB:
+        return JsonResponse({
+            'error': f'Más de {MAX_JUGADORES_WEB} jugadores: provisiona la ronda con manage.py provisionar_ronda',
+        }, status=400)
+
+    ronda = provisionar_ronda(usuario_ids, nivel, nombre=data.get('nombre', ''), semilla=data.get('semilla'))
+    return JsonResponse({
+        'ronda_id': ronda.pk,
+        'nombre': ronda.nombre,
+        'nivel': nivel.nombre,
+        'jugadores': ronda.jugadores,
+        'total_cartas': len(ronda.disposicion),
+    }, status=201)
+
+
+# -----------------------------
+# 📴 PARTIDAS SIN CONEXIÓN
+# -----------------------------
+from .services.offline import RegistroDuplicado, RegistroInvalido, emitir_compromiso, registrar_partida_offline
+
+
+@csrf_exempt
+def offline_nueva(request):
+    """Tablero y compromiso firmado para jugar sin conexión. Cuerpo: {"nivel_id"}."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+
+    data, error = _cuerpo_json(request)
+    if error:
+        return error
+    nivel = get_object_or_404(Nivel, id=data.get('nivel_id'))
+    try:
+        return JsonResponse(emitir_compromiso(request.user, nivel), status=201)
+    except RegistroInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@csrf_exempt
+def offline_enviar(request):
+    """
+    Registra de una vez una partida jugada sin conexión, tras reproducirla en el servidor.
+    Cuerpo: {"compromiso", "jugadas": [posiciones reveladas en orden]}.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+
+    data, error = _cuerpo_json(request)
+    if error:
+        return error
+    try:
+        resultado = registrar_partida_offline(request.user, data.get('compromiso') or '', data.get('jugadas'))
+    except RegistroDuplicado as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    except RegistroInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(resultado, status=201)
+
+
+# -----------------------------
+# ⚡ LECTURAS ASÍNCRONAS (ASGI)
+# -----------------------------
+# Mismas respuestas que game_state, user_stats y estadisticas_usuario, con el ORM
+# asíncrono. Servidas por project_memory.asgi, el worker atiende otras peticiones
+# mientras una espera a la base; bajo WSGI conviene usar las versiones síncronas.
+from django.shortcuts import aget_object_or_404
+from .services.analytics import aresumen_tiempos
+from .services.game_engine import aserialize_game_state
+
+
+@read_replica
+async def game_state_async(request, partida_id):
+    partida = await aget_object_or_404(para_partida(Partida, partida_id), id=partida_id)
+    ventana, error = _ventana_pedida(request)
+    if error:
+        return error
+    return respuesta_estado(request, await aserialize_game_state(partida, ventana))
+
+
+@read_replica
+async def user_stats_async(request, username):
+    user = await aget_object_or_404(User, username=username)
+    stats = await Estadistica.objects.filter(usuario=user).afirst() or Estadistica(usuario=user)
+    tiempos = await aresumen_tiempos(usuario=user)
+    return JsonResponse(_datos_usuario(user, stats, tiempos))
+
+
+@login_required
+@read_replica
+async def estadisticas_usuario_async(request):
+    # request.user haría una consulta síncrona: el usuario se obtiene con auser()
+    usuario = await request.auser()
+    estadisticas = [e async for e in Estadistica.objects.filter(usuario=usuario).select_related('nivel')]
+
+    return render(request, 'estadisticas.html', {
+        'usuario': usuario,
+        'estadisticas': estadisticas,
+    })
@@ -3,6 +3,21 @@ ASGI config for project_memory project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serves the async read views under /async/ (state, stats, estadisticas) and the
+multiplayer room routes under /salas/ (SSE streams) without a thread per
+request. docker-compose runs it as the ``asgi`` service and nginx routes those
+paths to it:
+
+    uvicorn project_memory.asgi:application --port 8001 --workers 1 --limit-concurrency 2000
+
+A single process: the room event broker lives in memory, so publishers and
+subscribers must share it.
+
+DJANGO_SERVIDOR=asgi below makes settings default CONN_MAX_AGE to 0 (the sync
+gunicorn workers keep persistent connections): the async ORM runs each request's
+queries in a sync_to_async thread, so a persistent connection is not reused by
+the next request.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +27,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project_memory.settings')
+os.environ.setdefault('DJANGO_SERVIDOR', 'asgi')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -23,7 +24,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-7&mp8rzqxn7s4jx3k@5lgtezc*b%p=7ldoep=0%bs*p6^pxj!a'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', 'True') == 'True'
 
 # Configuración HTTPS
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
@@ -87,6 +88,9 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'memory_game.db_routers.ReplicaStickinessMiddleware',
+    'memory_game.perfilado.PerfiladoMiddleware',
+    'memory_game.consultas_lentas.ConsultasLentasMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -104,13 +108,17 @@ ROOT_URLCONF = 'project_memory.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / "memory_game" / "templates"],
+        # Sin 'loaders' explícitos Django usa el cargador cacheado (filesystem +
+        # app_directories) también con DEBUG: cada plantilla se compila una vez por
+        # proceso, y el autoreload de runserver vacía la caché al editarla
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'memory_game.context_processors.cache_fragmentos',
             ],
         },
     },
@@ -119,6 +127,10 @@ TEMPLATES = [
 WSGI_APPLICATION = 'project_memory.wsgi.application'
 
 
+# Servidor que carga estos settings: 'wsgi' (gunicorn, workers sync) o 'asgi'
+# (project_memory.asgi lo fija antes de cargar Django)
+SERVIDOR = os.environ.get('DJANGO_SERVIDOR', 'wsgi')
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 DATABASES = {
@@ -129,9 +141,76 @@ DATABASES = {
         'PASSWORD': 'Temporal123Strong',
         'HOST': 'db',
         'PORT': '5432',
+        # Conexiones persistentes solo en los workers sync (psycopg2 no tiene pool
+        # nativo): allí cada petición corre en el hilo del worker y reutiliza la
+        # conexión que abrió el calentamiento. Bajo ASGI el ORM corre en hilos de
+        # sync_to_async y una conexión persistente no se reutilizaría: 0.
+        # La réplica y los shards heredan el valor: hasta una conexión por alias y worker.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60' if SERVIDOR == 'wsgi' else '0')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# 📚 Réplica de solo lectura (opcional): estadísticas, historial, espectadores y admin.
+# En pruebas es un espejo de 'default', así se puede probar con dos alias en local.
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# 🧩 Shards de partidas: Partida, Carta e Intento de cada usuario viven en el shard que
+# le asigna un hash de su id (memory_game.db_routers). DB_SHARDS=N añade 'shard_1'..
+# 'shard_{N-1}' a 'default' (shard 0). Sin DB_SHARD_HOSTS todos van al mismo servidor
+# con distinto NAME, así se prueba en local con varios alias.
+SHARDS = ['default']
+_hosts_shards = [h for h in os.environ.get('DB_SHARD_HOSTS', '').split(',') if h]
+for _i in range(1, int(os.environ.get('DB_SHARDS', '1'))):
+    SHARDS.append(f'shard_{_i}')
+    DATABASES[f'shard_{_i}'] = {
+        **DATABASES['default'],
+        'NAME': f"{DATABASES['default']['NAME']}_shard_{_i}",
+        'HOST': _hosts_shards[_i - 1] if _i <= len(_hosts_shards) else DATABASES['default']['HOST'],
+    }
+
+DATABASE_ROUTERS = ['memory_game.db_routers.ShardRouter', 'memory_game.db_routers.ReplicaRouter']
+REPLICA_DB_ALIAS = 'replica'
+REPLICA_STICKY_SECONDS = 30  # lectura en primaria tras escribir (read-your-writes)
+
+# Perfilado por muestreo de vistas (staff: cabecera X-Perfilar: 1). Los perfiles
+# se guardan en PERFILADO_DIR, rotando a los PERFILADO_MAXIMO más recientes;
+# `manage.py perfiles_flamegraph` los agrega en formato plegado.
+PERFILADO_MUESTREO = float(os.environ.get('PERFILADO_MUESTREO', '0'))  # fracción de peticiones
+PERFILADO_INTERVALO = 0.005  # segundos entre muestras (≈ intervalo de cambio del GIL)
+PERFILADO_DIR = BASE_DIR / 'perfiles'
+PERFILADO_MAXIMO = 500
+
+# Registro de consultas lentas (desactivado si CONSULTAS_LENTAS_MS no está definido):
+# cada consulta por encima del umbral se registra con su vista, SQL normalizado y
+# EXPLAIN; las formas de consulta repetidas CONSULTAS_REPETIDAS veces en una misma
+# petición se marcan como sospechosas de N+1. Una línea JSON por registro.
+CONSULTAS_LENTAS_MS = float(os.environ['CONSULTAS_LENTAS_MS']) if os.environ.get('CONSULTAS_LENTAS_MS') else None
+CONSULTAS_REPETIDAS = int(os.environ.get('CONSULTAS_REPETIDAS', '10'))
+CONSULTAS_EXPLAIN = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'lineas_json': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'memory_game.consultas': {'handlers': ['lineas_json'], 'level': 'INFO', 'propagate': False},
+        'memory_game.calentamiento': {'handlers': ['lineas_json'], 'level': 'INFO', 'propagate': False},
+        'memory_game.temporizadores': {'handlers': ['lineas_json'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -175,8 +254,44 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_DIRS = [BASE_DIR / "memory_game" / "static"]
 
-# Directorio de plantillas personalizadas
-TEMPLATES[0]['DIRS'] = [BASE_DIR / "memory_game" / "templates"]
+# Archivos subidos (imágenes de cartas) y atlas de sprites generados a partir de ellas
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / "media"
+ATLAS_TAMANOS = (96, 192)  # px por casilla: 1x y 2x
+
+# collectstatic genera nombres con hash (manifest), variantes .gz/.br de CSS/JS
+# y variantes de audio comprimidas de los .wav (si ffmpeg está disponible)
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "memory_game.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
+# Caché (fragmentos de plantillas, límite de jugadas). Con CACHE_REDIS_URL es
+# compartida por todos los workers y por manage.py: borrar un fragmento al guardar
+# un Nivel (signals.invalidar_cache_niveles) llega a todos, y el límite de jugadas
+# es por jugador. Sin ella, LocMem: cada proceso tiene su propia caché, la
+# invalidación solo alcanza al proceso que guardó y el límite es por worker; los
+# fragmentos viven entonces CACHE_FRAGMENTOS_S = 60 s para acotar el desfase.
+if os.environ.get('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_REDIS_URL'],
+        }
+    }
+    CACHE_FRAGMENTOS_S = 3600
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'memorygame',
+        }
+    }
+    CACHE_FRAGMENTOS_S = 60
 
 
 
@@ -197,3 +312,23 @@ LOGOUT_REDIRECT_URL = 'landing' # a dónde ir tras logout
 LOGIN_URL = 'login'             # nombre de la url de login
 
 
+
+# ⏱️ Límite de jugadas por jugador (token bucket en la caché 'default')
+MOVE_THROTTLE_RATE = 5    # jugadas por segundo sostenidas
+MOVE_THROTTLE_BURST = 10  # ráfaga máxima permitida
+
+# 🗃️ Retención de Intento crudos (luego quedan solo los resúmenes diarios)
+INTENTO_RETENCION_DIAS = 30
+
+# 📈 Bosquejos de percentiles: filas por nivel y métrica (se combinan al leer)
+BOSQUEJO_FRANJAS = 8
+
+# ⏳ Tiempo límite de las partidas individuales (0 = sin límite). Lo hace cumplir el
+# servidor: manage.py vencer_partidas da por perdidas las vencidas
+PARTIDA_TIEMPO_LIMITE_S = int(os.environ.get('PARTIDA_TIEMPO_LIMITE_S', '60'))
+
+# 📴 Partidas sin conexión: segundos que vale el compromiso firmado para enviar el registro
+# (pasado el tiempo límite, la partida cuenta como derrota)
+PARTIDA_OFFLINE_VALIDEZ_S = 24 * 3600
+# Duración mínima creíble del registro (ms por jugada): más rápido se rechaza
+PARTIDA_OFFLINE_MS_POR_JUGADA = 300
@@ -1,4 +1,6 @@
 # project_memory/urls.py
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from memory_game import views as mg_views  
@@ -15,3 +17,7 @@ urlpatterns = [
 
     path('accounts/', include('allauth.urls')),
 ]
+
+# En producción nginx sirve /media/ (atlas con nombre por hash: caché inmutable)
+if settings.DEBUG:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)